@@ -2,10 +2,12 @@
 
 class Node:
 
-    def __init__(self, key):
+    def __init__(self, key, value=None):
 
         self.key = key
+        self.value = value
         self.height = 1
+        self.size = 1
         self.left = None
         self.right = None
 
@@ -14,6 +16,7 @@ class Node:
         left_height = self.left.height if self.left else 0
         right_height = self.right.height if self.right else 0
         self.height = 1 + max(left_height, right_height)
+        self.size = 1 + (self.left.size if self.left else 0) + (self.right.size if self.right else 0)
         return self
 
     def balance_factor(self):
@@ -32,9 +35,12 @@ class AVLTree:
     def __init__(self):
 
         self.root = None
+        self.stats = None
 
     def _rotate_right(self, node):
 
+        if self.stats is not None:
+            self.stats.rotations += 1
         left_child = node.left
         node.left = left_child.right
         left_child.right = node
@@ -43,6 +49,8 @@ class AVLTree:
 
     def _rotate_left(self, node):
 
+        if self.stats is not None:
+            self.stats.rotations += 1
         right_child = node.right
         node.right = right_child.left
         right_child.left = node
@@ -65,11 +73,15 @@ class AVLTree:
             return self._rotate_left(node)
         return node
 
-    def insert(self, key):
+    def insert(self, key, value=None):
+
+        stats = self.stats
 
         def _insert(node, key):
             if not node:
-                return Node(key)
+                return Node(key, value)
+            if stats is not None:
+                stats.visit(1 if key < node.key else 2)
             if key < node.key:
                 node.left = _insert(node.left, key)
             elif key > node.key:
@@ -77,11 +89,35 @@ class AVLTree:
             return self._balance_subtree(node)
         self.root = _insert(self.root, key)
 
+    def bulk_load(self, items):
+
+        def _build(lo, hi):
+            if lo >= hi:
+                return None
+            mid = (lo + hi) // 2
+            node = Node(*items[mid])
+            node.left = _build(lo, mid)
+            node.right = _build(mid + 1, hi)
+            return node.update_height()
+        self.root = _build(0, len(items))
+
+    def put(self, key, value):
+
+        node = self._find(key)
+        if node:
+            node.value = value
+        else:
+            self.insert(key, value)
+
     def delete(self, key):
 
+        stats = self.stats
+
         def _delete(node, key):
             if not node:
                 return None
+            if stats is not None:
+                stats.visit(1 if key < node.key else 2)
             if key < node.key:
                 node.left = _delete(node.left, key)
             elif key > node.key:
@@ -93,19 +129,31 @@ class AVLTree:
                 while successor.left:
                     successor = successor.left
                 node.key, successor.key = successor.key, node.key
+                node.value, successor.value = successor.value, node.value
                 node.right = _delete(node.right, successor.key)
             return self._balance_subtree(node)
         self.root = _delete(self.root, key)
 
     def search(self, key):
 
-        def _search(node, key):
-            if not node:
-                return False
-            if key == node.key:
-                return True
-            return _search(node.left, key) if key < node.key else _search(node.right, key)
-        return _search(self.root, key)
+        return self._find(key) is not None
+
+    def _find(self, key):
+
+        stats = self.stats
+        node = self.root
+        while node and key != node.key:
+            node = node.left if key < node.key else node.right
+            if stats is not None:
+                stats.visit(2)
+        if node and stats is not None:
+            stats.visit(1)
+        return node
+
+    def get(self, key):
+
+        node = self._find(key)
+        return node.value if node else None
 
     def pre_order(self):
 
@@ -124,3 +172,71 @@ class AVLTree:
                 yield node.key
                 yield from _in_order(node.right)
         yield from _in_order(self.root)
+
+    def range(self, lo=None, hi=None, reverse=False):
+
+        for key, _ in self.range_items(lo, hi, reverse):
+            yield key
+
+    def range_items(self, lo=None, hi=None, reverse=False):
+
+        stack = []
+        node = self.root
+        while stack or node:
+            while node:
+                if reverse and hi is not None and node.key >= hi:
+                    node = node.left
+                elif not reverse and lo is not None and node.key < lo:
+                    node = node.right
+                else:
+                    stack.append(node)
+                    node = node.right if reverse else node.left
+            if not stack:
+                return
+            node = stack.pop()
+            if reverse and lo is not None and node.key < lo:
+                return
+            if not reverse and hi is not None and node.key >= hi:
+                return
+            yield node.key, node.value
+            node = node.left if reverse else node.right
+
+    def __len__(self):
+
+        return self.root.size if self.root else 0
+
+    def rank(self, key):
+
+        count = 0
+        node = self.root
+        while node:
+            if key <= node.key:
+                node = node.left
+            else:
+                count += 1 + (node.left.size if node.left else 0)
+                node = node.right
+        return count
+
+    def select(self, i):
+
+        if not 0 <= i < len(self):
+            raise IndexError("select index out of range")
+        node = self.root
+        while True:
+            left_size = node.left.size if node.left else 0
+            if i < left_size:
+                node = node.left
+            elif i == left_size:
+                return node.key
+            else:
+                i -= left_size + 1
+                node = node.right
+
+    def in_order_items(self):
+
+        def _in_order(node):
+            if node:
+                yield from _in_order(node.left)
+                yield node.key, node.value
+                yield from _in_order(node.right)
+        yield from _in_order(self.root)
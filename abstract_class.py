@@ -1,10 +1,14 @@
 """ abstract class """
 
 from abc import ABC, abstractmethod
+from tree_stats import COUNTERS, TreeStats
 
 class SelfBalancingTree(ABC):
+    disk_resident = False
+    persistent = False
+
     @abstractmethod
-    def insert(self, key):
+    def insert(self, key, value=None):
 
         pass
 
@@ -16,6 +20,48 @@ class SelfBalancingTree(ABC):
     def search(self, key):
         pass
 
+    @abstractmethod
+    def get(self, key):
+        pass
+
+    @abstractmethod
+    def put(self, key, value):
+        pass
+
+    @abstractmethod
+    def items(self):
+        pass
+
+    @abstractmethod
+    def bulk_load(self, items):
+        pass
+
+    @abstractmethod
+    def range_items(self, lo=None, hi=None, reverse=False):
+        pass
+
+    def range(self, lo=None, hi=None, reverse=False):
+        for key, _ in self.range_items(lo, hi, reverse):
+            yield key
+
+    def min_item(self):
+        return next(iter(self.range_items()), None)
+
+    def max_item(self):
+        return next(iter(self.range_items(reverse=True)), None)
+
+    @abstractmethod
+    def rank(self, key):
+        pass
+
+    @abstractmethod
+    def select(self, i):
+        pass
+
+    @abstractmethod
+    def __len__(self):
+        pass
+
     @abstractmethod
     def inorder_traversal(self):
         pass
@@ -25,4 +71,32 @@ class SelfBalancingTree(ABC):
         pass
 
     def is_empty(self):
-        return True
\ No newline at end of file
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def shape(self):
+        return None, len(self)
+
+    def enable_stats(self):
+        if self.tree.stats is None:
+            self.tree.stats = TreeStats()
+        return self.tree.stats
+
+    def disable_stats(self):
+        self.tree.stats = None
+
+    def reset_stats(self):
+        if self.tree.stats is not None:
+            self.tree.stats.reset()
+
+    def stats(self):
+        stats = self.tree.stats
+        result = stats.as_dict() if stats is not None else dict.fromkeys(COUNTERS, 0)
+        result['enabled'] = stats is not None
+        result['height'], result['nodes'] = self.shape()
+        return result
@@ -0,0 +1,95 @@
+""" Aggregate functions """
+
+from functools import lru_cache
+
+AGGREGATE_FUNCTIONS = ("COUNT", "MIN", "MAX", "SUM", "AVG")
+
+def aggregate_label(func, column):
+    return f"{func}({column or '*'})"
+
+def check_aggregates(aggregates, columns):
+    checked = []
+    for func, column in aggregates:
+        func = func.upper()
+        if func not in AGGREGATE_FUNCTIONS:
+            raise ValueError(f"Unknown aggregate function: {func}")
+        if column is None and func != "COUNT":
+            raise ValueError(f"{func} needs a column")
+        if column is not None and column not in columns:
+            raise ValueError(f"Column '{column}' does not exist")
+        checked.append((func, column))
+    if not checked:
+        raise ValueError("No aggregates given")
+    return tuple(checked)
+
+def new_state(aggregates):
+    return [0 if func == "COUNT" else [0, 0] if func in ("SUM", "AVG") else None
+            for func, _ in aggregates]
+
+@lru_cache(maxsize=256)
+def compile_accumulator(aggregates, group_by=()):
+    if not group_by:
+        key = None
+    elif len(group_by) == 1:
+        key = f"rec.get({group_by[0]!r})"
+    else:
+        key = "(" + "".join(f"rec.get({column!r}), " for column in group_by) + ")"
+    lines = ["def accumulate(rows, groups):"]
+    if key is None:
+        lines += ["    state = groups.get(None)",
+                  "    if state is None:",
+                  "        state = groups[None] = new_state(aggregates)",
+                  "    for rec in rows:"]
+    else:
+        lines += ["    for rec in rows:",
+                  f"        key = {key}",
+                  "        state = groups.get(key)",
+                  "        if state is None:",
+                  "            state = groups[key] = new_state(aggregates)"]
+    for i, (func, column) in enumerate(aggregates):
+        if column is None:
+            lines.append(f"        state[{i}] += 1")
+            continue
+        lines += [f"        v = rec.get({column!r})",
+                  "        if v is not None:"]
+        if func == "COUNT":
+            lines.append(f"            state[{i}] += 1")
+        elif func in ("SUM", "AVG"):
+            lines += [f"            total = state[{i}]",
+                      "            total[0] += v",
+                      "            total[1] += 1"]
+        else:
+            op = '<' if func == "MIN" else '>'
+            lines += [f"            if state[{i}] is None or v {op} state[{i}]:",
+                      f"                state[{i}] = v"]
+    lines.append("    return groups")
+    namespace = {'new_state': new_state, 'aggregates': aggregates}
+    exec(compile("\n".join(lines) + "\n", "<aggregate>", "exec"), namespace)
+    return namespace['accumulate']
+
+def merge_groups(target, groups, aggregates):
+    for key, state in groups.items():
+        current = target.get(key)
+        if current is None:
+            target[key] = state
+            continue
+        for i, (func, _) in enumerate(aggregates):
+            if func == "COUNT":
+                current[i] += state[i]
+            elif func in ("SUM", "AVG"):
+                current[i][0] += state[i][0]
+                current[i][1] += state[i][1]
+            elif state[i] is not None and (current[i] is None
+                                           or (state[i] < current[i]) == (func == "MIN")):
+                current[i] = state[i]
+    return target
+
+def finish(state, aggregates):
+    values = []
+    for (func, _), value in zip(aggregates, state):
+        if func == "SUM":
+            value = value[0] if value[1] else None
+        elif func == "AVG":
+            value = value[0] / value[1] if value[1] else None
+        values.append(value)
+    return values
@@ -1,71 +1,139 @@
 """ B-tree """
 
+from bisect import bisect_left
+
 class BTreeNode:
     def __init__(self, leaf=True):
         self.leaf = leaf
         self.keys = []
+        self.values = []
         self.children = []
+        self.size = 0
 
 class BTree:
     def __init__(self, t):
         self.root = BTreeNode(True)
         self.t = t
+        self.stats = None
 
-    def insert(self, k):
+    def insert(self, k, v=None):
         root = self.root
         if len(root.keys) == (2 * self.t) - 1:
             temp = BTreeNode(leaf=False)
             self.root = temp
             temp.children.append(root)
+            temp.size = root.size
             self.split_child(temp, 0)
-            self.insert_non_full(temp, k)
+            self.insert_non_full(temp, k, v)
         else:
-            self.insert_non_full(root, k)
+            self.insert_non_full(root, k, v)
 
-    def insert_non_full(self, x, k):
+    def insert_non_full(self, x, k, v=None):
+        x.size += 1
         i = len(x.keys) - 1
         if x.leaf:
             x.keys.append(None)
+            x.values.append(None)
             while i >= 0 and k < x.keys[i]:
                 x.keys[i + 1] = x.keys[i]
+                x.values[i + 1] = x.values[i]
                 i -= 1
+            if self.stats is not None:
+                self.stats.visit(len(x.keys) - 2 - i + (i >= 0))
             x.keys[i + 1] = k
+            x.values[i + 1] = v
         else:
             while i >= 0 and k < x.keys[i]:
                 i -= 1
+            if self.stats is not None:
+                self.stats.visit(len(x.keys) - 1 - i + (i >= 0))
             i += 1
             if len(x.children[i].keys) == (2 * self.t) - 1:
                 self.split_child(x, i)
+                if self.stats is not None:
+                    self.stats.comparisons += 1
                 if k > x.keys[i]:
                     i += 1
-            self.insert_non_full(x.children[i], k)
+            self.insert_non_full(x.children[i], k, v)
 
     def split_child(self, x, i):
+        if self.stats is not None:
+            self.stats.splits += 1
         t = self.t
         y = x.children[i]
         z = BTreeNode(leaf=y.leaf)
         x.keys.insert(i, y.keys[t - 1])
+        x.values.insert(i, y.values[t - 1])
         z.keys = y.keys[t:]
+        z.values = y.values[t:]
         y.keys = y.keys[:t - 1]
+        y.values = y.values[:t - 1]
         if not y.leaf:
             z.children = y.children[t:]
             y.children = y.children[:t]
+        z.size = len(z.keys) + sum(child.size for child in z.children)
+        y.size -= z.size + 1
         x.children.insert(i + 1, z)
 
+    def bulk_load(self, items):
+        height = 0
+        while (2 * self.t) ** (height + 1) - 1 < len(items):
+            height += 1
+        self.root = self._build(items, 0, len(items), height, 2)
+
+    def _build(self, items, lo, hi, height, min_children):
+        node = BTreeNode(leaf=height == 0)
+        node.size = hi - lo
+        if height == 0:
+            node.keys = [k for k, _ in items[lo:hi]]
+            node.values = [v for _, v in items[lo:hi]]
+            return node
+        n = hi - lo
+        child_capacity = (2 * self.t) ** height
+        count = max(min_children, -(-(n + 1) // child_capacity))
+        size, extra = divmod(n - (count - 1), count)
+        pos = lo
+        for i in range(count):
+            end = pos + size + (1 if i < extra else 0)
+            node.children.append(self._build(items, pos, end, height - 1, self.t))
+            pos = end
+            if i < count - 1:
+                node.keys.append(items[pos][0])
+                node.values.append(items[pos][1])
+                pos += 1
+        return node
+
     def search(self, k, node=None):
         if node is None:
             node = self.root
         i = 0
         while i < len(node.keys) and k > node.keys[i]:
             i += 1
+        if self.stats is not None:
+            self.stats.visit(i + 2 if i < len(node.keys) else i)
         if i < len(node.keys) and k == node.keys[i]:
             return (node, i)
         if node.leaf:
             return None
         return self.search(k, node.children[i])
 
+    def get(self, k):
+        found = self.search(k)
+        if found is None:
+            return None
+        node, i = found
+        return node.values[i]
+
+    def put(self, k, v):
+        found = self.search(k)
+        if found is None:
+            self.insert(k, v)
+        else:
+            node, i = found
+            node.values[i] = v
+
     def delete(self, k):
-        if not self.root:
+        if not self.root or self.search(k) is None:
             return
         self._delete(self.root, k)
 
@@ -74,25 +142,31 @@ class BTree:
 
     def _delete(self, node, k):
         t = self.t
+        node.size -= 1
 
         i = 0
         while i < len(node.keys) and k > node.keys[i]:
             i += 1
+        if self.stats is not None:
+            self.stats.visit(i + 2 if i < len(node.keys) else i)
 
         if i < len(node.keys) and k == node.keys[i]:
             if node.leaf:
                 node.keys.pop(i)
+                node.values.pop(i)
                 return
 
             else:
                 if len(node.children[i].keys) >= t:
-                    pred = self._get_predecessor(node, i)
+                    pred, pred_value = self._get_predecessor(node, i)
                     node.keys[i] = pred
+                    node.values[i] = pred_value
                     self._delete(node.children[i], pred)
 
                 elif len(node.children[i + 1].keys) >= t:
-                    succ = self._get_successor(node, i)
+                    succ, succ_value = self._get_successor(node, i)
                     node.keys[i] = succ
+                    node.values[i] = succ_value
                     self._delete(node.children[i + 1], succ)
 
                 else:
@@ -118,27 +192,33 @@ class BTree:
         curr = node.children[index]
         while not curr.leaf:
             curr = curr.children[-1]
-        return curr.keys[-1]
+        return curr.keys[-1], curr.values[-1]
 
     def _get_successor(self, node, index):
 
         curr = node.children[index + 1]
         while not curr.leaf:
             curr = curr.children[0]
-        return curr.keys[0]
+        return curr.keys[0], curr.values[0]
 
     def _merge_children(self, node, index):
 
+        if self.stats is not None:
+            self.stats.merges += 1
         left_child = node.children[index]
         right_child = node.children[index + 1]
 
         left_child.keys.append(node.keys[index])
+        left_child.values.append(node.values[index])
 
         left_child.keys.extend(right_child.keys)
+        left_child.values.extend(right_child.values)
         if not left_child.leaf:
             left_child.children.extend(right_child.children)
+        left_child.size += right_child.size + 1
 
         node.keys.pop(index)
+        node.values.pop(index)
         node.children.pop(index + 1)
 
     def _fill_child(self, node, index):
@@ -157,27 +237,75 @@ class BTree:
 
     def _borrow_from_prev(self, node, index):
 
+        if self.stats is not None:
+            self.stats.borrows += 1
         child = node.children[index]
         sibling = node.children[index - 1]
 
         child.keys.insert(0, node.keys[index - 1])
+        child.values.insert(0, node.values[index - 1])
 
         node.keys[index - 1] = sibling.keys.pop()
+        node.values[index - 1] = sibling.values.pop()
 
+        moved = 1
         if not sibling.leaf:
             child.children.insert(0, sibling.children.pop())
+            moved += child.children[0].size
+        child.size += moved
+        sibling.size -= moved
 
     def _borrow_from_next(self, node, index):
 
+        if self.stats is not None:
+            self.stats.borrows += 1
         child = node.children[index]
         sibling = node.children[index + 1]
 
         child.keys.append(node.keys[index])
+        child.values.append(node.values[index])
 
         node.keys[index] = sibling.keys.pop(0)
+        node.values[index] = sibling.values.pop(0)
 
+        moved = 1
         if not sibling.leaf:
             child.children.append(sibling.children.pop(0))
+            moved += child.children[-1].size
+        child.size += moved
+        sibling.size -= moved
+
+    def __len__(self):
+        return self.root.size
+
+    def rank(self, k):
+        count = 0
+        node = self.root
+        while True:
+            i = bisect_left(node.keys, k)
+            count += i
+            if not node.leaf:
+                count += sum(child.size for child in node.children[:i])
+            if node.leaf or (i < len(node.keys) and node.keys[i] == k):
+                if not node.leaf:
+                    count += node.children[i].size
+                return count
+            node = node.children[i]
+
+    def select(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError("select index out of range")
+        node = self.root
+        while not node.leaf:
+            for j, child in enumerate(node.children):
+                if i < child.size:
+                    node = child
+                    break
+                i -= child.size
+                if i == 0:
+                    return node.keys[j]
+                i -= 1
+        return node.keys[i]
 
     def inorder_traversal(self):
         result = []
@@ -194,6 +322,58 @@ class BTree:
         if not node.leaf and node.children:
             self._inorder_traversal(node.children[-1], result)
 
+    def inorder_items(self):
+        result = []
+        self._inorder_items(self.root, result)
+        return result
+
+    def _inorder_items(self, node, result):
+        for i, key in enumerate(node.keys):
+            if not node.leaf:
+                self._inorder_items(node.children[i], result)
+            result.append((key, node.values[i]))
+        if not node.leaf and node.children:
+            self._inorder_items(node.children[-1], result)
+
+    def range(self, lo=None, hi=None, reverse=False):
+        for key, _ in self.range_items(lo, hi, reverse):
+            yield key
+
+    def range_items(self, lo=None, hi=None, reverse=False):
+        stack = []
+        node = self.root
+        while node is not None:
+            if reverse:
+                i = bisect_left(node.keys, hi) if hi is not None else len(node.keys)
+            else:
+                i = bisect_left(node.keys, lo) if lo is not None else 0
+            stack.append((node, i))
+            node = None if node.leaf else node.children[i]
+        while stack:
+            node, i = stack.pop()
+            if reverse:
+                if i == 0:
+                    continue
+                i -= 1
+                if lo is not None and node.keys[i] < lo:
+                    return
+                next_child = i
+            else:
+                if i >= len(node.keys):
+                    continue
+                if hi is not None and node.keys[i] >= hi:
+                    return
+                next_child = i + 1
+            yield node.keys[i], node.values[i]
+            stack.append((node, i if reverse else i + 1))
+            if not node.leaf:
+                child = node.children[next_child]
+                while True:
+                    stack.append((child, len(child.keys) if reverse else 0))
+                    if child.leaf:
+                        break
+                    child = child.children[-1 if reverse else 0]
+
     def preorder_traversal(self):
         result = []
         self._preorder_traversal(self.root, result)
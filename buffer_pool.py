@@ -0,0 +1,146 @@
+""" Buffer pool """
+
+import threading
+from collections import deque
+
+class Frame:
+    def __init__(self, owner, page_no, data):
+        self.owner = owner
+        self.page_no = page_no
+        self.data = data
+        self.pin_count = 0
+        self.dirty = False
+        self.ref = True
+        self.history = deque()
+
+class BufferPool:
+    def __init__(self, capacity=1024, policy="clock", k=2):
+        if capacity < 1:
+            raise ValueError("Buffer pool needs at least one frame")
+        policy = policy.lower()
+        if policy not in ("clock", "lru-k"):
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.capacity = capacity
+        self.policy = policy
+        self.k = k
+        self.lock = threading.RLock()
+        self.frames = [None] * capacity
+        self.page_table = {}
+        self.free_frames = list(range(capacity - 1, -1, -1))
+        self.hand = 0
+        self.tick = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writebacks = 0
+
+    def fetch_page(self, owner, page_no):
+        with self.lock:
+            return self._fetch_page(owner, page_no)
+
+    def _fetch_page(self, owner, page_no):
+        self.tick += 1
+        idx = self.page_table.get((owner, page_no))
+        if idx is not None:
+            self.hits += 1
+            frame = self.frames[idx]
+        else:
+            self.misses += 1
+            idx = self._free_frame()
+            frame = Frame(owner, page_no, bytearray(owner.read_page(page_no)))
+            self.frames[idx] = frame
+            self.page_table[(owner, page_no)] = idx
+        frame.pin_count += 1
+        frame.ref = True
+        frame.history.append(self.tick)
+        if len(frame.history) > self.k:
+            frame.history.popleft()
+        return frame
+
+    def unpin_page(self, owner, page_no, dirty=False):
+        with self.lock:
+            frame = self.frames[self.page_table[(owner, page_no)]]
+            if frame.pin_count == 0:
+                raise ValueError(f"Page {page_no} is not pinned")
+            frame.pin_count -= 1
+            frame.dirty = frame.dirty or dirty
+
+    def _free_frame(self):
+        if self.free_frames:
+            return self.free_frames.pop()
+        idx = self._clock_victim() if self.policy == "clock" else self._lru_k_victim()
+        frame = self.frames[idx]
+        if frame.dirty:
+            frame.owner.write_page(frame.page_no, frame.data)
+            self.writebacks += 1
+        del self.page_table[(frame.owner, frame.page_no)]
+        self.frames[idx] = None
+        self.evictions += 1
+        return idx
+
+    def _clock_victim(self):
+        for _ in range(2 * self.capacity):
+            idx = self.hand
+            self.hand = (self.hand + 1) % self.capacity
+            frame = self.frames[idx]
+            if frame.pin_count:
+                continue
+            if frame.ref:
+                frame.ref = False
+                continue
+            return idx
+        raise ValueError("Buffer pool exhausted: all frames are pinned")
+
+    def _lru_k_victim(self):
+        candidates = [idx for idx, frame in enumerate(self.frames) if not frame.pin_count]
+        if not candidates:
+            raise ValueError("Buffer pool exhausted: all frames are pinned")
+        return min(candidates, key=lambda idx: (len(self.frames[idx].history) >= self.k,
+                                                self.frames[idx].history[0]))
+
+    def dirty_pages(self, owner):
+        with self.lock:
+            return [frame.page_no for frame in self.frames
+                    if frame is not None and frame.owner is owner and frame.dirty]
+
+    def flush_owner(self, owner):
+        with self.lock:
+            for frame in self.frames:
+                if frame is not None and frame.owner is owner and frame.dirty:
+                    owner.write_page(frame.page_no, frame.data)
+                    frame.dirty = False
+                    self.writebacks += 1
+
+    def drop_owner(self, owner):
+        with self.lock:
+            self.flush_owner(owner)
+            for idx, frame in enumerate(self.frames):
+                if frame is not None and frame.owner is owner:
+                    del self.page_table[(owner, frame.page_no)]
+                    self.frames[idx] = None
+                    self.free_frames.append(idx)
+
+    def stats(self):
+        with self.lock:
+            used = [frame for frame in self.frames if frame is not None]
+            hits, misses = self.hits, self.misses
+        requests = hits + misses
+        return {
+            'policy': self.policy,
+            'capacity': self.capacity,
+            'used': len(used),
+            'pinned': sum(1 for frame in used if frame.pin_count),
+            'dirty': sum(1 for frame in used if frame.dirty),
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / requests if requests else 0.0,
+            'evictions': self.evictions,
+            'writebacks': self.writebacks,
+        }
+
+    def reset_stats(self):
+        with self.lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.writebacks = 0
@@ -0,0 +1,203 @@
+""" Columnar storage """
+
+import json
+import mmap
+import os
+import struct
+
+COLUMN_TYPES = ("INT", "FLOAT", "TEXT")
+INT_NULL = -(1 << 63)
+TEXT_NULL = -1
+INITIAL_ROWS = 1024
+
+_INT = struct.Struct('q')
+_FLOAT = struct.Struct('d')
+_LEN = struct.Struct('i')
+
+def coerce(column_type, value):
+    if value is None:
+        return None
+    if column_type == "INT":
+        if isinstance(value, float) and not value.is_integer():
+            raise ValueError(f"Value {value!r} is not an INT")
+        value = int(value)
+        if value == INT_NULL or not INT_NULL < value < (1 << 63):
+            raise ValueError(f"INT value out of range: {value}")
+        return value
+    if column_type == "FLOAT":
+        return float(value)
+    return str(value)
+
+class MappedFile:
+    def __init__(self, path, size):
+        mode = 'r+b' if os.path.exists(path) else 'w+b'
+        self.file = open(path, mode)
+        if os.path.getsize(path) < size:
+            self.file.truncate(size)
+        self.mm = mmap.mmap(self.file.fileno(), 0)
+
+    def ensure(self, size):
+        if size <= len(self.mm):
+            return
+        new_size = max(size, 2 * len(self.mm))
+        self.mm.close()
+        self.file.truncate(new_size)
+        self.mm = mmap.mmap(self.file.fileno(), 0)
+
+    def view(self, typecode, count, width):
+        return memoryview(self.mm)[:count * width].cast(typecode)
+
+    def flush(self):
+        self.mm.flush()
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
+
+class NumericColumn:
+    def __init__(self, base, name, column_type, rows):
+        self.codec = _INT if column_type == "INT" else _FLOAT
+        self.typecode = self.codec.format
+        self.width = self.codec.size
+        self.data = MappedFile(f"{base}.{name}.col", max(rows, INITIAL_ROWS) * self.width)
+
+    def get(self, rid):
+        return self.decode(self.codec.unpack_from(self.data.mm, rid * self.width)[0])
+
+    def decode(self, value):
+        if self.typecode == 'q':
+            return None if value == INT_NULL else value
+        return None if value != value else value
+
+    def append(self, rid, value):
+        if value is None:
+            value = INT_NULL if self.typecode == 'q' else float('nan')
+        self.data.ensure((rid + 1) * self.width)
+        self.codec.pack_into(self.data.mm, rid * self.width, value)
+
+    def view(self, rows):
+        return self.data.view(self.typecode, rows, self.width)
+
+    def files(self):
+        return [self.data]
+
+    def state(self):
+        return {}
+
+class TextColumn:
+    def __init__(self, base, name, rows, blob_size=0):
+        capacity = max(rows, INITIAL_ROWS)
+        self.offsets = MappedFile(f"{base}.{name}.off", capacity * _INT.size)
+        self.lengths = MappedFile(f"{base}.{name}.len", capacity * _LEN.size)
+        self.blob = MappedFile(f"{base}.{name}.blob", max(blob_size, 1 << 16))
+        self.blob_size = blob_size
+
+    def get(self, rid):
+        length = _LEN.unpack_from(self.lengths.mm, rid * _LEN.size)[0]
+        if length == TEXT_NULL:
+            return None
+        offset = _INT.unpack_from(self.offsets.mm, rid * _INT.size)[0]
+        return self.blob.mm[offset:offset + length].decode('utf-8')
+
+    def append(self, rid, value):
+        self.offsets.ensure((rid + 1) * _INT.size)
+        self.lengths.ensure((rid + 1) * _LEN.size)
+        if value is None:
+            _INT.pack_into(self.offsets.mm, rid * _INT.size, self.blob_size)
+            _LEN.pack_into(self.lengths.mm, rid * _LEN.size, TEXT_NULL)
+            return
+        data = value.encode('utf-8')
+        self.blob.ensure(self.blob_size + len(data))
+        self.blob.mm[self.blob_size:self.blob_size + len(data)] = data
+        _INT.pack_into(self.offsets.mm, rid * _INT.size, self.blob_size)
+        _LEN.pack_into(self.lengths.mm, rid * _LEN.size, len(data))
+        self.blob_size += len(data)
+
+    def files(self):
+        return [self.offsets, self.lengths, self.blob]
+
+    def state(self):
+        return {'blob_size': self.blob_size}
+
+class ColumnStore:
+    def __init__(self, base, columns, column_types):
+        self.header_path = f"{base}.cols"
+        header = {'rows': 0, 'columns': {}}
+        if os.path.exists(self.header_path):
+            with open(self.header_path, 'r', encoding='utf-8') as f:
+                header = json.load(f)
+        self.rows = header['rows']
+        self.names = list(columns)
+        self.types = {name: column_types.get(name, "TEXT") for name in columns}
+        self.columns = {}
+        for name in columns:
+            column_type = self.types[name]
+            if column_type not in COLUMN_TYPES:
+                raise ValueError(f"Unknown column type: {column_type}")
+            if column_type == "TEXT":
+                state = header['columns'].get(name, {})
+                self.columns[name] = TextColumn(base, name, self.rows, state.get('blob_size', 0))
+            else:
+                self.columns[name] = NumericColumn(base, name, column_type, self.rows)
+
+    def append(self, record):
+        rid = self.rows
+        for name, column in self.columns.items():
+            column.append(rid, record.get(name))
+        self.rows += 1
+        return rid
+
+    def get(self, rid, name):
+        column = self.columns.get(name)
+        return column.get(rid) if column is not None else None
+
+    def row(self, rid, names=None):
+        return {name: self.get(rid, name) for name in (names or self.names)}
+
+    def fetch(self, rids, predicates, matches, names=None, offset=0, limit=None):
+        if limit == 0:
+            return []
+        needed = set(predicates.columns) | set(names or self.names)
+        views = {name: self.columns[name].view(self.rows) for name in needed
+                 if isinstance(self.columns.get(name), NumericColumn)}
+
+        def value(rid, name):
+            view = views.get(name)
+            if view is None:
+                return self.get(rid, name)
+            return self.columns[name].decode(view[rid])
+
+        result = []
+        try:
+            for rid in rids:
+                if predicates and not matches({col: value(rid, col) for col in predicates.columns},
+                                              predicates):
+                    continue
+                if offset:
+                    offset -= 1
+                    continue
+                result.append({name: value(rid, name) for name in (names or self.names)})
+                if limit is not None and len(result) >= limit:
+                    break
+        finally:
+            for view in views.values():
+                view.release()
+        return result
+
+    def flush(self):
+        for column in self.columns.values():
+            for data in column.files():
+                data.flush()
+        header = {
+            'rows': self.rows,
+            'columns': {name: column.state() for name, column in self.columns.items()},
+        }
+        tmp_path = f"{self.header_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(header, f)
+        os.replace(tmp_path, self.header_path)
+
+    def close(self):
+        for column in self.columns.values():
+            for data in column.files():
+                data.close()
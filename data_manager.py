@@ -1,17 +1,207 @@
 """ data manager """
 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from aggregates import aggregate_label, check_aggregates, compile_accumulator, finish, merge_groups
+from buffer_pool import BufferPool
+from column_store import COLUMN_TYPES, ColumnStore, coerce
 from tree_factory import TreeFactory
+from bisect import bisect_right
+from itertools import islice
+from operator import itemgetter
+from partitioning import make_spec, partition_name, partition_of, prune
+from query_planner import Condition, Plan, QueryPlanner, matches, parse_conditions
+from rwlock import RWLock
+from snapshot import is_snapshot, read_snapshot, write_snapshot
+import atexit
+import heapq
 import json
 import os
 import pickle
+import threading
+import time
+import weakref
+
+SNAPSHOT_BUFFER = 1 << 20
+
+class DuplicateKeyError(ValueError):
+    pass
+
+def _encode_condition(value):
+    if isinstance(value, Condition):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _comparable(value, other):
+    try:
+        value < other
+    except TypeError:
+        return False
+    return True
+
+def _scan_partition(state, bounds):
+    tree, store, predicates, columns, count_only = state
+    lo, hi = bounds
+
+    def payloads():
+        for key, payload in tree.range_items(lo):
+            if hi is not None and key >= hi:
+                return
+            yield payload
+
+    if store is not None:
+        rows = store.fetch(payloads(), predicates, matches, columns)
+    else:
+        rows = [rec for rec in payloads() if matches(rec, predicates)]
+        if columns:
+            rows = [{col: rec.get(col) for col in columns} for rec in rows]
+    return len(rows) if count_only else rows
+
+def _fork_map(func, args):
+    children = []
+    try:
+        for arg in args:
+            read_fd, write_fd = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                status = 1
+                try:
+                    os.close(read_fd)
+                    try:
+                        outcome = (True, func(arg))
+                    except Exception as e:
+                        outcome = (False, e)
+                    with os.fdopen(write_fd, 'wb') as out:
+                        pickle.dump(outcome, out, pickle.HIGHEST_PROTOCOL)
+                    status = 0
+                finally:
+                    os._exit(status)
+            os.close(write_fd)
+            children.append([pid, os.fdopen(read_fd, 'rb')])
+        results = []
+        for child in children:
+            with child[1] as f:
+                data = f.read()
+            if not data:
+                raise RuntimeError("Parallel scan worker died")
+            ok, value = pickle.loads(data)
+            if not ok:
+                raise value
+            results.append(value)
+        return results
+    finally:
+        for pid, f in children:
+            f.close()
+            os.waitpid(pid, 0)
+
+def _close_at_exit(ref):
+    dm = ref()
+    if dm is not None:
+        dm.close()
+
+class TableVersion(dict):
+    __hash__ = object.__hash__
+
+class Session:
+    def __init__(self, manager, db_name=None):
+        self.manager = manager
+        self.state = {'db': db_name, 'txn': None}
+
+    @property
+    def current_db(self):
+        return self.state['db']
+
+    def __getattr__(self, name):
+        attr = getattr(self.manager, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            local = self.manager._local
+            previous = getattr(local, 'state', None)
+            local.state = self.state
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                local.state = previous
+
+        return call
 
 class DataManager:
-    def __init__(self, db_dir="./db"):
+    def __init__(self, db_dir="./db", flush_every=1000, flush_bytes=4 << 20,
+                 max_tables=16, memory_budget=64 << 20, wal_fsync=True,
+                 buffer_frames=1024, buffer_policy="clock", bulk_threshold=1024,
+                 parallel_threshold=100000, scan_workers=None, stream_batch=1024,
+                 result_cache_size=0, result_cache_bytes=16 << 20):
         self.db_dir = db_dir
+        self.flush_every = flush_every
+        self.flush_bytes = flush_bytes
+        self.max_tables = max_tables
+        self.memory_budget = memory_budget
+        self.wal_fsync = wal_fsync
+        self.bulk_threshold = bulk_threshold
+        self.parallel_threshold = parallel_threshold
+        self.scan_workers = scan_workers or os.cpu_count() or 1
+        self.stream_batch = stream_batch
+        self.result_cache_size = result_cache_size
+        self.result_cache_bytes = result_cache_bytes
+        self._partition_executor = None
 
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._table_locks = {}
+        self._versions = weakref.WeakSet()
+        self._results_lock = threading.Lock()
+        self._results = OrderedDict()
+        self._result_keys = {}
+        self._result_bytes = 0
+        self._result_counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+        self._table_versions = {}
         self.databases = {}
         self.current_db = None
+        self._tables = OrderedDict()
+        self._wals = {}
+        self.buffer_pool = BufferPool(buffer_frames, buffer_policy)
+        self.planner = QueryPlanner()
         self._init_storage()
+        atexit.register(_close_at_exit, weakref.ref(self))
+
+    def _state(self):
+        state = getattr(self._local, 'state', None)
+        if state is None:
+            state = self._local.state = {'db': None, 'txn': None}
+        return state
+
+    @property
+    def current_db(self):
+        return self._state()['db']
+
+    @current_db.setter
+    def current_db(self, db_name):
+        self._state()['db'] = db_name
+
+    def _profile(self):
+        return getattr(self._local, 'profile', None)
+
+    @contextmanager
+    def profiling(self):
+        profile = {'load': 0.0, 'tree': 0.0, 'filter': 0.0, 'write': 0.0,
+                   'examined': 0, 'affected': 0, 'nodes': 0}
+        previous = self._profile()
+        pages = self.buffer_pool.stats()
+        self._local.profile = profile
+        try:
+            yield profile
+        finally:
+            self._local.profile = previous
+            after = self.buffer_pool.stats()
+            profile['nodes'] += after['hits'] + after['misses'] - pages['hits'] - pages['misses']
+
+    def session(self, db_name=None):
+        if db_name is not None and db_name not in self.databases:
+            raise ValueError(f"Database '{db_name}' does not exist")
+        return Session(self, db_name)
 
     def _init_storage(self):
         os.makedirs(self.db_dir, exist_ok=True)
@@ -24,139 +214,1287 @@ class DataManager:
                 self.databases = json.load(f)
         else:
             self.databases = {}
+        for db_name in self.databases:
+            self._replay_wal(db_name)
 
     def _save_databases(self):
         meta_path = os.path.join(self.db_dir, 'meta.json')
-        with open(meta_path, 'w', encoding='utf-8') as f:
-            json.dump(self.databases, f, ensure_ascii=False, indent=2)
+        tmp_path = f"{meta_path}.tmp"
+        with self._lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.databases, f, ensure_ascii=False, indent=2)
+                if self.wal_fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, meta_path)
+
+    def _wal_path(self, db_name):
+        return os.path.join(self.db_dir, db_name, 'wal.log')
+
+    def _wal(self, db_name):
+        with self._lock:
+            wal = self._wals.get(db_name)
+            if wal is None:
+                lsn = max((meta.get('lsn', 0) for meta in self.databases[db_name].values()), default=0)
+                wal = {
+                    'file': open(self._wal_path(db_name), 'a', encoding='utf-8'),
+                    'lsn': lsn,
+                    'records': 0,
+                    'lock': threading.Lock(),
+                    'sync': threading.Condition(),
+                    'syncing': False,
+                    'synced_lsn': lsn,
+                    'fsyncs': 0,
+                }
+                self._wals[db_name] = wal
+            return wal
+
+    def _replay_wal(self, db_name):
+        wal_path = self._wal_path(db_name)
+        if not os.path.exists(wal_path):
+            return
+        wal = self._wal(db_name)
+        replayed = set()
+        with open(wal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                wal['lsn'] = max(wal['lsn'], entry['lsn'])
+                for sub in entry['entries'] if entry['op'] == 'txn' else [entry]:
+                    meta = self.databases[db_name].get(sub['table'])
+                    if meta is None or entry['lsn'] <= meta.get('lsn', 0):
+                        continue
+                    try:
+                        self._apply(db_name, sub)
+                    except DuplicateKeyError:
+                        continue
+                    except ValueError as e:
+                        raise ValueError(f"Cannot replay WAL record {entry['lsn']} for table "
+                                         f"'{sub['table']}' in database '{db_name}': {e}") from e
+                    replayed.add(sub['table'])
+        for table_name in sorted(replayed):
+            table = self._tables.get((db_name, table_name))
+            if table is not None:
+                self._publish(table)
+        if replayed:
+            self.checkpoint(db_name)
+        else:
+            with wal['lock']:
+                self._truncate_wal(db_name)
+
+    def _log(self, db_name, entry):
+        wal = self._wal(db_name)
+        with wal['lock']:
+            wal['lsn'] += 1
+            entry['lsn'] = wal['lsn']
+            f = wal['file']
+            f.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':'),
+                               default=_encode_condition) + '\n')
+            f.flush()
+            wal['records'] += 1
+            return entry['lsn'], wal['records'] >= self.flush_every or f.tell() >= self.flush_bytes
+
+    def _sync(self, db_name, lsn):
+        if not self.wal_fsync:
+            return
+        wal = self._wal(db_name)
+        with wal['sync']:
+            while wal['synced_lsn'] < lsn:
+                if wal['syncing']:
+                    wal['sync'].wait()
+                    continue
+                wal['syncing'] = True
+                with wal['lock']:
+                    target = wal['lsn']
+                    fd = wal['file'].fileno()
+                synced = wal['synced_lsn']
+                wal['sync'].release()
+                try:
+                    os.fsync(fd)
+                    synced = target
+                finally:
+                    wal['sync'].acquire()
+                    wal['syncing'] = False
+                    wal['fsyncs'] += 1
+                    wal['synced_lsn'] = max(wal['synced_lsn'], synced)
+                    wal['sync'].notify_all()
+
+    def wal_stats(self, db_name=None):
+        wal = self._wal(db_name or self.current_db)
+        with wal['sync']:
+            return {'lsn': wal['lsn'], 'synced_lsn': wal['synced_lsn'], 'fsyncs': wal['fsyncs'],
+                    'records': wal['records']}
+
+    def _truncate_wal(self, db_name):
+        wal = self._wal(db_name)
+        wal['file'].truncate(0)
+        wal['file'].seek(0)
+        wal['records'] = 0
+
+    def _apply(self, db_name, entry):
+        op = entry['op']
+        if op == 'insert':
+            return self._apply_insert(db_name, entry['table'], entry['values'])
+        if op == 'insert_many':
+            return self._apply_insert_many(db_name, entry['table'], entry['rows'])
+        if op == 'update':
+            return self._apply_update(db_name, entry['table'], entry['updates'], entry['conditions'])
+        if op == 'delete':
+            return self._apply_delete(db_name, entry['table'], entry['conditions'])
+        raise ValueError(f"Unknown log record: {op}")
+
+    def _table_paths(self, db_name, table_name):
+        base = os.path.join(self.db_dir, db_name, table_name)
+        return f"{base}.tree", f"{base}.json"
+
+    def _index_file_name(self, table_name, index_name):
+        return f"{table_name}.{index_name}"
+
+    def _create_tree(self, db_name, file_name, meta):
+        options = meta.get('tree_options', {})
+        if TreeFactory.is_disk_resident(meta['tree_type']):
+            base = os.path.join(self.db_dir, db_name, file_name)
+            return TreeFactory.create_tree(meta['tree_type'], path=f"{base}.pages",
+                                           pool=self.buffer_pool, **options)
+        return TreeFactory.create_tree(meta['tree_type'], **options)
+
+    def _load_tree(self, db_name, file_name, meta):
+        if TreeFactory.is_disk_resident(meta['tree_type']):
+            return self._create_tree(db_name, file_name, meta), 0
+        tree_path, _ = self._table_paths(db_name, file_name)
+        with open(tree_path, 'rb', buffering=SNAPSHOT_BUFFER) as f:
+            if not is_snapshot(f):
+                return pickle.load(f), os.path.getsize(tree_path)
+            _, items = read_snapshot(f)
+            tree = self._create_tree(db_name, file_name, meta)
+            tree.bulk_load(items)
+        return tree, os.path.getsize(tree_path)
+
+    def _save_tree(self, db_name, file_name, tree, meta):
+        if tree.disk_resident:
+            tree.flush()
+            return 0
+        tree_path, _ = self._table_paths(db_name, file_name)
+        tmp_path = f"{tree_path}.tmp"
+        with open(tmp_path, 'wb', buffering=SNAPSHOT_BUFFER) as f:
+            write_snapshot(f, meta['tree_type'], meta.get('tree_options', {}), len(tree),
+                           tree.range_items(), meta.get('columns'))
+        os.replace(tmp_path, tree_path)
+        return os.path.getsize(tree_path)
+
+    def _open_store(self, db_name, table_name, meta):
+        base = os.path.join(self.db_dir, db_name, table_name)
+        return ColumnStore(base, meta['columns'], meta.get('column_types', {}))
+
+    def _coerce(self, meta, record):
+        column_types = meta.get('column_types')
+        if column_types:
+            for col, value in record.items():
+                if col in column_types:
+                    record[col] = coerce(column_types[col], value)
+        return record
+
+    def _payload(self, table, record):
+        store = table['store']
+        return store.append(record) if store is not None else record
+
+    def _table_lock(self, db_name, table_name):
+        with self._lock:
+            lock = self._table_locks.get((db_name, table_name))
+            if lock is None:
+                lock = self._table_locks[(db_name, table_name)] = RWLock()
+            return lock
+
+    @contextmanager
+    def _reading(self, db_name, table_name):
+        meta = self.databases[db_name][table_name]
+        lock = self._table_lock(db_name, table_name)
+        tree_types = [meta['tree_type']] + [index_meta['tree_type']
+                                            for index_meta in meta.get('indexes', {}).values()]
+        if any(TreeFactory.has_mutating_reads(tree_type) for tree_type in tree_types):
+            with lock.write_locked():
+                yield
+        else:
+            with lock.read_locked():
+                yield
+
+    def _writing(self, db_name, table_name):
+        return self._table_lock(db_name, table_name).write_locked()
+
+    def _table_meta(self, table_name):
+        if self.current_db is None:
+            raise ValueError("No database selected")
+        db_meta = self.databases[self.current_db]
+        if table_name not in db_meta:
+            raise ValueError(f"Table '{table_name}' does not exist")
+        return db_meta[table_name]
+
+    def _open_table(self, db_name, table_name):
+        with self._lock:
+            cache_key = (db_name, table_name)
+            table = self._tables.get(cache_key)
+            if table is not None:
+                self._tables.move_to_end(cache_key)
+                return table
+            started = time.perf_counter()
+            _, data_path = self._table_paths(*cache_key)
+            meta = self.databases[db_name][table_name]
+            dirty = False
+            columnar = meta.get('storage') == 'columnar'
+            if (not TreeFactory.is_disk_resident(meta['tree_type']) and not columnar
+                    and os.path.exists(data_path)):
+                tree = self._create_tree(db_name, table_name, meta)
+                with open(data_path, 'r', encoding='utf-8') as f:
+                    for rec in json.load(f):
+                        tree.put(rec[meta['primary_key']], rec)
+                size = os.path.getsize(data_path)
+                dirty = True
+            else:
+                tree, size = self._load_tree(db_name, table_name, meta)
+            indexes = {}
+            index_distinct = {}
+            for index_name, index_meta in meta.get('indexes', {}).items():
+                indexes[index_name], index_size = self._load_tree(
+                    db_name, self._index_file_name(table_name, index_name), index_meta)
+                size += index_size
+                index_distinct[index_name] = index_meta.get('distinct')
+                if index_distinct[index_name] is None:
+                    index_distinct[index_name] = len(indexes[index_name])
+            rows = meta.get('row_count')
+            if rows is None or dirty:
+                rows = len(tree)
+            table = {
+                'tree': tree,
+                'store': self._open_store(db_name, table_name, meta) if columnar else None,
+                'indexes': indexes,
+                'rows': rows,
+                'index_distinct': index_distinct,
+                'dirty': dirty,
+                'pending_bytes': 0,
+                'size': size,
+            }
+            self._publish(table)
+            self._tables[cache_key] = table
+            self._evict(keep=cache_key)
+            profile = self._profile()
+            if profile is not None:
+                profile['load'] += time.perf_counter() - started
+            return table
+
+    def _publish(self, table):
+        trees = [table['tree']] + list(table['indexes'].values())
+        if table['store'] is not None or not all(tree.persistent for tree in trees):
+            table['snapshot'] = None
+            return
+        table['snapshot'] = TableVersion(
+            tree=table['tree'].snapshot(),
+            indexes={name: index.snapshot() for name, index in table['indexes'].items()},
+            store=None,
+            rows=table['rows'],
+            index_distinct=dict(table['index_distinct']),
+        )
+        with self._lock:
+            self._versions.add(table['snapshot'])
+
+    @contextmanager
+    def _read_view(self, db_name, table_name):
+        snapshot = self._open_table(db_name, table_name)['snapshot']
+        if snapshot is not None:
+            yield snapshot
+            return
+        with self._reading(db_name, table_name):
+            yield self._open_table(db_name, table_name)
+
+    def mvcc_stats(self):
+        with self._lock:
+            live = len(self._versions)
+            current = sum(1 for table in self._tables.values() if table['snapshot'] is not None)
+        return {'versions': live, 'current': current, 'retained': live - current}
+
+    def _result_key(self, db_name, table_name, *query):
+        with self._results_lock:
+            return (db_name, table_name, self._table_versions.get((db_name, table_name), 0)) + query
+
+    def _cached_result(self, key):
+        if self._profile() is not None:
+            return None
+        with self._results_lock:
+            entry = self._results.get(key)
+            if entry is None:
+                self._result_counters['misses'] += 1
+                return None
+            self._results.move_to_end(key)
+            self._result_counters['hits'] += 1
+            return entry[0]
+
+    def _cache_result(self, key, result, size):
+        db_name, table_name, version = key[:3]
+        if size > self.result_cache_bytes:
+            return
+        with self._results_lock:
+            if self._table_versions.get((db_name, table_name), 0) != version or key in self._results:
+                return
+            self._results[key] = (result, size)
+            self._result_keys.setdefault((db_name, table_name), set()).add(key)
+            self._result_bytes += size
+            while self._results and (len(self._results) > self.result_cache_size
+                                     or self._result_bytes > self.result_cache_bytes):
+                old_key, (_, old_size) = self._results.popitem(last=False)
+                self._result_keys[old_key[:2]].discard(old_key)
+                self._result_bytes -= old_size
+                self._result_counters['evictions'] += 1
+
+    def _cache_rows(self, key, rows):
+        kept = []
+        row_size = 0
+        for row in rows:
+            if kept is not None:
+                kept.append(dict(row))
+                row_size = row_size or len(repr(row))
+                if len(kept) * row_size > self.result_cache_bytes:
+                    kept = None
+            yield row
+        if kept is not None:
+            self._cache_result(key, kept, len(kept) * row_size)
+
+    def _invalidate_results(self, db_name, table_names):
+        with self._results_lock:
+            for table_name in table_names:
+                cache_key = (db_name, table_name)
+                self._table_versions[cache_key] = self._table_versions.get(cache_key, 0) + 1
+                for key in self._result_keys.pop(cache_key, ()):
+                    self._result_bytes -= self._results.pop(key)[1]
+                    self._result_counters['invalidations'] += 1
+
+    def result_cache_stats(self):
+        with self._results_lock:
+            return dict(self._result_counters, entries=len(self._results), bytes=self._result_bytes)
+
+    def _cached_bytes(self):
+        return sum(table['size'] + table['pending_bytes'] for table in self._tables.values())
+
+    def _evict(self, keep=None):
+        with self._lock:
+            for cache_key in list(self._tables):
+                if len(self._tables) <= 1 or (len(self._tables) <= self.max_tables
+                                              and self._cached_bytes() <= self.memory_budget):
+                    break
+                if cache_key == keep:
+                    continue
+                lock = self._table_lock(*cache_key)
+                if not lock.acquire_write(blocking=False):
+                    continue
+                try:
+                    table = self._tables.pop(cache_key)
+                    if table['dirty']:
+                        self._write_table(cache_key, table)
+                        self._save_databases()
+                    self._close_table(table)
+                finally:
+                    lock.release_write()
+
+    def _write_table(self, cache_key, table):
+        db_name, table_name = cache_key
+        meta = self.databases[db_name][table_name]
+        _, data_path = self._table_paths(db_name, table_name)
+        if table['store'] is not None:
+            table['store'].flush()
+        size = self._save_tree(db_name, table_name, table['tree'], meta)
+        if os.path.exists(data_path):
+            os.remove(data_path)
+        lsn = self._wal(db_name)['lsn']
+        for index_name, index in table['indexes'].items():
+            size += self._save_tree(db_name, self._index_file_name(table_name, index_name), index,
+                                    meta['indexes'][index_name])
+        with self._lock:
+            for index_name, index_meta in meta.get('indexes', {}).items():
+                index_meta['distinct'] = table['index_distinct'][index_name]
+            meta['row_count'] = table['rows']
+            meta['lsn'] = lsn
+        table['size'] = size
+        table['dirty'] = False
+        table['pending_bytes'] = 0
+
+    def _close_table(self, table):
+        table['tree'].close()
+        if table['store'] is not None:
+            table['store'].close()
+        for index in table['indexes'].values():
+            index.close()
+
+    def _mark_dirty(self, db_name, table_name, table, nbytes=0):
+        table['dirty'] = True
+        table['pending_bytes'] += nbytes
+        self._evict(keep=(db_name, table_name))
+
+    def buffer_pool_stats(self):
+        return self.buffer_pool.stats()
+
+    def checkpoint(self, db_name=None):
+        with self._lock:
+            db_names = [db_name] if db_name is not None else list(self._wals)
+        for name in db_names:
+            while not self._checkpoint_database(name):
+                pass
+
+    def _checkpoint_database(self, db_name):
+        with self._lock:
+            cache_keys = sorted(key for key in self._tables if key[0] == db_name)
+        locks = [self._table_lock(*cache_key) for cache_key in cache_keys]
+        for lock in locks:
+            lock.acquire_read()
+        try:
+            wal = self._wal(db_name)
+            with wal['lock']:
+                with self._lock:
+                    tables = [(key, table) for key, table in self._tables.items() if key[0] == db_name]
+                if any(table['dirty'] and key not in cache_keys for key, table in tables):
+                    return False
+                for cache_key, table in tables:
+                    if table['dirty']:
+                        self._write_table(cache_key, table)
+                self._save_databases()
+                self._truncate_wal(db_name)
+            return True
+        finally:
+            for lock in reversed(locks):
+                lock.release_read()
+
+    def close(self):
+        if self._partition_executor is not None:
+            self._partition_executor.shutdown()
+            self._partition_executor = None
+        self.checkpoint()
+        with self._lock:
+            for wal in self._wals.values():
+                wal['file'].close()
+            self._wals.clear()
+            for table in self._tables.values():
+                self._close_table(table)
+            self._tables.clear()
 
     def create_database(self, db_name):
-        if db_name in self.databases:
-            raise ValueError(f"Database '{db_name}' already exists")
-        db_path = os.path.join(self.db_dir, db_name)
-        os.makedirs(db_path)
-        self.databases[db_name] = {}
-        self._save_databases()
+        with self._lock:
+            if db_name in self.databases:
+                raise ValueError(f"Database '{db_name}' already exists")
+            db_path = os.path.join(self.db_dir, db_name)
+            os.makedirs(db_path)
+            self.databases[db_name] = {}
+            self._save_databases()
 
     def use_database(self, db_name):
         if db_name not in self.databases:
             raise ValueError(f"Database '{db_name}' does not exist")
+        if self._state()['txn'] is not None:
+            raise ValueError("Cannot switch database inside a transaction")
         self.current_db = db_name
 
-    def create_table(self, table_name, columns, tree_type="avl"):
-        if self.current_db is None:
-            raise ValueError("No database selected")
-        db_meta = self.databases[self.current_db]
-        if table_name in db_meta:
-            raise ValueError(f"Table '{table_name}' already exists in database '{self.current_db}'")
-        primary_key = columns[0]
-        db_meta[table_name] = {
-            'columns': columns,
+    def create_table(self, table_name, columns, tree_type="avl", tree_options=None,
+                     storage="row", column_types=None, partition_by=None):
+        with self._lock:
+            db_name = self.current_db
+            if db_name is None:
+                raise ValueError("No database selected")
+            db_meta = self.databases[db_name]
+            if table_name in db_meta:
+                raise ValueError(f"Table '{table_name}' already exists in database '{db_name}'")
+            storage = storage.lower()
+            if storage not in ("row", "columnar"):
+                raise ValueError(f"Unknown storage format: {storage}")
+            column_types = {col: col_type.upper() for col, col_type in (column_types or {}).items()}
+            for col, col_type in column_types.items():
+                if col not in columns:
+                    raise ValueError(f"Column '{col}' does not exist in table '{table_name}'")
+                if col_type not in COLUMN_TYPES:
+                    raise ValueError(f"Unknown column type: {col_type}")
+            primary_key = columns[0]
+            meta = {
+                'columns': columns,
+                'tree_type': tree_type,
+                'primary_key': primary_key,
+                'tree_options': tree_options or {},
+                'storage': storage,
+                'lsn': self._wal(db_name)['lsn'],
+            }
+            if column_types:
+                meta['column_types'] = column_types
+            if partition_by is None:
+                self._create_table_storage(db_name, table_name, meta)
+                return
+            spec = make_spec(**partition_by)
+            if spec['column'] != primary_key:
+                raise ValueError(f"Table '{table_name}' can only be partitioned by its primary key '{primary_key}'")
+            for number in range(spec['partitions']):
+                self._create_table_storage(db_name, partition_name(table_name, number),
+                                           dict(meta, partition_of=table_name))
+            meta['partitioning'] = spec
+            db_meta[table_name] = meta
+            self._save_databases()
+
+    def _create_table_storage(self, db_name, table_name, meta):
+        tree = self._create_tree(db_name, table_name, meta)
+        self.databases[db_name][table_name] = meta
+        self._save_databases()
+        self._save_tree(db_name, table_name, tree, meta)
+        tree.close()
+        if meta['storage'] == "columnar":
+            store = self._open_store(db_name, table_name, meta)
+            store.flush()
+            store.close()
+
+    def create_index(self, index_name, table_name, column, tree_type="avl", tree_options=None):
+        db_name = self.current_db
+        meta = self._table_meta(table_name)
+        for part in self._partitions(table_name, meta):
+            self._create_index(db_name, index_name, part, column, tree_type, tree_options)
+
+    def _create_index(self, db_name, index_name, table_name, column, tree_type, tree_options):
+        meta = self.databases[db_name][table_name]
+        if column not in meta['columns']:
+            raise ValueError(f"Column '{column}' does not exist in table '{table_name}'")
+        index_meta = {
+            'column': column,
             'tree_type': tree_type,
-            'primary_key': primary_key,
+            'tree_options': tree_options or {},
         }
-        self._save_databases()
-        tree = TreeFactory.create_tree(tree_type)
-        tree_path = os.path.join(self.db_dir, self.current_db, f"{table_name}.tree")
-        with open(tree_path, 'wb') as f:
-            pickle.dump(tree, f)
-        data_path = os.path.join(self.db_dir, self.current_db, f"{table_name}.json")
-        with open(data_path, 'w', encoding='utf-8') as f:
-            json.dump([], f, ensure_ascii=False, indent=2)
+        file_name = self._index_file_name(table_name, index_name)
+        with self._writing(db_name, table_name):
+            if index_name in meta.get('indexes', {}):
+                raise ValueError(f"Index '{index_name}' already exists on table '{table_name}'")
+            table = self._open_table(db_name, table_name)
+            if table['dirty']:
+                self._write_table((db_name, table_name), table)
+            index = self._create_tree(db_name, file_name, index_meta)
+            entries = {}
+            store = table['store']
+            for key, payload in table['tree'].items():
+                value = store.get(payload, column) if store is not None else payload.get(column)
+                if value is not None:
+                    entries.setdefault(value, []).append(key)
+            index.bulk_load(sorted(entries.items(), key=itemgetter(0)))
+            self._save_tree(db_name, file_name, index, index_meta)
+            table['indexes'][index_name] = index
+            table['index_distinct'][index_name] = len(entries)
+            self._publish(table)
+            index_meta['distinct'] = len(entries)
+            with self._lock:
+                meta.setdefault('indexes', {})[index_name] = index_meta
+                self._save_databases()
 
-    def insert(self, table_name, values):
-        if self.current_db is None:
+    def _index_check(self, table, meta, records):
+        for index_name, index_meta in meta.get('indexes', {}).items():
+            col = index_meta['column']
+            item = table['indexes'][index_name].min_item()
+            reference = item[0] if item is not None else None
+            for rec in records:
+                value = rec.get(col)
+                if value is None:
+                    continue
+                if reference is None:
+                    reference = value
+                elif not _comparable(value, reference):
+                    raise ValueError(f"Value {value!r} for column '{col}' is not comparable "
+                                     f"with existing index keys")
+
+    def _index_add(self, table, meta, rec):
+        for index_name, index_meta in meta.get('indexes', {}).items():
+            value = rec.get(index_meta['column'])
+            if value is None:
+                continue
+            index = table['indexes'][index_name]
+            keys = index.get(value)
+            if keys is None:
+                index.insert(value, [rec[meta['primary_key']]])
+                table['index_distinct'][index_name] += 1
+            else:
+                if index.persistent:
+                    keys = list(keys)
+                keys.append(rec[meta['primary_key']])
+                index.put(value, keys)
+
+    def _index_remove(self, table, meta, rec):
+        for index_name, index_meta in meta.get('indexes', {}).items():
+            value = rec.get(index_meta['column'])
+            if value is None:
+                continue
+            index = table['indexes'][index_name]
+            keys = index.get(value)
+            if keys is None:
+                continue
+            if index.persistent:
+                keys = list(keys)
+            keys.remove(rec[meta['primary_key']])
+            if keys:
+                index.put(value, keys)
+            else:
+                index.delete(value)
+                table['index_distinct'][index_name] -= 1
+
+    def _partitions(self, table_name, meta, predicates=None):
+        spec = meta.get('partitioning')
+        if spec is None:
+            return [table_name]
+        numbers = range(spec['partitions']) if predicates is None else prune(spec, predicates)
+        return [partition_name(table_name, number) for number in numbers]
+
+    def _route(self, table_name, meta, values):
+        spec = meta.get('partitioning')
+        if spec is None:
+            return table_name
+        if len(values) != len(meta['columns']):
+            raise ValueError("Column count does not match value count")
+        record = self._coerce(meta, dict(zip(meta['columns'], values)))
+        return partition_name(table_name, partition_of(spec, record[spec['column']]))
+
+    def _map_partitions(self, func, parts):
+        if len(parts) <= 1 or self.scan_workers <= 1 or self._profile() is not None:
+            return [func(part) for part in parts]
+        with self._lock:
+            if self._partition_executor is None:
+                self._partition_executor = ThreadPoolExecutor(self.scan_workers,
+                                                              thread_name_prefix="partition")
+        return list(self._partition_executor.map(func, parts))
+
+    def begin(self):
+        state = self._state()
+        if state['db'] is None:
             raise ValueError("No database selected")
-        db_meta = self.databases[self.current_db]
-        if table_name not in db_meta:
-            raise ValueError(f"Table '{table_name}' does not exist")
-        meta = db_meta[table_name]
+        if state['txn'] is not None:
+            raise ValueError("Transaction already in progress")
+        state['txn'] = {'db': state['db'], 'entries': []}
+
+    def commit(self):
+        state = self._state()
+        txn = state['txn']
+        if txn is None:
+            raise ValueError("No transaction in progress")
+        state['txn'] = None
+        self._run(txn['db'], txn['entries'])
+
+    def rollback(self):
+        state = self._state()
+        if state['txn'] is None:
+            raise ValueError("No transaction in progress")
+        state['txn'] = None
+
+    def in_transaction(self):
+        return self._state()['txn'] is not None
+
+    def _submit(self, db_name, entries):
+        txn = self._state()['txn']
+        if txn is None:
+            self._run(db_name, entries)
+        else:
+            txn['entries'].extend(entries)
+
+    def _entry_tables(self, entry):
+        if entry['op'] == 'move':
+            return entry['tables'] + [entry['target']]
+        return [entry['table']]
+
+    def _run(self, db_name, entries):
+        if not entries:
+            return
+        table_names = sorted({name for entry in entries for name in self._entry_tables(entry)})
+        locks = [self._table_lock(db_name, name) for name in table_names]
+        for lock in locks:
+            lock.acquire_write()
+        lsn = None
+        checkpoint_due = False
+        profile = self._profile()
+        if profile is not None:
+            started = time.perf_counter()
+            before = dict(profile)
+        try:
+            undo = []
+            logged = []
+            affected = 0
+            try:
+                for entry in entries:
+                    self._capture(db_name, entry, undo)
+                    if entry['op'] == 'move':
+                        moved = self._apply_move(db_name, entry)
+                        affected += sum(1 for resolved in moved if resolved['op'] == 'insert')
+                        logged.extend(moved)
+                    else:
+                        count = self._apply(db_name, entry)
+                        affected += count
+                        if count:
+                            logged.append(entry)
+            except Exception:
+                for table_name, key, record in reversed(undo):
+                    self._restore(db_name, table_name, key, record)
+                raise
+            if profile is not None:
+                elapsed = time.perf_counter() - started
+                profile['tree'] = before['tree'] + elapsed - (profile['filter'] - before['filter']) \
+                    - (profile['load'] - before['load'])
+                profile['affected'] += affected
+                started = time.perf_counter()
+            if logged:
+                record = logged[0] if len(logged) == 1 else {'op': 'txn', 'entries': logged}
+                lsn, checkpoint_due = self._log(db_name, record)
+        finally:
+            with self._lock:
+                tables = [self._tables.get((db_name, name)) for name in table_names]
+            for table in tables:
+                if table is not None:
+                    self._publish(table)
+            metas = self.databases.get(db_name, {})
+            self._invalidate_results(db_name, {metas.get(name, {}).get('partition_of', name)
+                                               for name in table_names})
+            for lock in reversed(locks):
+                lock.release_write()
+        if lsn is not None:
+            self._sync(db_name, lsn)
+        if checkpoint_due:
+            self.checkpoint(db_name)
+        if profile is not None:
+            profile['write'] += time.perf_counter() - started
+
+    def _record_at(self, db_name, table_name, key):
+        table = self._open_table(db_name, table_name)
+        payload = table['tree'].get(key)
+        if payload is None:
+            return None
+        return table['store'].row(payload) if table['store'] is not None else dict(payload)
+
+    def _capture(self, db_name, entry, undo):
+        op = entry['op']
+        tables = entry['tables'] if op == 'move' else [entry['table']]
+        meta = self.databases[db_name][tables[0]]
+        pk = meta['primary_key']
+        keys = []
+        if op in ('insert', 'insert_many'):
+            for values in [entry['values']] if op == 'insert' else entry['rows']:
+                if len(values) == len(meta['columns']):
+                    keys.append((tables[0], self._coerce(meta, dict(zip(meta['columns'], values)))[pk]))
+        elif op != 'delete' or entry['conditions']:
+            for table_name in tables:
+                table = self._open_table(db_name, table_name)
+                keys.extend((table_name, rec[pk]) for rec in self._matching(table, meta, entry['conditions']))
+            if op != 'delete' and pk in entry['updates']:
+                new_key = self._coerce(meta, {pk: entry['updates'][pk]})[pk]
+                keys.append((entry.get('target', tables[0]), new_key))
+        undo.extend((table_name, key, self._record_at(db_name, table_name, key)) for table_name, key in keys)
+
+    def _restore(self, db_name, table_name, key, record):
+        meta = self.databases[db_name][table_name]
+        if self._record_at(db_name, table_name, key) is not None:
+            self._apply_delete(db_name, table_name, {meta['primary_key']: key})
+        if record is not None:
+            self._apply_insert(db_name, table_name, [record[col] for col in meta['columns']])
+
+    def _apply_move(self, db_name, entry):
+        target = entry['target']
+        meta = self.databases[db_name][target]
+        pk = meta['primary_key']
+        updates = entry['updates']
+        matched = [(part, dict(rec)) for part in entry['tables']
+                   for rec in self._matching(self._open_table(db_name, part), meta, entry['conditions'])]
+        if len(matched) > 1:
+            raise DuplicateKeyError(f"Update would duplicate key '{updates[pk]}' in table '{entry['parent']}'")
+        if not matched:
+            return []
+        part, rec = matched[0]
+        key = {pk: rec[pk]}
+        if part == target:
+            self._apply_update(db_name, part, updates, key)
+            return [{'op': 'update', 'table': part, 'updates': updates, 'conditions': key}]
+        rec.update(self._coerce(meta, dict(updates)))
+        if self._record_at(db_name, target, rec[pk]) is not None:
+            raise DuplicateKeyError(f"Key '{updates[pk]}' already exists in table '{entry['parent']}'")
+        values = [rec[col] for col in meta['columns']]
+        self._apply_delete(db_name, part, key)
+        self._apply_insert(db_name, target, values)
+        return [{'op': 'delete', 'table': part, 'conditions': key},
+                {'op': 'insert', 'table': target, 'values': values}]
+
+    def insert(self, table_name, values):
+        db_name = self.current_db
+        meta = self._table_meta(table_name)
+        self._submit(db_name, [{'op': 'insert', 'table': self._route(table_name, meta, values),
+                                'values': list(values)}])
+
+    def _apply_insert(self, db_name, table_name, values):
+        meta = self.databases[db_name][table_name]
         columns = meta['columns']
         if len(values) != len(columns):
             raise ValueError("Column count does not match value count")
-        record = dict(zip(columns, values))
+        record = self._coerce(meta, dict(zip(columns, values)))
         key = record[meta['primary_key']]
-        tree_path = os.path.join(self.db_dir, self.current_db, f"{table_name}.tree")
-        with open(tree_path, 'rb') as f:
-            tree = pickle.load(f)
+        table = self._open_table(db_name, table_name)
+        tree = table['tree']
         if not tree.is_empty() and tree.search(key):
-            raise ValueError(f"Key '{key}' already exists in table '{table_name}'")
-        tree.insert(key)
-        data_path = os.path.join(self.db_dir, self.current_db, f"{table_name}.json")
-        with open(data_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        data.append(record)
-        with open(data_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        with open(tree_path, 'wb') as f:
-            pickle.dump(tree, f)
-
-    def select(self, table_name, conditions=None):
-        if self.current_db is None:
-            raise ValueError("No database selected")
-        db_meta = self.databases[self.current_db]
-        if table_name not in db_meta:
-            raise ValueError(f"Table '{table_name}' does not exist")
-        data_path = os.path.join(self.db_dir, self.current_db, f"{table_name}.json")
-        with open(data_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        if not conditions:
-            return data
-        result = []
-        for rec in data:
-            if all(rec.get(col) == val for col, val in conditions.items()):
-                result.append(rec)
-        return result
+            raise DuplicateKeyError(f"Key '{key}' already exists in table '{table_name}'")
+        self._index_check(table, meta, [record])
+        tree.insert(key, self._payload(table, record))
+        table['rows'] += 1
+        self._index_add(table, meta, record)
+        self._mark_dirty(db_name, table_name, table, len(repr(record)))
+        return 1
+
+    def insert_many(self, table_name, rows):
+        db_name = self.current_db
+        meta = self._table_meta(table_name)
+        groups = {}
+        for values in rows:
+            groups.setdefault(self._route(table_name, meta, values), []).append(list(values))
+        self._submit(db_name, [{'op': 'insert_many', 'table': part, 'rows': part_rows}
+                               for part, part_rows in groups.items()])
+
+    def _apply_insert_many(self, db_name, table_name, rows):
+        meta = self.databases[db_name][table_name]
+        columns = meta['columns']
+        pk = meta['primary_key']
+        records = []
+        for values in rows:
+            if len(values) != len(columns):
+                raise ValueError("Column count does not match value count")
+            records.append(self._coerce(meta, dict(zip(columns, values))))
+        records.sort(key=itemgetter(pk))
+        for rec, next_rec in zip(records, records[1:]):
+            if rec[pk] == next_rec[pk]:
+                raise ValueError(f"Key '{rec[pk]}' already exists in table '{table_name}'")
+        table = self._open_table(db_name, table_name)
+        tree = table['tree']
+        self._index_check(table, meta, records)
+        new_items = [(rec[pk], self._payload(table, rec)) for rec in records]
+        if tree.is_empty():
+            tree.bulk_load(new_items)
+        elif tree.disk_resident or len(new_items) < self.bulk_threshold:
+            for key, _ in new_items:
+                if tree.search(key):
+                    raise DuplicateKeyError(f"Key '{key}' already exists in table '{table_name}'")
+            for key, rec in new_items:
+                tree.insert(key, rec)
+        else:
+            merged = list(heapq.merge(tree.items(), new_items, key=itemgetter(0)))
+            for (key, _), (next_key, _) in zip(merged, merged[1:]):
+                if key == next_key:
+                    raise DuplicateKeyError(f"Key '{key}' already exists in table '{table_name}'")
+            tree.bulk_load(merged)
+        table['rows'] += len(records)
+        for rec in records:
+            self._index_add(table, meta, rec)
+        if records:
+            self._mark_dirty(db_name, table_name, table, len(records) * len(repr(records[0])))
+        return len(records)
+
+    def _plan(self, table, meta, conditions):
+        predicates = parse_conditions(conditions)
+        plan = self.planner.plan(meta, table['rows'], table['index_distinct'], predicates)
+        if plan.access == 'full_scan':
+            return plan
+        tree = table['indexes'][plan.index_name] if plan.access == 'index' else table['tree']
+        item = tree.min_item()
+        if item is not None and not all(_comparable(bound, item[0])
+                                        for bound in (plan.key, plan.lo, plan.hi) if bound is not None):
+            plan = Plan('empty', 0, 0.0)
+            plan.predicates = predicates
+        return plan
+
+    def _execute_plan(self, table, plan, limit=None, offset=0, columns=None, position=None):
+        tree = table['tree']
+        resume = position is not None and 'after' in position
+        profile = self._profile()
+        if profile is not None:
+            started = time.perf_counter()
+        if plan.access == 'empty':
+            candidates = []
+        elif plan.access == 'pk_point':
+            rec = None if resume else tree.get(plan.key)
+            candidates = [rec] if rec is not None else []
+            if position is not None:
+                position['after'] = plan.key
+        elif plan.access == 'index':
+            candidates = self._index_scan(table, plan, position)
+        else:
+            start = position['after'] if resume else plan.lo
+            if offset and self._pk_only(plan):
+                skip = self._lower_rank(tree, plan) + offset
+                if skip >= len(tree):
+                    return
+                start, offset = tree.select(skip), 0
+            candidates = self._range_scan(tree, plan, start, position)
+        match, test = matches, plan.predicates.test
+        if profile is not None:
+            profile['tree'] += time.perf_counter() - started
+            candidates = self._profiled(candidates, profile, not tree.disk_resident)
+            match, test = self._timed(match, profile), self._timed(test, profile)
+        if table['store'] is not None:
+            yield from table['store'].fetch(candidates, plan.predicates, match, columns, offset, limit)
+            return
+        rows = candidates
+        if plan.predicates:
+            rows = filter(test, candidates)
+        rows = islice(rows, offset, None if limit is None else offset + limit)
+        if columns:
+            rows = ({col: rec.get(col) for col in columns} for rec in rows)
+        yield from rows
+
+    def _profiled(self, candidates, profile, count_nodes):
+        items = iter(candidates)
+        while True:
+            started = time.perf_counter()
+            try:
+                rec = next(items)
+            except StopIteration:
+                return
+            finally:
+                profile['tree'] += time.perf_counter() - started
+            profile['examined'] += 1
+            if count_nodes:
+                profile['nodes'] += 1
+            yield rec
+
+    def _timed(self, func, profile):
+        def timed(*args):
+            started = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                profile['filter'] += time.perf_counter() - started
+        return timed
+
+    def _parallel_scan_allowed(self, table, plan):
+        return (plan.access == 'full_scan' and plan.predicates and self.scan_workers > 1
+                and table['rows'] >= self.parallel_threshold and not table['tree'].disk_resident
+                and hasattr(os, 'fork') and threading.active_count() == 1 and self._profile() is None)
+
+    def _parallel_scan(self, table, plan, columns=None, count_only=False):
+        tree = table['tree']
+        n = len(tree)
+        parts = min(self.scan_workers, n)
+        bounds = [tree.select(i * n // parts) for i in range(1, parts)]
+        ranges = list(zip([None] + bounds, bounds + [None]))
+        state = (tree, table['store'], plan.predicates, columns, count_only)
+        results = _fork_map(lambda bounds: _scan_partition(state, bounds), ranges)
+        if count_only:
+            return sum(results)
+        return [row for rows in results for row in rows]
+
+    def _range_scan(self, tree, plan, start, position=None):
+        after = position.get('after') if position else None
+        for key, rec in tree.range_items(start):
+            if plan.past_range(key):
+                break
+            if plan.in_range(key) and (after is None or key > after):
+                if position is not None:
+                    position['after'] = key
+                yield rec
+
+    def _index_scan(self, table, plan, position=None):
+        tree = table['tree']
+        if position is None:
+            keys = table['indexes'][plan.index_name].get(plan.key) or []
+        else:
+            if 'keys' not in position:
+                position['keys'] = sorted(table['indexes'][plan.index_name].get(plan.key) or [])
+            keys = position['keys']
+            if 'after' in position:
+                keys = keys[bisect_right(keys, position['after']):]
+        for key in keys:
+            rec = tree.get(key)
+            if rec is not None:
+                if position is not None:
+                    position['after'] = key
+                yield rec
+
+    def _pk_only(self, plan):
+        if plan.access == 'full_scan':
+            return not plan.predicates
+        return (plan.access == 'pk_range' and plan.predicates.exact
+                and all(col == plan.column and op in ('<', '<=', '>', '>=') for col, op, _ in plan.predicates))
+
+    def _lower_rank(self, tree, plan):
+        if plan.lo is None:
+            return 0
+        rank = tree.rank(plan.lo)
+        if not plan.lo_inclusive and tree.search(plan.lo):
+            rank += 1
+        return rank
+
+    def _upper_rank(self, tree, plan):
+        if plan.hi is None:
+            return len(tree)
+        rank = tree.rank(plan.hi)
+        if plan.hi_inclusive and tree.search(plan.hi):
+            rank += 1
+        return rank
+
+    def _matching(self, table, meta, conditions):
+        return list(self._execute_plan(table, self._plan(table, meta, conditions)))
+
+    def select(self, table_name, conditions=None, limit=None, offset=0, columns=None):
+        db_name = self.current_db
+        meta = self._table_meta(table_name)
+        for col in columns or ():
+            if col not in meta['columns']:
+                raise ValueError(f"Column '{col}' does not exist in table '{table_name}'")
+        predicates = parse_conditions(conditions)
+        if self.result_cache_size:
+            key = self._result_key(db_name, table_name, 'select', str(predicates), limit, offset,
+                                   tuple(columns or ()))
+            cached = self._cached_result(key)
+            if cached is not None:
+                return (dict(row) for row in cached)
+        if 'partitioning' not in meta:
+            rows = self._select(db_name, table_name, predicates, limit, offset, columns)
+        else:
+            rows = self._select_partitions(db_name, table_name, meta, predicates, limit, offset, columns)
+        return self._cache_rows(key, rows) if self.result_cache_size else rows
+
+    def _select_partitions(self, db_name, table_name, meta, predicates, limit, offset, columns):
+        pk = meta['primary_key']
+        fetch_columns = columns + [pk] if columns and pk not in columns else columns
+        fetch_limit = None if limit is None else offset + limit
+        results = [self._select(db_name, part, predicates, fetch_limit, 0, fetch_columns)
+                   for part in self._partitions(table_name, meta, predicates)]
+        rows = heapq.merge(*results, key=itemgetter(pk))
+        for row in islice(rows, offset, None if limit is None else offset + limit):
+            if fetch_columns is not columns:
+                del row[pk]
+            yield row
+
+    def _select(self, db_name, table_name, predicates=None, limit=None, offset=0, columns=None):
+        meta = self.databases[db_name][table_name]
+        snapshot = self._open_table(db_name, table_name)['snapshot']
+        if snapshot is not None:
+            plan = self._plan(snapshot, meta, predicates)
+            for rec in self._execute_plan(snapshot, plan, limit, offset, columns):
+                yield dict(rec)
+            return
+        position = {}
+        while limit is None or limit > 0:
+            batch = self.stream_batch if limit is None else min(limit, self.stream_batch)
+            with self._reading(db_name, table_name):
+                table = self._open_table(db_name, table_name)
+                plan = self._plan(table, meta, predicates)
+                if not position and limit is None and self._parallel_scan_allowed(table, plan):
+                    rows, batch = self._parallel_scan(table, plan, columns)[offset:], None
+                else:
+                    rows = [dict(rec) for rec in self._execute_plan(table, plan, batch, offset, columns, position)]
+            yield from rows
+            if batch is None or len(rows) < batch:
+                return
+            offset = 0
+            if limit is not None:
+                limit -= len(rows)
+
+    def count(self, table_name, conditions=None):
+        db_name = self.current_db
+        meta = self._table_meta(table_name)
+        predicates = parse_conditions(conditions)
+        if self.result_cache_size:
+            key = self._result_key(db_name, table_name, 'count', str(predicates))
+            cached = self._cached_result(key)
+            if cached is not None:
+                return cached
+        count = sum(self._map_partitions(lambda part: self._count(db_name, part, predicates),
+                                         self._partitions(table_name, meta, predicates)))
+        if self.result_cache_size:
+            self._cache_result(key, count, 64)
+        return count
+
+    def _count(self, db_name, table_name, conditions=None):
+        meta = self.databases[db_name][table_name]
+        with self._read_view(db_name, table_name) as table:
+            plan = self._plan(table, meta, conditions)
+            tree = table['tree']
+            if self._pk_only(plan):
+                return max(0, self._upper_rank(tree, plan) - self._lower_rank(tree, plan))
+            if self._parallel_scan_allowed(table, plan):
+                return self._parallel_scan(table, plan, count_only=True)
+            return sum(1 for _ in self._execute_plan(table, plan))
+
+    def aggregate(self, table_name, aggregates, conditions=None, group_by=None):
+        db_name = self.current_db
+        meta = self._table_meta(table_name)
+        aggregates = check_aggregates(aggregates, meta['columns'])
+        group_by = tuple(group_by or ())
+        for col in group_by:
+            if col not in meta['columns']:
+                raise ValueError(f"Column '{col}' does not exist in table '{table_name}'")
+        predicates = parse_conditions(conditions)
+        if self.result_cache_size:
+            key = self._result_key(db_name, table_name, 'aggregate', str(predicates), aggregates, group_by)
+            cached = self._cached_result(key)
+            if cached is not None:
+                return [dict(row) for row in cached]
+        groups = {}
+        for part_groups in self._map_partitions(
+                lambda part: self._aggregate(db_name, part, aggregates, predicates, group_by),
+                self._partitions(table_name, meta, predicates)):
+            merge_groups(groups, part_groups, aggregates)
+        if not group_by and not groups:
+            compile_accumulator(aggregates)([], groups)
+        labels = [aggregate_label(func, column) for func, column in aggregates]
+        rows = []
+        for group, state in groups.items():
+            row = dict(zip(group_by, group if len(group_by) > 1 else (group,)))
+            row.update(zip(labels, finish(state, aggregates)))
+            rows.append(row)
+        if self.result_cache_size:
+            size = len(rows) * len(repr(rows[0])) if rows else 64
+            self._cache_result(key, [dict(row) for row in rows], size)
+        return rows
+
+    def _aggregate(self, db_name, table_name, aggregates, predicates, group_by):
+        meta = self.databases[db_name][table_name]
+        with self._read_view(db_name, table_name) as table:
+            plan = self._plan(table, meta, predicates)
+            if not group_by:
+                state = self._tree_aggregate(table, meta, plan, aggregates)
+                if state is not None:
+                    return {None: state}
+            columns = None
+            if table['store'] is not None:
+                columns = list(dict.fromkeys([col for _, col in aggregates if col] + list(group_by)))
+                columns = columns or [meta['primary_key']]
+            accumulate = compile_accumulator(aggregates, group_by)
+            return accumulate(self._execute_plan(table, plan, columns=columns), {})
+
+    def _tree_aggregatable(self, meta, plan, aggregates):
+        if not self._pk_only(plan):
+            return False
+        pk = meta['primary_key']
+        indexed = {index_meta['column'] for index_meta in meta.get('indexes', {}).values()}
+        return all((func == "COUNT" and column in (None, pk))
+                   or (func in ("MIN", "MAX") and (column == pk or (column in indexed and not plan.predicates)))
+                   for func, column in aggregates)
+
+    def _tree_aggregate(self, table, meta, plan, aggregates):
+        if not self._tree_aggregatable(meta, plan, aggregates):
+            return None
+        tree = table['tree']
+        pk = meta['primary_key']
+        indexes = {index_meta['column']: name for name, index_meta in meta.get('indexes', {}).items()}
+        state = []
+        lo, hi = self._lower_rank(tree, plan), self._upper_rank(tree, plan)
+        for func, column in aggregates:
+            if func == "COUNT" and column in (None, pk):
+                state.append(max(0, hi - lo))
+            elif func in ("MIN", "MAX") and column == pk and not plan.predicates:
+                item = tree.min_item() if func == "MIN" else tree.max_item()
+                state.append(item[0] if item else None)
+            elif func in ("MIN", "MAX") and column == pk:
+                state.append(None if lo >= hi else tree.select(lo if func == "MIN" else hi - 1))
+            else:
+                index = table['indexes'][indexes[column]]
+                item = index.min_item() if func == "MIN" else index.max_item()
+                state.append(item[0] if item else None)
+        return state
+
+    def explain(self, table_name, conditions=None, aggregates=None, group_by=None):
+        db_name = self.current_db
+        meta = self._table_meta(table_name)
+        predicates = parse_conditions(conditions)
+        if aggregates:
+            aggregates = check_aggregates(aggregates, meta['columns'])
+        plans = []
+        for part in self._partitions(table_name, meta, predicates):
+            part_meta = self.databases[db_name][part]
+            with self._read_view(db_name, part) as table:
+                plan = self._plan(table, part_meta, predicates)
+                info = {
+                    'table': part,
+                    'tree_type': part_meta['tree_type'],
+                    'storage': part_meta.get('storage', 'rows'),
+                    'snapshot': isinstance(table, TableVersion),
+                    'access': plan.access,
+                    'column': plan.column,
+                    'index': plan.index_name,
+                    'key': plan.key,
+                    'range': (plan.lo, plan.lo_inclusive, plan.hi, plan.hi_inclusive),
+                    'estimated_rows': plan.estimated_rows,
+                    'cost': plan.cost,
+                    'rows': table['rows'],
+                    'filter': str(predicates) or None,
+                }
+                if group_by:
+                    info['aggregate'] = 'hash'
+                elif aggregates:
+                    info['aggregate'] = 'tree' if self._tree_aggregatable(part_meta, plan, aggregates) else 'scan'
+                plans.append(info)
+        return {'table': table_name, 'partitions': meta.get('partitioning', {}).get('partitions'),
+                'plans': plans}
 
     def update(self, table_name, updates, conditions=None):
-        if self.current_db is None:
-            raise ValueError("No database selected")
-        db_meta = self.databases[self.current_db]
-        if table_name not in db_meta:
-            raise ValueError(f"Table '{table_name}' does not exist")
-        meta = db_meta[table_name]
+        db_name = self.current_db
+        meta = self._table_meta(table_name)
+        updates = dict(updates)
+        if 'partitioning' not in meta:
+            self._submit(db_name, [{'op': 'update', 'table': table_name, 'updates': updates,
+                                    'conditions': conditions}])
+            return
+        predicates = parse_conditions(conditions)
+        parts = self._partitions(table_name, meta, predicates)
         pk = meta['primary_key']
-        tree_path = os.path.join(self.db_dir, self.current_db, f"{table_name}.tree")
-        data_path = os.path.join(self.db_dir, self.current_db, f"{table_name}.json")
-        with open(tree_path, 'rb') as f:
-            tree = pickle.load(f)
-        with open(data_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        for rec in data:
-            if not conditions or all(rec.get(col) == val for col, val in conditions.items()):
-                old_key = rec[pk]
-                for col, val in updates.items():
-                    rec[col] = val
-                new_key = rec[pk]
-                if new_key != old_key:
-                    tree.delete(old_key)
-                    tree.insert(new_key)
-        with open(data_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        with open(tree_path, 'wb') as f:
-            pickle.dump(tree, f)
+        if pk not in updates:
+            self._submit(db_name, [{'op': 'update', 'table': part, 'updates': updates,
+                                    'conditions': predicates} for part in parts])
+            return
+        new_key = self._coerce(meta, {pk: updates[pk]})[pk]
+        target = partition_name(table_name, partition_of(meta['partitioning'], new_key))
+        self._submit(db_name, [{'op': 'move', 'parent': table_name, 'tables': parts, 'target': target,
+                                'updates': updates, 'conditions': predicates}])
 
-    def delete(self, table_name, conditions=None):
-        if self.current_db is None:
-            raise ValueError("No database selected")
-        db_meta = self.databases[self.current_db]
-        if table_name not in db_meta:
-            raise ValueError(f"Table '{table_name}' does not exist")
-        meta = db_meta[table_name]
+    def _apply_update(self, db_name, table_name, updates, conditions):
+        meta = self.databases[db_name][table_name]
         pk = meta['primary_key']
-        tree_path = os.path.join(self.db_dir, self.current_db, f"{table_name}.tree")
-        data_path = os.path.join(self.db_dir, self.current_db, f"{table_name}.json")
-        with open(tree_path, 'rb') as f:
-            tree = pickle.load(f)
-        with open(data_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        new_data = []
-        for rec in data:
-            if conditions and all(rec.get(col) == val for col, val in conditions.items()):
-                tree.delete(rec[pk])
+        updates = self._coerce(meta, dict(updates))
+        table = self._open_table(db_name, table_name)
+        tree = table['tree']
+        matched = self._matching(table, meta, conditions)
+        if pk in updates:
+            if len(matched) > 1:
+                raise DuplicateKeyError(f"Update would duplicate key '{updates[pk]}' in table '{table_name}'")
+            if matched and matched[0][pk] != updates[pk] and tree.get(updates[pk]) is not None:
+                raise DuplicateKeyError(f"Key '{updates[pk]}' already exists in table '{table_name}'")
+        if matched:
+            self._index_check(table, meta, [updates])
+        changed = 0
+        for rec in matched:
+            old_key = rec[pk]
+            self._index_remove(table, meta, rec)
+            if tree.persistent:
+                rec = dict(rec)
+            rec.update(updates)
+            self._index_add(table, meta, rec)
+            if rec[pk] != old_key:
+                tree.delete(old_key)
+                tree.insert(rec[pk], self._payload(table, rec))
             else:
-                new_data.append(rec)
-        with open(data_path, 'w', encoding='utf-8') as f:
-            json.dump(new_data, f, ensure_ascii=False, indent=2)
-        with open(tree_path, 'wb') as f:
-            pickle.dump(tree, f)
+                tree.put(old_key, self._payload(table, rec))
+            changed += 1
+        if changed:
+            self._mark_dirty(db_name, table_name, table, changed * len(repr(updates)))
+        return changed
+
+    def delete(self, table_name, conditions=None):
+        db_name = self.current_db
+        meta = self._table_meta(table_name)
+        if 'partitioning' not in meta:
+            self._submit(db_name, [{'op': 'delete', 'table': table_name, 'conditions': conditions}])
+            return
+        predicates = parse_conditions(conditions)
+        self._submit(db_name, [{'op': 'delete', 'table': part, 'conditions': predicates}
+                               for part in self._partitions(table_name, meta, predicates)])
+
+    def _apply_delete(self, db_name, table_name, conditions):
+        meta = self.databases[db_name][table_name]
+        if not conditions:
+            return 0
+        table = self._open_table(db_name, table_name)
+        tree = table['tree']
+        matched = self._matching(table, meta, conditions)
+        for rec in matched:
+            tree.delete(rec[meta['primary_key']])
+            self._index_remove(table, meta, rec)
+        table['rows'] -= len(matched)
+        if matched:
+            self._mark_dirty(db_name, table_name, table)
+        return len(matched)
@@ -0,0 +1,593 @@
+""" Disk-resident B-tree """
+
+from bisect import bisect_left, bisect_right
+import mmap
+import os
+import pickle
+import struct
+import threading
+from buffer_pool import BufferPool
+
+MAGIC = b'DBT2'
+HEADER = struct.Struct('<4sIIIIIQQ')
+NODE_HEADER = struct.Struct('<HH4x')
+FREE_PAGE = struct.Struct('<HHI')
+UNDO_ENTRY = struct.Struct('<II')
+FREE_MARK = 0xFFFF
+NO_PAGE = 0
+INT64_MIN = -(1 << 63)
+INT64_MAX = (1 << 63) - 1
+
+class DiskBTreeNode:
+    def __init__(self, page_no, leaf=True):
+        self.page_no = page_no
+        self.leaf = leaf
+        self.keys = []
+        self.values = []
+        self.children = []
+        self.counts = []
+
+class DiskBTree:
+
+    def __init__(self, path, page_size=4096, t=None, pool=None):
+        self.path = path
+        self.stats = None
+        self.pool = pool if pool is not None else BufferPool()
+        self.heap_path = f"{path}.heap"
+        self.undo_path = f"{path}.undo"
+        created = False
+        if os.path.exists(path) and os.path.getsize(path) >= HEADER.size:
+            self._rollback(path, self.undo_path)
+            with open(path, 'rb') as f:
+                header = HEADER.unpack(f.read(HEADER.size))
+            magic, page_size, t, self.root, self.n_pages, self.free_head, self.count, _ = header
+            if magic != MAGIC:
+                raise ValueError(f"'{path}' is not a disk B-tree file")
+            self._setup_layout(page_size, t)
+            self._file = open(path, 'r+b')
+        else:
+            if t is None:
+                t = self.max_degree(page_size)
+            self._setup_layout(page_size, t)
+            self.root = 1
+            self.n_pages = 2
+            self.free_head = NO_PAGE
+            self.count = 0
+            self._file = open(path, 'w+b')
+            self._file.truncate(self.n_pages * page_size)
+            created = True
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._heap_fd = os.open(self.heap_path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._heap_end = os.fstat(self._heap_fd).st_size
+        self._undo_fd = os.open(self.undo_path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        self._undo_lock = threading.Lock()
+        self._journaled = set()
+        self._durable_pages = 0 if created else self.n_pages
+        if created:
+            self._write_node(DiskBTreeNode(self.root, leaf=True))
+            self.flush()
+
+    @staticmethod
+    def _rollback(path, undo_path):
+        if not os.path.exists(undo_path):
+            return
+        with open(undo_path, 'rb') as f:
+            journal = f.read()
+        entries = []
+        pos = 0
+        while pos + UNDO_ENTRY.size <= len(journal):
+            page_no, length = UNDO_ENTRY.unpack_from(journal, pos)
+            pos += UNDO_ENTRY.size
+            if pos + length > len(journal):
+                break
+            entries.append((page_no, journal[pos:pos + length]))
+            pos += length
+        if entries:
+            with open(path, 'r+b') as f:
+                for page_no, image in reversed(entries):
+                    f.seek(page_no * len(image))
+                    f.write(image)
+                f.flush()
+                os.fsync(f.fileno())
+        os.truncate(undo_path, 0)
+
+    def _journal(self, page_nos):
+        with self._undo_lock:
+            pages = sorted(p for p in set(page_nos) if p < self._durable_pages and p not in self._journaled)
+            if not pages:
+                return
+            os.write(self._undo_fd, b''.join(UNDO_ENTRY.pack(p, self.page_size) + self.read_page(p)
+                                             for p in pages))
+            os.fsync(self._undo_fd)
+            self._journaled.update(pages)
+
+    @staticmethod
+    def max_degree(page_size):
+        return (page_size + 12) // 64
+
+    def _setup_layout(self, page_size, t):
+        if t < 2:
+            raise ValueError("B-tree degree must be at least 2")
+        if t > self.max_degree(page_size):
+            raise ValueError(f"Degree {t} does not fit into a {page_size}-byte page")
+        self.page_size = page_size
+        self.t = t
+        self.max_keys = 2 * t - 1
+        self._keys_off = NODE_HEADER.size
+        self._offsets_off = self._keys_off + 8 * self.max_keys
+        self._lengths_off = self._offsets_off + 8 * self.max_keys
+        self._children_off = self._lengths_off + 4 * self.max_keys
+        self._counts_off = self._children_off + 4 * (self.max_keys + 1)
+
+    def _write_header(self):
+        HEADER.pack_into(self._map, 0, MAGIC, self.page_size, self.t, self.root,
+                         self.n_pages, self.free_head, self.count, 0)
+
+    def _check_key(self, k):
+        if not isinstance(k, int) or isinstance(k, bool) or not INT64_MIN <= k <= INT64_MAX:
+            raise ValueError(f"disk-btree keys must be 64-bit integers, got {k!r}")
+        return k
+
+    def read_page(self, page_no):
+        base = page_no * self.page_size
+        return self._map[base:base + self.page_size]
+
+    def write_page(self, page_no, data):
+        self._journal((page_no,))
+        base = page_no * self.page_size
+        self._map[base:base + self.page_size] = data
+
+    def _read_node(self, page_no):
+        buf = self.pool.fetch_page(self, page_no).data
+        leaf, n = NODE_HEADER.unpack_from(buf, 0)
+        node = DiskBTreeNode(page_no, bool(leaf))
+        node.keys = list(struct.unpack_from(f'<{n}q', buf, self._keys_off))
+        offsets = struct.unpack_from(f'<{n}Q', buf, self._offsets_off)
+        lengths = struct.unpack_from(f'<{n}I', buf, self._lengths_off)
+        node.values = list(zip(offsets, lengths))
+        if not node.leaf:
+            node.children = list(struct.unpack_from(f'<{n + 1}I', buf, self._children_off))
+            node.counts = list(struct.unpack_from(f'<{n + 1}Q', buf, self._counts_off))
+        self.pool.unpin_page(self, page_no)
+        return node
+
+    def _write_node(self, node):
+        buf = self.pool.fetch_page(self, node.page_no).data
+        n = len(node.keys)
+        NODE_HEADER.pack_into(buf, 0, int(node.leaf), n)
+        struct.pack_into(f'<{n}q', buf, self._keys_off, *node.keys)
+        struct.pack_into(f'<{n}Q', buf, self._offsets_off, *(v[0] for v in node.values))
+        struct.pack_into(f'<{n}I', buf, self._lengths_off, *(v[1] for v in node.values))
+        if not node.leaf:
+            struct.pack_into(f'<{n + 1}I', buf, self._children_off, *node.children)
+            struct.pack_into(f'<{n + 1}Q', buf, self._counts_off, *node.counts)
+        self.pool.unpin_page(self, node.page_no, dirty=True)
+
+    def _add_count(self, node, i, delta):
+        node.counts[i] += delta
+        buf = self.pool.fetch_page(self, node.page_no).data
+        struct.pack_into('<Q', buf, self._counts_off + 8 * i, node.counts[i])
+        self.pool.unpin_page(self, node.page_no, dirty=True)
+
+    def _allocate(self, leaf):
+        if self.free_head != NO_PAGE:
+            page_no = self.free_head
+            _, _, self.free_head = FREE_PAGE.unpack_from(self.pool.fetch_page(self, page_no).data, 0)
+            self.pool.unpin_page(self, page_no)
+        else:
+            page_no = self.n_pages
+            self.n_pages += 1
+            needed = self.n_pages * self.page_size
+            if needed > len(self._map):
+                with self.pool.lock:
+                    self._map.close()
+                    self._file.truncate(max(needed, 2 * self._file.seek(0, os.SEEK_END)))
+                    self._map = mmap.mmap(self._file.fileno(), 0)
+        return DiskBTreeNode(page_no, leaf)
+
+    def _free(self, page_no):
+        FREE_PAGE.pack_into(self.pool.fetch_page(self, page_no).data, 0, FREE_MARK, 0, self.free_head)
+        self.pool.unpin_page(self, page_no, dirty=True)
+        self.free_head = page_no
+
+    def _store_value(self, v):
+        if v is None:
+            return (0, 0)
+        data = pickle.dumps(v, protocol=pickle.HIGHEST_PROTOCOL)
+        offset = self._heap_end
+        os.pwrite(self._heap_fd, data, offset)
+        self._heap_end += len(data)
+        return (offset, len(data))
+
+    def _load_value(self, ptr):
+        offset, length = ptr
+        if length == 0:
+            return None
+        return pickle.loads(os.pread(self._heap_fd, length, offset))
+
+    def insert(self, k, v=None):
+        k = self._check_key(k)
+        ptr = self._store_value(v)
+        root = self._read_node(self.root)
+        if len(root.keys) == self.max_keys:
+            temp = self._allocate(leaf=False)
+            temp.children.append(root.page_no)
+            temp.counts.append(self.count)
+            self.root = temp.page_no
+            self.split_child(temp, 0, root)
+            self.insert_non_full(temp, k, ptr)
+        else:
+            self.insert_non_full(root, k, ptr)
+        self.count += 1
+
+    def insert_non_full(self, x, k, ptr):
+        if self.stats is not None:
+            self.stats.visit(len(x.keys).bit_length())
+        i = bisect_right(x.keys, k)
+        if x.leaf:
+            x.keys.insert(i, k)
+            x.values.insert(i, ptr)
+            self._write_node(x)
+            return
+        child = self._read_node(x.children[i])
+        if len(child.keys) == self.max_keys:
+            right = self.split_child(x, i, child)
+            if k > x.keys[i]:
+                child = right
+                i += 1
+        self._add_count(x, i, 1)
+        self.insert_non_full(child, k, ptr)
+
+    def split_child(self, x, i, y):
+        if self.stats is not None:
+            self.stats.splits += 1
+        t = self.t
+        z = self._allocate(leaf=y.leaf)
+        x.keys.insert(i, y.keys[t - 1])
+        x.values.insert(i, y.values[t - 1])
+        z.keys = y.keys[t:]
+        z.values = y.values[t:]
+        y.keys = y.keys[:t - 1]
+        y.values = y.values[:t - 1]
+        if not y.leaf:
+            z.children = y.children[t:]
+            z.counts = y.counts[t:]
+            y.children = y.children[:t]
+            y.counts = y.counts[:t]
+        x.children.insert(i + 1, z.page_no)
+        x.counts[i:i + 1] = [self._size(y), self._size(z)]
+        self._write_node(y)
+        self._write_node(z)
+        self._write_node(x)
+        return z
+
+    def _size(self, node):
+        return len(node.keys) + sum(node.counts)
+
+    def bulk_load(self, items):
+        if self.count:
+            raise ValueError("disk-btree bulk load requires an empty tree")
+        for k, _ in items:
+            self._check_key(k)
+        height = 0
+        while (2 * self.t) ** (height + 1) - 1 < len(items):
+            height += 1
+        old_root = self.root
+        self.root = self._build(items, 0, len(items), height, 2)
+        self._free(old_root)
+        self.count = len(items)
+
+    def _build(self, items, lo, hi, height, min_children):
+        node = self._allocate(leaf=height == 0)
+        if height == 0:
+            node.keys = [k for k, _ in items[lo:hi]]
+            node.values = [self._store_value(v) for _, v in items[lo:hi]]
+            self._write_node(node)
+            return node.page_no
+        n = hi - lo
+        child_capacity = (2 * self.t) ** height
+        count = max(min_children, -(-(n + 1) // child_capacity))
+        size, extra = divmod(n - (count - 1), count)
+        pos = lo
+        for i in range(count):
+            end = pos + size + (1 if i < extra else 0)
+            node.children.append(self._build(items, pos, end, height - 1, self.t))
+            node.counts.append(end - pos)
+            pos = end
+            if i < count - 1:
+                node.keys.append(items[pos][0])
+                node.values.append(self._store_value(items[pos][1]))
+                pos += 1
+        self._write_node(node)
+        return node.page_no
+
+    def search(self, k):
+        k = self._check_key(k)
+        stats = self.stats
+        node = self._read_node(self.root)
+        while True:
+            i = bisect_left(node.keys, k)
+            if stats is not None:
+                stats.visit(len(node.keys).bit_length() + (i < len(node.keys)))
+            if i < len(node.keys) and node.keys[i] == k:
+                return (node, i)
+            if node.leaf:
+                return None
+            node = self._read_node(node.children[i])
+
+    def get(self, k):
+        found = self.search(k)
+        if found is None:
+            return None
+        node, i = found
+        return self._load_value(node.values[i])
+
+    def put(self, k, v):
+        found = self.search(k)
+        if found is None:
+            self.insert(k, v)
+        else:
+            node, i = found
+            node.values[i] = self._store_value(v)
+            self._write_node(node)
+
+    def delete(self, k):
+        if self.search(k) is None:
+            return
+        root = self._read_node(self.root)
+        self._delete(root, k)
+        self.count -= 1
+        root = self._read_node(self.root)
+        if len(root.keys) == 0 and not root.leaf:
+            self.root = root.children[0]
+            self._free(root.page_no)
+
+    def _delete(self, node, k):
+        t = self.t
+        i = bisect_left(node.keys, k)
+        if self.stats is not None:
+            self.stats.visit(len(node.keys).bit_length() + (i < len(node.keys)))
+
+        if i < len(node.keys) and node.keys[i] == k:
+            if node.leaf:
+                node.keys.pop(i)
+                node.values.pop(i)
+                self._write_node(node)
+                return True
+
+            left = self._read_node(node.children[i])
+            if len(left.keys) >= t:
+                pred, pred_value = self._get_predecessor(left)
+                node.keys[i] = pred
+                node.values[i] = pred_value
+                node.counts[i] -= 1
+                self._write_node(node)
+                return self._delete(left, pred)
+
+            right = self._read_node(node.children[i + 1])
+            if len(right.keys) >= t:
+                succ, succ_value = self._get_successor(right)
+                node.keys[i] = succ
+                node.values[i] = succ_value
+                node.counts[i + 1] -= 1
+                self._write_node(node)
+                return self._delete(right, succ)
+
+            self._merge_children(node, i, left, right)
+            child = left
+        elif node.leaf:
+            return False
+        else:
+            child = self._read_node(node.children[i])
+            if len(child.keys) < t:
+                i, child = self._fill_child(node, i, child)
+        self._add_count(node, i, -1)
+        return self._delete(child, k)
+
+    def _get_predecessor(self, curr):
+        while not curr.leaf:
+            curr = self._read_node(curr.children[-1])
+        return curr.keys[-1], curr.values[-1]
+
+    def _get_successor(self, curr):
+        while not curr.leaf:
+            curr = self._read_node(curr.children[0])
+        return curr.keys[0], curr.values[0]
+
+    def _merge_children(self, node, index, left_child, right_child):
+        if self.stats is not None:
+            self.stats.merges += 1
+        left_child.keys.append(node.keys[index])
+        left_child.values.append(node.values[index])
+        left_child.keys.extend(right_child.keys)
+        left_child.values.extend(right_child.values)
+        if not left_child.leaf:
+            left_child.children.extend(right_child.children)
+            left_child.counts.extend(right_child.counts)
+
+        node.keys.pop(index)
+        node.values.pop(index)
+        node.children.pop(index + 1)
+        node.counts[index] += node.counts.pop(index + 1) + 1
+        self._write_node(left_child)
+        self._write_node(node)
+        self._free(right_child.page_no)
+
+    def _fill_child(self, node, index, child):
+        prev = self._read_node(node.children[index - 1]) if index > 0 else None
+        if prev is not None and len(prev.keys) >= self.t:
+            self._borrow_from_prev(node, index, child, prev)
+            return index, child
+
+        nxt = self._read_node(node.children[index + 1]) if index < len(node.children) - 1 else None
+        if nxt is not None and len(nxt.keys) >= self.t:
+            self._borrow_from_next(node, index, child, nxt)
+            return index, child
+
+        if nxt is None:
+            self._merge_children(node, index - 1, prev, child)
+            return index - 1, prev
+        self._merge_children(node, index, child, nxt)
+        return index, child
+
+    def _borrow_from_prev(self, node, index, child, sibling):
+        if self.stats is not None:
+            self.stats.borrows += 1
+        child.keys.insert(0, node.keys[index - 1])
+        child.values.insert(0, node.values[index - 1])
+        node.keys[index - 1] = sibling.keys.pop()
+        node.values[index - 1] = sibling.values.pop()
+        moved = 1
+        if not sibling.leaf:
+            child.children.insert(0, sibling.children.pop())
+            child.counts.insert(0, sibling.counts.pop())
+            moved += child.counts[0]
+        node.counts[index - 1] -= moved
+        node.counts[index] += moved
+        self._write_node(sibling)
+        self._write_node(child)
+        self._write_node(node)
+
+    def _borrow_from_next(self, node, index, child, sibling):
+        if self.stats is not None:
+            self.stats.borrows += 1
+        child.keys.append(node.keys[index])
+        child.values.append(node.values[index])
+        node.keys[index] = sibling.keys.pop(0)
+        node.values[index] = sibling.values.pop(0)
+        moved = 1
+        if not sibling.leaf:
+            child.children.append(sibling.children.pop(0))
+            child.counts.append(sibling.counts.pop(0))
+            moved += child.counts[-1]
+        node.counts[index + 1] -= moved
+        node.counts[index] += moved
+        self._write_node(sibling)
+        self._write_node(child)
+        self._write_node(node)
+
+    def inorder_items(self):
+        result = []
+        self._inorder_items(self._read_node(self.root), result)
+        return result
+
+    def _inorder_items(self, node, result):
+        for i, key in enumerate(node.keys):
+            if not node.leaf:
+                self._inorder_items(self._read_node(node.children[i]), result)
+            result.append((key, self._load_value(node.values[i])))
+        if not node.leaf:
+            self._inorder_items(self._read_node(node.children[-1]), result)
+
+    def range(self, lo=None, hi=None, reverse=False):
+        for key, _ in self.range_items(lo, hi, reverse):
+            yield key
+
+    def range_items(self, lo=None, hi=None, reverse=False):
+        stack = []
+        node = self._read_node(self.root)
+        while node is not None:
+            if reverse:
+                i = bisect_left(node.keys, hi) if hi is not None else len(node.keys)
+            else:
+                i = bisect_left(node.keys, lo) if lo is not None else 0
+            stack.append((node, i))
+            node = None if node.leaf else self._read_node(node.children[i])
+        while stack:
+            node, i = stack.pop()
+            if reverse:
+                if i == 0:
+                    continue
+                i -= 1
+                if lo is not None and node.keys[i] < lo:
+                    return
+                next_child = i
+            else:
+                if i >= len(node.keys):
+                    continue
+                if hi is not None and node.keys[i] >= hi:
+                    return
+                next_child = i + 1
+            yield node.keys[i], self._load_value(node.values[i])
+            stack.append((node, i if reverse else i + 1))
+            if not node.leaf:
+                child = self._read_node(node.children[next_child])
+                while True:
+                    stack.append((child, len(child.keys) if reverse else 0))
+                    if child.leaf:
+                        break
+                    child = self._read_node(child.children[-1 if reverse else 0])
+
+    def __len__(self):
+        return self.count
+
+    def rank(self, k):
+        rank = 0
+        node = self._read_node(self.root)
+        while True:
+            i = bisect_left(node.keys, k)
+            if node.leaf:
+                return rank + i
+            rank += i + sum(node.counts[:i])
+            node = self._read_node(node.children[i])
+
+    def select(self, i):
+        if not 0 <= i < self.count:
+            raise IndexError("select index out of range")
+        node = self._read_node(self.root)
+        while not node.leaf:
+            for j, count in enumerate(node.counts):
+                if i < count:
+                    node = self._read_node(node.children[j])
+                    break
+                i -= count
+                if i == 0:
+                    return node.keys[j]
+                i -= 1
+        return node.keys[i]
+
+    def inorder_traversal(self):
+        result = []
+        self._inorder_traversal(self._read_node(self.root), result)
+        return result
+
+    def _inorder_traversal(self, node, result):
+        for i, key in enumerate(node.keys):
+            if not node.leaf:
+                self._inorder_traversal(self._read_node(node.children[i]), result)
+            result.append(key)
+        if not node.leaf:
+            self._inorder_traversal(self._read_node(node.children[-1]), result)
+
+    def preorder_traversal(self):
+        result = []
+        self._preorder_traversal(self._read_node(self.root), result)
+        return result
+
+    def _preorder_traversal(self, node, result):
+        result.extend(node.keys)
+        if not node.leaf:
+            for child in node.children:
+                self._preorder_traversal(self._read_node(child), result)
+
+    def flush(self):
+        self._journal(self.pool.dirty_pages(self) + [0])
+        self.pool.flush_owner(self)
+        os.fsync(self._heap_fd)
+        self._write_header()
+        self._map.flush()
+        with self._undo_lock:
+            os.ftruncate(self._undo_fd, 0)
+            os.fsync(self._undo_fd)
+            self._journaled.clear()
+            self._durable_pages = self.n_pages
+
+    def close(self):
+        if self._map.closed:
+            return
+        self.flush()
+        self.pool.drop_owner(self)
+        self._map.close()
+        self._file.close()
+        os.close(self._heap_fd)
+        os.close(self._undo_fd)
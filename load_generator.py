@@ -0,0 +1,96 @@
+""" TreeSQL load generator """
+
+import argparse
+import asyncio
+import random
+import time
+from tree_client import AsyncTreeClient, TreeSQLError
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+async def prepare(args):
+    client = await AsyncTreeClient.connect(args.host, args.port, args.unix)
+    for command in (f"CREATE DATABASE {args.database}", f"USE {args.database}",
+                    f"CREATE TABLE {args.table} ( id , name , score ) USING {args.tree}"):
+        try:
+            await client.execute(command)
+        except TreeSQLError:
+            pass
+    batch = 500
+    for start in range(0, args.rows, batch):
+        values = ", ".join(f"({i}, 'name{i}', {i % 100})"
+                           for i in range(start, min(start + batch, args.rows)))
+        await client.execute(f"INSERT INTO {args.table} VALUES {values}")
+    await client.close()
+
+async def connection(args, seed, deadline, latencies, errors):
+    client = await AsyncTreeClient.connect(args.host, args.port, args.unix)
+    await client.execute(f"USE {args.database}")
+    rng = random.Random(seed)
+    window = asyncio.Semaphore(args.pipeline)
+
+    async def one(command):
+        start = time.perf_counter()
+        try:
+            await client.send(command)
+            latencies.append(time.perf_counter() - start)
+        except TreeSQLError:
+            errors.append(command)
+        finally:
+            window.release()
+
+    tasks = set()
+    while time.perf_counter() < deadline:
+        await window.acquire()
+        key = rng.randrange(args.rows)
+        if rng.random() < args.read_ratio:
+            command = f"SELECT * FROM {args.table} WHERE id = {key}"
+        else:
+            command = f"UPDATE {args.table} SET score = {rng.randrange(100)} WHERE id = {key}"
+        task = asyncio.create_task(one(command))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        await client.writer.drain()
+    await asyncio.gather(*tasks)
+    await client.close()
+
+async def run(args):
+    if not args.skip_load:
+        await prepare(args)
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*(connection(args, seed, deadline, latencies, errors)
+                           for seed in range(args.connections)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(f"connections={args.connections} pipeline={args.pipeline} read_ratio={args.read_ratio}")
+    print(f"requests={len(latencies)} errors={len(errors)} throughput={len(latencies) / elapsed:.0f} req/s")
+    print("latency ms: p50={:.2f} p95={:.2f} p99={:.2f} max={:.2f}".format(
+        *(1000 * percentile(latencies, f) for f in (0.5, 0.95, 0.99, 1.0))))
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Генератор навантаження для сервера TreeSQL")
+    parser.add_argument("--host", default="127.0.0.1", help="Адреса сервера")
+    parser.add_argument("--port", type=int, default=5433, help="TCP-порт сервера")
+    parser.add_argument("--unix", help="Шлях до Unix-сокета сервера")
+    parser.add_argument("--connections", type=int, default=8, help="Кількість з'єднань")
+    parser.add_argument("--pipeline", type=int, default=16, help="Запитів у польоті на з'єднання")
+    parser.add_argument("--duration", type=float, default=10.0, help="Тривалість, секунди")
+    parser.add_argument("--read-ratio", type=float, default=0.9, help="Частка SELECT у суміші")
+    parser.add_argument("--rows", type=int, default=10000, help="Кількість рядків у таблиці")
+    parser.add_argument("--database", default="loadgen", help="База даних")
+    parser.add_argument("--table", default="bench", help="Таблиця")
+    parser.add_argument("--tree", default="avl", help="Тип дерева для таблиці")
+    parser.add_argument("--skip-load", action="store_true", help="Не створювати й не заповнювати таблицю")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+""" MVCC snapshot read benchmark """
+
+import argparse
+import gc
+import random
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from data_manager import DataManager
+from tree_factory import TreeFactory
+
+PAIRS = {"avl": "persistent-avl", "red-black": "persistent-red-black"}
+
+def traced_bytes(build):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        gc.collect()
+        return result, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+def memory_overhead(tree_type, rows, versions):
+    items = [(i, i) for i in range(rows)]
+
+    def build(kind):
+        tree = TreeFactory.create_tree(kind)
+        tree.bulk_load(items)
+        return tree
+
+    _, plain = traced_bytes(lambda: build(tree_type))
+    tree, persistent = traced_bytes(lambda: build(PAIRS[tree_type]))
+    rng = random.Random(0)
+
+    def keep_versions():
+        kept = []
+        for _ in range(versions):
+            kept.append(tree.snapshot())
+            tree.put(rng.randrange(rows), -1)
+        return kept
+
+    _, retained = traced_bytes(keep_versions)
+    return plain, persistent, retained
+
+def reader(session, table, rows, deadline, counts, slot):
+    rng = random.Random(slot)
+    done = 0
+    while time.perf_counter() < deadline:
+        key = rng.randrange(rows)
+        session.count(table, f"id >= {key} AND id < {key + 1000} AND score >= 0")
+        done += 1
+    counts[slot] = done
+
+def writer(session, table, rows, deadline, counts, slot):
+    rng = random.Random(slot)
+    done = 0
+    while time.perf_counter() < deadline:
+        session.update(table, {'score': rng.random()}, {'id': rng.randrange(rows)})
+        done += 1
+    counts[slot] = done
+
+def throughput(dm, table, rows, readers, writers, duration):
+    counts = [0] * (readers + writers)
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=reader, args=(dm.session("bench"), table, rows, deadline, counts, i))
+               for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(dm.session("bench"), table, rows, deadline, counts, i))
+                for i in range(readers, readers + writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts[:readers]) / duration, sum(counts[readers:]) / duration
+
+def main():
+    parser = argparse.ArgumentParser(description="TreeSQL MVCC snapshot read benchmark")
+    parser.add_argument("--tree", default="avl", choices=sorted(PAIRS), help="Baseline tree type")
+    parser.add_argument("--rows", type=int, default=50000, help="Rows in the benchmark table")
+    parser.add_argument("--versions", type=int, default=1000, help="Old versions kept for the memory test")
+    parser.add_argument("--readers", type=int, default=4, help="Reader threads")
+    parser.add_argument("--writers", type=int, default=1, help="Writer threads")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per throughput run")
+    args = parser.parse_args()
+
+    plain, persistent, retained = memory_overhead(args.tree, args.rows, args.versions)
+    print(f"memory rows={args.rows}")
+    print(f"  {args.tree:<22} {plain / args.rows:>8.1f} bytes/row")
+    print(f"  {PAIRS[args.tree]:<22} {persistent / args.rows:>8.1f} bytes/row")
+    print(f"  retained versions      {retained / max(args.versions, 1):>8.1f} bytes/version "
+          f"({args.versions} versions, {retained / max(persistent, 1):.2f}x the live tree)")
+
+    db_dir = tempfile.mkdtemp(prefix="treesql-mvcc-")
+    try:
+        dm = DataManager(db_dir, wal_fsync=False, flush_every=10 ** 9)
+        dm.create_database("bench")
+        dm.use_database("bench")
+        print(f"throughput readers={args.readers} writers={args.writers}")
+        print(f"{'tree':>22} {'reads/s':>10} {'writes/s':>10}")
+        for tree_type in (args.tree, PAIRS[args.tree]):
+            table = tree_type.replace("-", "_")
+            dm.create_table(table, ["id", "name", "score"], tree_type)
+            dm.insert_many(table, [[i, f"name{i}", random.random()] for i in range(args.rows)])
+            reads, writes = throughput(dm, table, args.rows, args.readers, args.writers, args.duration)
+            print(f"{tree_type:>22} {reads:>10.0f} {writes:>10.0f}")
+        print(f"mvcc {dm.mvcc_stats()}")
+        dm.close()
+    finally:
+        shutil.rmtree(db_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+""" Table partitioning """
+
+import zlib
+from bisect import bisect_left, bisect_right
+
+PARTITION_METHODS = ("range", "hash")
+
+def partition_name(table_name, number):
+    return f"{table_name}#{number}"
+
+def make_spec(method, column, partitions=None, bounds=None):
+    method = method.lower()
+    if method not in PARTITION_METHODS:
+        raise ValueError(f"Unknown partitioning method: {method}")
+    if method == "range":
+        bounds = list(bounds or [])
+        if not bounds:
+            raise ValueError("PARTITION BY RANGE needs at least one bound")
+        if any(a >= b for a, b in zip(bounds, bounds[1:])):
+            raise ValueError("Partition bounds must be strictly increasing")
+        return {'method': method, 'column': column, 'bounds': bounds, 'partitions': len(bounds) + 1}
+    if not partitions or partitions < 1:
+        raise ValueError("PARTITION BY HASH needs a positive partition count")
+    return {'method': method, 'column': column, 'partitions': partitions}
+
+def stable_hash(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, int):
+        return value
+    return zlib.crc32(repr(value).encode('utf-8'))
+
+def partition_of(spec, value):
+    if value is None:
+        raise ValueError(f"Partition column '{spec['column']}' cannot be NULL")
+    if spec['method'] == "range":
+        return bisect_right(spec['bounds'], value)
+    return stable_hash(value) % spec['partitions']
+
+def prune(spec, predicates):
+    column = spec['column']
+    everything = list(range(spec['partitions']))
+    for col, op, val in predicates:
+        if col == column and op == '=':
+            try:
+                return [partition_of(spec, val)]
+            except TypeError:
+                return []
+    if spec['method'] != "range":
+        return everything
+    lo = hi = None
+    hi_inclusive = True
+    try:
+        for col, op, val in predicates:
+            if col != column:
+                continue
+            if op in ('>', '>=') and (lo is None or val > lo):
+                lo = val
+            elif op in ('<', '<=') and (hi is None or val < hi or (val == hi and op == '<')):
+                hi, hi_inclusive = val, op == '<='
+        first = bisect_right(spec['bounds'], lo) if lo is not None else 0
+        if hi is None:
+            last = spec['partitions'] - 1
+        elif hi_inclusive:
+            last = bisect_right(spec['bounds'], hi)
+        else:
+            last = bisect_left(spec['bounds'], hi)
+    except TypeError:
+        return everything
+    return list(range(first, last + 1))
@@ -0,0 +1,382 @@
+""" Persistent (path-copying) AVL and red-black trees """
+
+RED = 'red'
+BLACK = 'black'
+
+def _size(node):
+    return node.size if node else 0
+
+
+class PersistentTree:
+
+    __slots__ = ('root', 'stats')
+
+    def __init__(self, root=None, stats=None):
+
+        self.root = root
+        self.stats = stats
+
+    def _with_root(self, root):
+
+        return self if root is self.root else type(self)(root, self.stats)
+
+    def _find(self, key):
+
+        stats = self.stats
+        node = self.root
+        while node and key != node.key:
+            node = node.left if key < node.key else node.right
+            if stats is not None:
+                stats.visit(2)
+        if node and stats is not None:
+            stats.visit(1)
+        return node
+
+    def search(self, key):
+
+        return self._find(key) is not None
+
+    def get(self, key):
+
+        node = self._find(key)
+        return node.value if node else None
+
+    def insert(self, key, value=None):
+
+        return self._with_root(self._insert_root(key, value, False))
+
+    def put(self, key, value):
+
+        return self._with_root(self._insert_root(key, value, True))
+
+    def delete(self, key):
+
+        if not self.search(key):
+            return self
+        return self._with_root(self._delete_root(key))
+
+    def __len__(self):
+
+        return _size(self.root)
+
+    def rank(self, key):
+
+        count = 0
+        node = self.root
+        while node:
+            if key <= node.key:
+                node = node.left
+            else:
+                count += 1 + _size(node.left)
+                node = node.right
+        return count
+
+    def select(self, i):
+
+        if not 0 <= i < len(self):
+            raise IndexError("select index out of range")
+        node = self.root
+        while True:
+            left_size = _size(node.left)
+            if i < left_size:
+                node = node.left
+            elif i == left_size:
+                return node.key
+            else:
+                i -= left_size + 1
+                node = node.right
+
+    def range_items(self, lo=None, hi=None, reverse=False):
+
+        stack = []
+        node = self.root
+        while stack or node:
+            while node:
+                if reverse and hi is not None and node.key >= hi:
+                    node = node.left
+                elif not reverse and lo is not None and node.key < lo:
+                    node = node.right
+                else:
+                    stack.append(node)
+                    node = node.right if reverse else node.left
+            if not stack:
+                return
+            node = stack.pop()
+            if reverse and lo is not None and node.key < lo:
+                return
+            if not reverse and hi is not None and node.key >= hi:
+                return
+            yield node.key, node.value
+            node = node.left if reverse else node.right
+
+    def in_order(self):
+
+        for key, _ in self.range_items():
+            yield key
+
+    def pre_order(self):
+
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            yield node.key
+            if node.right:
+                stack.append(node.right)
+            if node.left:
+                stack.append(node.left)
+
+    def height(self):
+
+        def _height(node):
+            return 1 + max(_height(node.left), _height(node.right)) if node else 0
+        return _height(self.root)
+
+
+class AVLNode:
+
+    __slots__ = ('key', 'value', 'left', 'right', 'height', 'size')
+
+    def __init__(self, key, value, left=None, right=None):
+
+        self.key = key
+        self.value = value
+        self.left = left
+        self.right = right
+        self.height = 1 + max(left.height if left else 0, right.height if right else 0)
+        self.size = 1 + _size(left) + _size(right)
+
+
+def _height(node):
+    return node.height if node else 0
+
+def _avl_balance(key, value, left, right):
+    if _height(left) > _height(right) + 1:
+        if _height(left.left) >= _height(left.right):
+            return AVLNode(left.key, left.value, left.left, AVLNode(key, value, left.right, right))
+        pivot = left.right
+        return AVLNode(pivot.key, pivot.value, AVLNode(left.key, left.value, left.left, pivot.left),
+                       AVLNode(key, value, pivot.right, right))
+    if _height(right) > _height(left) + 1:
+        if _height(right.right) >= _height(right.left):
+            return AVLNode(right.key, right.value, AVLNode(key, value, left, right.left), right.right)
+        pivot = right.left
+        return AVLNode(pivot.key, pivot.value, AVLNode(key, value, left, pivot.left),
+                       AVLNode(right.key, right.value, pivot.right, right.right))
+    return AVLNode(key, value, left, right)
+
+def _avl_delete_min(node):
+    if node.left is None:
+        return node.right, node
+    left, minimum = _avl_delete_min(node.left)
+    return _avl_balance(node.key, node.value, left, node.right), minimum
+
+
+class PersistentAVLTree(PersistentTree):
+
+    __slots__ = ()
+
+    def _insert_root(self, key, value, replace):
+
+        stats = self.stats
+
+        def _insert(node):
+            if node is None:
+                return AVLNode(key, value)
+            if stats is not None:
+                stats.visit(1 if key < node.key else 2)
+            if key < node.key:
+                left = _insert(node.left)
+                return node if left is node.left else _avl_balance(node.key, node.value, left, node.right)
+            if key > node.key:
+                right = _insert(node.right)
+                return node if right is node.right else _avl_balance(node.key, node.value, node.left, right)
+            if not replace:
+                return node
+            return AVLNode(key, value, node.left, node.right)
+        return _insert(self.root)
+
+    def _delete_root(self, key):
+
+        stats = self.stats
+
+        def _delete(node):
+            if stats is not None:
+                stats.visit(1 if key < node.key else 2)
+            if key < node.key:
+                return _avl_balance(node.key, node.value, _delete(node.left), node.right)
+            if key > node.key:
+                return _avl_balance(node.key, node.value, node.left, _delete(node.right))
+            if node.left is None or node.right is None:
+                return node.left or node.right
+            right, successor = _avl_delete_min(node.right)
+            return _avl_balance(successor.key, successor.value, node.left, right)
+        return _delete(self.root)
+
+    @classmethod
+    def from_sorted(cls, items):
+
+        def _build(lo, hi):
+            if lo >= hi:
+                return None
+            mid = (lo + hi) // 2
+            key, value = items[mid]
+            return AVLNode(key, value, _build(lo, mid), _build(mid + 1, hi))
+        return cls(_build(0, len(items)))
+
+
+class RBNode:
+
+    __slots__ = ('color', 'left', 'key', 'value', 'right', 'size')
+
+    def __init__(self, color, left, key, value, right):
+
+        self.color = color
+        self.left = left
+        self.key = key
+        self.value = value
+        self.right = right
+        self.size = 1 + _size(left) + _size(right)
+
+
+def _is_red(node):
+    return node is not None and node.color == RED
+
+def _red(left, node, right):
+    return RBNode(RED, left, node.key, node.value, right)
+
+def _black(left, node, right):
+    return RBNode(BLACK, left, node.key, node.value, right)
+
+def _rb_balance(left, node, right):
+    if _is_red(left) and _is_red(right):
+        return _red(_black(left.left, left, left.right), node, _black(right.left, right, right.right))
+    if _is_red(left):
+        if _is_red(left.left):
+            a = left.left
+            return _red(_black(a.left, a, a.right), left, _black(left.right, node, right))
+        if _is_red(left.right):
+            b = left.right
+            return _red(_black(left.left, left, b.left), b, _black(b.right, node, right))
+    if _is_red(right):
+        if _is_red(right.right):
+            c = right.right
+            return _red(_black(left, node, right.left), right, _black(c.left, c, c.right))
+        if _is_red(right.left):
+            b = right.left
+            return _red(_black(left, node, b.left), b, _black(b.right, right, right.right))
+    return _black(left, node, right)
+
+def _rb_sub1(node):
+    if node is None or node.color != BLACK:
+        raise ValueError("Red-black invariant violated")
+    return _red(node.left, node, node.right)
+
+def _rb_balance_left(left, node, right):
+    if _is_red(left):
+        return _red(_black(left.left, left, left.right), node, right)
+    if right is not None and right.color == BLACK:
+        return _rb_balance(left, node, _red(right.left, right, right.right))
+    if _is_red(right) and right.left is not None and right.left.color == BLACK:
+        b = right.left
+        return _red(_black(left, node, b.left), b, _rb_balance(b.right, right, _rb_sub1(right.right)))
+    raise ValueError("Red-black invariant violated")
+
+def _rb_balance_right(left, node, right):
+    if _is_red(right):
+        return _red(left, node, _black(right.left, right, right.right))
+    if left is not None and left.color == BLACK:
+        return _rb_balance(_red(left.left, left, left.right), node, right)
+    if _is_red(left) and left.right is not None and left.right.color == BLACK:
+        b = left.right
+        return _red(_rb_balance(_rb_sub1(left.left), left, b.left), b, _black(b.right, node, right))
+    raise ValueError("Red-black invariant violated")
+
+def _rb_append(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if _is_red(left) and _is_red(right):
+        middle = _rb_append(left.right, right.left)
+        if _is_red(middle):
+            return _red(_red(left.left, left, middle.left), middle, _red(middle.right, right, right.right))
+        return _red(left.left, left, _red(middle, right, right.right))
+    if not _is_red(left) and not _is_red(right):
+        middle = _rb_append(left.right, right.left)
+        if _is_red(middle):
+            return _red(_black(left.left, left, middle.left), middle, _black(middle.right, right, right.right))
+        return _rb_balance_left(left.left, left, _black(middle, right, right.right))
+    if _is_red(right):
+        return _red(_rb_append(left, right.left), right, right.right)
+    return _red(left.left, left, _rb_append(left.right, right))
+
+
+class PersistentRedBlackTree(PersistentTree):
+
+    __slots__ = ()
+
+    def _insert_root(self, key, value, replace):
+
+        stats = self.stats
+
+        def _insert(node):
+            if node is None:
+                return RBNode(RED, None, key, value, None)
+            if stats is not None:
+                stats.visit(1 if key < node.key else 2)
+            if key < node.key:
+                left = _insert(node.left)
+                if left is node.left:
+                    return node
+                if node.color == BLACK:
+                    return _rb_balance(left, node, node.right)
+                return _red(left, node, node.right)
+            if key > node.key:
+                right = _insert(node.right)
+                if right is node.right:
+                    return node
+                if node.color == BLACK:
+                    return _rb_balance(node.left, node, right)
+                return _red(node.left, node, right)
+            if not replace:
+                return node
+            return RBNode(node.color, node.left, key, value, node.right)
+        root = _insert(self.root)
+        if root.color == RED:
+            root = _black(root.left, root, root.right)
+        return root
+
+    def _delete_root(self, key):
+
+        stats = self.stats
+
+        def _delete(node):
+            if stats is not None:
+                stats.visit(1 if key < node.key else 2)
+            if key < node.key:
+                if node.left is not None and node.left.color == BLACK:
+                    return _rb_balance_left(_delete(node.left), node, node.right)
+                return _red(_delete(node.left), node, node.right)
+            if key > node.key:
+                if node.right is not None and node.right.color == BLACK:
+                    return _rb_balance_right(node.left, node, _delete(node.right))
+                return _red(node.left, node, _delete(node.right))
+            return _rb_append(node.left, node.right)
+        root = _delete(self.root)
+        if root is not None and root.color == RED:
+            root = _black(root.left, root, root.right)
+        return root
+
+    @classmethod
+    def from_sorted(cls, items):
+
+        max_depth = len(items).bit_length() - 1
+
+        def _build(lo, hi, depth):
+            if lo >= hi:
+                return None
+            mid = (lo + hi) // 2
+            key, value = items[mid]
+            color = RED if 0 < depth == max_depth else BLACK
+            return RBNode(color, _build(lo, mid, depth + 1), key, value, _build(mid + 1, hi, depth + 1))
+        return cls(_build(0, len(items), 0))
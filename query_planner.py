@@ -0,0 +1,103 @@
+""" Query planner """
+
+import math
+from sql_parser import Condition, parse_where
+
+RANGE_SELECTIVITY = 1 / 3
+BETWEEN_SELECTIVITY = 1 / 4
+
+def parse_conditions(conditions):
+    if isinstance(conditions, Condition):
+        return conditions
+    if not conditions:
+        return Condition()
+    if isinstance(conditions, dict):
+        return Condition.from_predicates((col, '=', val) for col, val in conditions.items())
+    if not isinstance(conditions, str):
+        return Condition.from_predicates(conditions)
+    return parse_where(conditions)
+
+def matches(rec, predicates):
+    return predicates.test(rec)
+
+class Plan:
+    def __init__(self, access, estimated_rows, cost, column=None, index_name=None,
+                 key=None, lo=None, hi=None, lo_inclusive=True, hi_inclusive=True):
+        self.access = access
+        self.estimated_rows = estimated_rows
+        self.cost = cost
+        self.column = column
+        self.index_name = index_name
+        self.key = key
+        self.lo = lo
+        self.hi = hi
+        self.lo_inclusive = lo_inclusive
+        self.hi_inclusive = hi_inclusive
+        self.predicates = []
+
+    def in_range(self, key):
+        if self.lo is not None and (key < self.lo or (key == self.lo and not self.lo_inclusive)):
+            return False
+        if self.hi is not None and (key > self.hi or (key == self.hi and not self.hi_inclusive)):
+            return False
+        return True
+
+    def past_range(self, key):
+        return self.hi is not None and (key > self.hi or (key == self.hi and not self.hi_inclusive))
+
+    def __repr__(self):
+        return f"Plan(access={self.access}, estimated_rows={self.estimated_rows:.0f}, cost={self.cost:.1f})"
+
+class QueryPlanner:
+
+    def plan(self, meta, rows, index_stats, predicates):
+
+        n = max(rows, 1)
+        log_n = math.log2(n + 1)
+        pk = meta['primary_key']
+        indexed = {index_meta['column']: index_name
+                   for index_name, index_meta in meta.get('indexes', {}).items()}
+
+        candidates = [Plan('full_scan', rows, float(n))]
+
+        for col, op, val in predicates:
+            if op != '=':
+                continue
+            if col == pk:
+                candidates.append(Plan('pk_point', min(1, rows), log_n, column=col, key=val))
+            elif col in indexed:
+                index_name = indexed[col]
+                distinct = max(index_stats.get(index_name, 1), 1)
+                estimate = rows / distinct
+                candidates.append(Plan('index', estimate, log_n + estimate * log_n,
+                                       column=col, index_name=index_name, key=val))
+
+        bounds = self._pk_bounds(pk, predicates)
+        if bounds:
+            lo, lo_inclusive, hi, hi_inclusive = bounds
+            selectivity = BETWEEN_SELECTIVITY if lo is not None and hi is not None else RANGE_SELECTIVITY
+            estimate = rows * selectivity
+            candidates.append(Plan('pk_range', estimate, log_n + estimate, column=pk,
+                                   lo=lo, hi=hi, lo_inclusive=lo_inclusive, hi_inclusive=hi_inclusive))
+
+        best = min(candidates, key=lambda plan: plan.cost)
+        best.predicates = predicates
+        return best
+
+    def _pk_bounds(self, pk, predicates):
+
+        lo = hi = None
+        lo_inclusive = hi_inclusive = True
+        for col, op, val in predicates:
+            if col != pk or op not in ('<', '<=', '>', '>='):
+                continue
+            try:
+                if op in ('>', '>=') and (lo is None or val > lo or (val == lo and op == '>')):
+                    lo, lo_inclusive = val, op == '>='
+                elif op in ('<', '<=') and (hi is None or val < hi or (val == hi and op == '<')):
+                    hi, hi_inclusive = val, op == '<='
+            except TypeError:
+                return None
+        if lo is None and hi is None:
+            return None
+        return lo, lo_inclusive, hi, hi_inclusive
@@ -2,9 +2,11 @@
 
 class Node:
 
-    def __init__(self, key, color='red'):
+    def __init__(self, key, color='red', value=None):
 
         self.key = key
+        self.value = value
+        self.size = 1
         self.color = color
         self.parent = None
         self.left = None
@@ -15,12 +17,16 @@ class RedBlackTree:
     def __init__(self):
 
         self.NIL = Node(key=None, color='black')
+        self.NIL.size = 0
         self.NIL.left = self.NIL
         self.NIL.right = self.NIL
         self.root = self.NIL
+        self.stats = None
 
     def left_rotate(self, x):
 
+        if self.stats is not None:
+            self.stats.rotations += 1
         y = x.right
         x.right = y.left
         if y.left != self.NIL:
@@ -34,9 +40,13 @@ class RedBlackTree:
             x.parent.right = y
         y.left = x
         x.parent = y
+        y.size = x.size
+        x.size = x.left.size + x.right.size + 1
 
     def right_rotate(self, y):
 
+        if self.stats is not None:
+            self.stats.rotations += 1
         x = y.left
         y.left = x.right
         if x.right != self.NIL:
@@ -50,23 +60,31 @@ class RedBlackTree:
             y.parent.right = x
         x.right = y
         y.parent = x
+        x.size = y.size
+        y.size = y.left.size + y.right.size + 1
 
-    def insert(self, key):
+    def insert(self, key, value=None):
 
-        node = Node(key)
+        node = Node(key, value=value)
         node.left = self.NIL
         node.right = self.NIL
 
+        stats = self.stats
         parent = None
         current = self.root
         while current != self.NIL:
+            if stats is not None:
+                stats.visit(1)
             parent = current
+            current.size += 1
             if node.key < current.key:
                 current = current.left
             else:
                 current = current.right
 
         node.parent = parent
+        if stats is not None and parent is not None:
+            stats.comparisons += 1
         if parent is None:
             self.root = node
         elif node.key < parent.key:
@@ -77,6 +95,24 @@ class RedBlackTree:
         node.color = 'red'
         self.insert_fixup(node)
 
+    def bulk_load(self, items):
+
+        max_depth = len(items).bit_length() - 1
+
+        def _build(lo, hi, depth, parent):
+            if lo >= hi:
+                return self.NIL
+            mid = (lo + hi) // 2
+            key, value = items[mid]
+            color = 'red' if 0 < depth == max_depth else 'black'
+            node = Node(key, color, value)
+            node.parent = parent
+            node.size = hi - lo
+            node.left = _build(lo, mid, depth + 1, node)
+            node.right = _build(mid + 1, hi, depth + 1, node)
+            return node
+        self.root = _build(0, len(items), 0, None)
+
     def insert_fixup(self, z):
 
         while z.parent and z.parent.color == 'red':
@@ -126,11 +162,22 @@ class RedBlackTree:
             node = node.left
         return node
 
+    def maximum(self, node):
+
+        while node.right != self.NIL:
+            node = node.right
+        return node
+
     def delete(self, key):
 
         z = self.search_node(self.root, key)
         if z == self.NIL:
             return None
+        y = z if z.left == self.NIL or z.right == self.NIL else self.minimum(z.right)
+        ancestor = y.parent
+        while ancestor is not None:
+            ancestor.size -= 1
+            ancestor = ancestor.parent
         y = z
         y_original_color = y.color
         if z.left == self.NIL:
@@ -153,6 +200,7 @@ class RedBlackTree:
             y.left = z.left
             y.left.parent = y
             y.color = z.color
+            y.size = z.size
         if y_original_color == 'black':
             self.delete_fixup(x)
 
@@ -208,10 +256,58 @@ class RedBlackTree:
         node = self.search_node(self.root, key)
         return node if node != self.NIL else None
 
+    def get(self, key):
+
+        node = self.search_node(self.root, key)
+        return node.value if node != self.NIL else None
+
+    def put(self, key, value):
+
+        node = self.search_node(self.root, key)
+        if node != self.NIL:
+            node.value = value
+        else:
+            self.insert(key, value)
+
+    def __len__(self):
+
+        return self.root.size
+
+    def rank(self, key):
+
+        count = 0
+        node = self.root
+        while node != self.NIL:
+            if key <= node.key:
+                node = node.left
+            else:
+                count += node.left.size + 1
+                node = node.right
+        return count
+
+    def select(self, i):
+
+        if not 0 <= i < len(self):
+            raise IndexError("select index out of range")
+        node = self.root
+        while True:
+            if i < node.left.size:
+                node = node.left
+            elif i == node.left.size:
+                return node.key
+            else:
+                i -= node.left.size + 1
+                node = node.right
+
     def search_node(self, node, key):
 
+        stats = self.stats
         while node != self.NIL and key != node.key:
             node = node.left if key < node.key else node.right
+            if stats is not None:
+                stats.visit(2)
+        if node != self.NIL and stats is not None:
+            stats.visit(1)
         return node
 
     def inorder_walk(self, node=None, res=None):
@@ -237,3 +333,43 @@ class RedBlackTree:
             self.preorder_walk(node.left, res)
             self.preorder_walk(node.right, res)
         return res
+
+    def range(self, lo=None, hi=None, reverse=False):
+
+        for key, _ in self.range_items(lo, hi, reverse):
+            yield key
+
+    def range_items(self, lo=None, hi=None, reverse=False):
+
+        stack = []
+        node = self.root
+        while stack or node != self.NIL:
+            while node != self.NIL:
+                if reverse and hi is not None and node.key >= hi:
+                    node = node.left
+                elif not reverse and lo is not None and node.key < lo:
+                    node = node.right
+                else:
+                    stack.append(node)
+                    node = node.right if reverse else node.left
+            if not stack:
+                return
+            node = stack.pop()
+            if reverse and lo is not None and node.key < lo:
+                return
+            if not reverse and hi is not None and node.key >= hi:
+                return
+            yield node.key, node.value
+            node = node.left if reverse else node.right
+
+    def inorder_items(self, node=None, res=None):
+
+        if res is None:
+            res = []
+        if node is None:
+            node = self.root
+        if node != self.NIL:
+            self.inorder_items(node.left, res)
+            res.append((node.key, node.value))
+            self.inorder_items(node.right, res)
+        return res
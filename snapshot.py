@@ -0,0 +1,128 @@
+""" Binary tree snapshots """
+
+import json
+import pickle
+import struct
+
+MAGIC = b"TSNP"
+VERSION = 1
+
+_HEADER = struct.Struct('<4sHQ')
+_U32 = struct.Struct('<I')
+_I64 = struct.Struct('<q')
+_F64 = struct.Struct('<d')
+
+_I64_MIN = -(1 << 63)
+_I64_MAX = (1 << 63) - 1
+
+def _write_bytes(out, data):
+    out.write(_U32.pack(len(data)))
+    out.write(data)
+
+def _read_exact(f, n):
+    data = f.read(n)
+    if len(data) != n:
+        raise ValueError("Truncated snapshot")
+    return data
+
+def _read_bytes(f):
+    return _read_exact(f, _U32.unpack(_read_exact(f, 4))[0])
+
+def _encode(out, value, columns):
+    if value is None:
+        out.write(b'N')
+    elif value is True or value is False:
+        out.write(b'T' if value else b'F')
+    elif type(value) is int and _I64_MIN <= value <= _I64_MAX:
+        out.write(b'i')
+        out.write(_I64.pack(value))
+    elif type(value) is int:
+        out.write(b'I')
+        _write_bytes(out, str(value).encode('ascii'))
+    elif type(value) is float:
+        out.write(b'f')
+        out.write(_F64.pack(value))
+    elif type(value) is str:
+        out.write(b's')
+        _write_bytes(out, value.encode('utf-8'))
+    elif type(value) is dict and columns is not None and list(value) == columns:
+        out.write(b'r')
+        for item in value.values():
+            _encode(out, item, None)
+    elif type(value) is dict:
+        out.write(b'd')
+        out.write(_U32.pack(len(value)))
+        for key, item in value.items():
+            _encode(out, key, None)
+            _encode(out, item, None)
+    elif type(value) is list:
+        out.write(b'l')
+        out.write(_U32.pack(len(value)))
+        for item in value:
+            _encode(out, item, None)
+    else:
+        out.write(b'p')
+        _write_bytes(out, pickle.dumps(value))
+
+def _decode(f, columns):
+    tag = _read_exact(f, 1)
+    if tag == b'N':
+        return None
+    if tag == b'T':
+        return True
+    if tag == b'F':
+        return False
+    if tag == b'i':
+        return _I64.unpack(_read_exact(f, 8))[0]
+    if tag == b'I':
+        return int(_read_bytes(f))
+    if tag == b'f':
+        return _F64.unpack(_read_exact(f, 8))[0]
+    if tag == b's':
+        return _read_bytes(f).decode('utf-8')
+    if tag == b'r':
+        return {col: _decode(f, None) for col in columns}
+    if tag == b'd':
+        count = _U32.unpack(_read_exact(f, 4))[0]
+        result = {}
+        for _ in range(count):
+            key = _decode(f, None)
+            result[key] = _decode(f, None)
+        return result
+    if tag == b'l':
+        count = _U32.unpack(_read_exact(f, 4))[0]
+        return [_decode(f, None) for _ in range(count)]
+    if tag == b'p':
+        return pickle.loads(_read_bytes(f))
+    raise ValueError(f"Unknown snapshot tag: {tag!r}")
+
+def is_snapshot(f):
+    magic = f.read(len(MAGIC))
+    f.seek(-len(magic), 1)
+    return magic == MAGIC
+
+def write_snapshot(out, tree_type, tree_options, count, items, columns=None):
+    out.write(_HEADER.pack(MAGIC, VERSION, count))
+    header = {'tree_type': tree_type, 'tree_options': tree_options, 'columns': columns}
+    _write_bytes(out, json.dumps(header).encode('utf-8'))
+    written = 0
+    for key, value in items:
+        _encode(out, key, None)
+        _encode(out, value, columns)
+        written += 1
+    if written != count:
+        raise ValueError(f"Snapshot expected {count} items, got {written}")
+
+def read_snapshot(f):
+    magic, version, count = _HEADER.unpack(_read_exact(f, _HEADER.size))
+    if magic != MAGIC:
+        raise ValueError("Not a tree snapshot")
+    if version > VERSION:
+        raise ValueError(f"Unsupported snapshot version: {version}")
+    header = json.loads(_read_bytes(f))
+    return header, _read_items(f, count, header.get('columns'))
+
+def _read_items(f, count, columns):
+    for _ in range(count):
+        key = _decode(f, None)
+        yield key, _decode(f, columns)
@@ -2,24 +2,33 @@
 
 class Node:
 
-    def __init__(self, key):
+    def __init__(self, key, value=None):
 
         self.key = key
+        self.value = value
+        self.size = 1
         self.left = None
         self.right = None
         self.parent = None
 
+def _size(node):
+
+    return node.size if node else 0
+
 class SplayTree:
 
     def __init__(self):
 
         self.root = None
+        self.stats = None
 
     def rotate_left(self, x):
 
         y = x.right
         if y is None:
             return
+        if self.stats is not None:
+            self.stats.rotations += 1
 
         x.right = y.left
         if y.left:
@@ -35,12 +44,16 @@ class SplayTree:
 
         y.left = x
         x.parent = y
+        y.size = x.size
+        x.size = _size(x.left) + _size(x.right) + 1
 
     def rotate_right(self, x):
 
         y = x.left
         if y is None:
             return
+        if self.stats is not None:
+            self.stats.rotations += 1
 
         x.left = y.right
         if y.right:
@@ -56,6 +69,8 @@ class SplayTree:
 
         y.right = x
         x.parent = y
+        y.size = x.size
+        x.size = _size(x.left) + _size(x.right) + 1
 
     def splay(self, x):
 
@@ -85,13 +100,22 @@ class SplayTree:
             x = x.left
         return x
 
-    def insert(self, key):
+    def subtree_maximum(self, x):
+
+        while x.right:
+            x = x.right
+        return x
+
+    def insert(self, key, value=None):
 
+        stats = self.stats
         node = self.root
         parent = None
 
         while node:
             parent = node
+            if stats is not None:
+                stats.visit(1 if key < node.key else 2)
             if key < node.key:
                 node = node.left
             elif key > node.key:
@@ -100,8 +124,10 @@ class SplayTree:
                 self.splay(node)
                 return
 
-        new_node = Node(key)
+        new_node = Node(key, value)
         new_node.parent = parent
+        if stats is not None and parent is not None:
+            stats.comparisons += 1
 
         if parent is None:
             self.root = new_node
@@ -110,12 +136,33 @@ class SplayTree:
         else:
             parent.right = new_node
 
+        while parent:
+            parent.size += 1
+            parent = parent.parent
+
         self.splay(new_node)
 
+    def bulk_load(self, items):
+
+        def _build(lo, hi, parent):
+            if lo >= hi:
+                return None
+            mid = (lo + hi) // 2
+            node = Node(*items[mid])
+            node.parent = parent
+            node.size = hi - lo
+            node.left = _build(lo, mid, node)
+            node.right = _build(mid + 1, hi, node)
+            return node
+        self.root = _build(0, len(items), None)
+
     def find(self, key):
 
+        stats = self.stats
         node = self.root
         while node:
+            if stats is not None:
+                stats.visit(1 if key < node.key else 2)
             if key < node.key:
                 node = node.left
             elif key > node.key:
@@ -131,6 +178,49 @@ class SplayTree:
             self.splay(node)
         return node
 
+    def get(self, key):
+
+        node = self.search(key)
+        return node.value if node else None
+
+    def put(self, key, value):
+
+        node = self.search(key)
+        if node:
+            node.value = value
+        else:
+            self.insert(key, value)
+
+    def __len__(self):
+
+        return _size(self.root)
+
+    def rank(self, key):
+
+        count = 0
+        node = self.root
+        while node:
+            if key <= node.key:
+                node = node.left
+            else:
+                count += _size(node.left) + 1
+                node = node.right
+        return count
+
+    def select(self, i):
+
+        if not 0 <= i < len(self):
+            raise IndexError("select index out of range")
+        node = self.root
+        while True:
+            if i < _size(node.left):
+                node = node.left
+            elif i == _size(node.left):
+                return node.key
+            else:
+                i -= _size(node.left) + 1
+                node = node.right
+
     def delete(self, key):
 
         node = self.find(key)
@@ -152,11 +242,12 @@ class SplayTree:
             right_subtree = None
 
         if left_subtree:
-            max_node = self.subtree_minimum(left_subtree)
+            max_node = self.subtree_maximum(left_subtree)
             self.splay(max_node)
             max_node.right = right_subtree
             if right_subtree:
                 right_subtree.parent = max_node
+            max_node.size = _size(max_node.left) + _size(right_subtree) + 1
             self.root = max_node
         else:
             self.root = right_subtree
@@ -176,3 +267,39 @@ class SplayTree:
         res.append(node.key)
         self.preorder(node.left, res)
         self.preorder(node.right, res)
+
+    def range(self, lo=None, hi=None, reverse=False):
+
+        for key, _ in self.range_items(lo, hi, reverse):
+            yield key
+
+    def range_items(self, lo=None, hi=None, reverse=False):
+
+        stack = []
+        node = self.root
+        while stack or node:
+            while node:
+                if reverse and hi is not None and node.key >= hi:
+                    node = node.left
+                elif not reverse and lo is not None and node.key < lo:
+                    node = node.right
+                else:
+                    stack.append(node)
+                    node = node.right if reverse else node.left
+            if not stack:
+                return
+            node = stack.pop()
+            if reverse and lo is not None and node.key < lo:
+                return
+            if not reverse and hi is not None and node.key >= hi:
+                return
+            yield node.key, node.value
+            node = node.left if reverse else node.right
+
+    def inorder_items(self, node, res):
+
+        if not node:
+            return None
+        self.inorder_items(node.left, res)
+        res.append((node.key, node.value))
+        self.inorder_items(node.right, res)
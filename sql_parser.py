@@ -0,0 +1,655 @@
+""" SQL tokenizer, parser and predicate compiler """
+
+import operator
+import re
+from aggregates import AGGREGATE_FUNCTIONS, aggregate_label
+
+OPERATORS = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<>': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+SARGABLE_OPERATORS = ('=', '<', '<=', '>', '>=')
+ORDERING_OPERATORS = ('<', '<=', '>', '>=')
+PYTHON_OPERATORS = {'=': '==', '!=': '!=', '<>': '!=', '<': '<', '<=': '<=', '>': '>', '>=': '>='}
+
+KEYWORDS = {
+    "SELECT", "FROM", "WHERE", "LIMIT", "OFFSET", "INSERT", "INTO", "VALUES", "UPDATE", "SET",
+    "DELETE", "AND", "OR", "NOT", "BETWEEN", "IN", "NULL", "TRUE", "FALSE", "GROUP", "BY",
+}
+
+_TOKEN_RE = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<string>'(?:[^']|'')*'|"(?:[^"]|"")*")
+  | (?P<number>(?:\d+\.\d*|\.\d+|\d+)(?:[eE][-+]?\d+)?)
+  | (?P<op><=|>=|!=|<>|=|<|>)
+  | (?P<punct>[(),*;?+-])
+  | (?P<name>[^\W\d][\w.#]*)
+""", re.VERBOSE)
+
+
+class Token:
+
+    __slots__ = ('kind', 'value', 'pos')
+
+    def __init__(self, kind, value, pos):
+
+        self.kind = kind
+        self.value = value
+        self.pos = pos
+
+    def __repr__(self):
+
+        return f"Token({self.kind}, {self.value!r})"
+
+
+def tokenize(text):
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        if not match:
+            raise ValueError(f"Unexpected character {text[pos]!r} at position {pos}")
+        kind = match.lastgroup
+        value = match.group()
+        if kind == 'string':
+            quote = value[0]
+            tokens.append(Token('string', value[1:-1].replace(quote * 2, quote), pos))
+        elif kind == 'number':
+            tokens.append(Token('number', float(value) if any(c in value for c in '.eE') else int(value), pos))
+        elif kind == 'name' and value.upper() in KEYWORDS:
+            tokens.append(Token('keyword', value.upper(), pos))
+        elif kind != 'space':
+            tokens.append(Token(kind, value, pos))
+        pos = match.end()
+    tokens.append(Token('end', None, pos))
+    return tokens
+
+
+def sql_literal(value):
+    if isinstance(value, Param):
+        return "?"
+    if value is None:
+        return "NULL"
+    if value is True or value is False:
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return repr(value)
+
+
+class Param:
+
+    __slots__ = ('index',)
+
+    def __init__(self, index):
+
+        self.index = index
+
+
+def bind_value(value, params):
+    return params[value.index] if isinstance(value, Param) else value
+
+
+class Comparison:
+
+    def __init__(self, column, op, value):
+
+        self.column = column
+        self.op = op
+        self.value = value
+
+    def sql(self):
+
+        return f"{self.column} {self.op} {sql_literal(self.value)}"
+
+    def bind(self, params):
+
+        return Comparison(self.column, self.op, bind_value(self.value, params))
+
+    def columns(self):
+
+        return [self.column]
+
+    def emit(self, consts, safe):
+
+        value = _const(consts, self.value)
+        if safe and self.op in ORDERING_OPERATORS:
+            return f"_safe(_op_{_OP_NAMES[self.op]}, rec.get({self.column!r}), {value})"
+        return f"(rec.get({self.column!r}) {PYTHON_OPERATORS[self.op]} {value})"
+
+
+class Between:
+
+    def __init__(self, column, lo, hi, negated=False):
+
+        self.column = column
+        self.lo = lo
+        self.hi = hi
+        self.negated = negated
+
+    def sql(self):
+
+        keyword = "NOT BETWEEN" if self.negated else "BETWEEN"
+        return f"{self.column} {keyword} {sql_literal(self.lo)} AND {sql_literal(self.hi)}"
+
+    def bind(self, params):
+
+        return Between(self.column, bind_value(self.lo, params), bind_value(self.hi, params), self.negated)
+
+    def columns(self):
+
+        return [self.column]
+
+    def emit(self, consts, safe):
+
+        lo, hi = _const(consts, self.lo), _const(consts, self.hi)
+        if safe:
+            return f"_between(rec.get({self.column!r}), {lo}, {hi}, {self.negated})"
+        test = f"({lo} <= rec.get({self.column!r}) <= {hi})"
+        return f"(not {test})" if self.negated else test
+
+
+class In:
+
+    def __init__(self, column, values, negated=False):
+
+        self.column = column
+        self.values = values
+        self.negated = negated
+
+    def sql(self):
+
+        keyword = "NOT IN" if self.negated else "IN"
+        return f"{self.column} {keyword} ({', '.join(sql_literal(v) for v in self.values)})"
+
+    def bind(self, params):
+
+        return In(self.column, [bind_value(v, params) for v in self.values], self.negated)
+
+    def columns(self):
+
+        return [self.column]
+
+    def emit(self, consts, safe):
+
+        if any(isinstance(v, Param) for v in self.values):
+            values = "(" + "".join(_const(consts, v) + ", " for v in self.values) + ")"
+        else:
+            try:
+                values = _const(consts, frozenset(self.values))
+            except TypeError:
+                values = _const(consts, list(self.values))
+        if safe:
+            return f"_in(rec.get({self.column!r}), {values}, {self.negated})"
+        test = f"(rec.get({self.column!r}) in {values})"
+        return f"(not {test})" if self.negated else test
+
+
+class And:
+
+    def __init__(self, items):
+
+        self.items = items
+
+    def sql(self):
+
+        return " AND ".join(_wrap(item, Or) for item in self.items)
+
+    def bind(self, params):
+
+        return And([item.bind(params) for item in self.items])
+
+    def columns(self):
+
+        return [col for item in self.items for col in item.columns()]
+
+    def emit(self, consts, safe):
+
+        return "(" + " and ".join(item.emit(consts, safe) for item in self.items) + ")"
+
+
+class Or:
+
+    def __init__(self, items):
+
+        self.items = items
+
+    def sql(self):
+
+        return " OR ".join(item.sql() for item in self.items)
+
+    def bind(self, params):
+
+        return Or([item.bind(params) for item in self.items])
+
+    def columns(self):
+
+        return [col for item in self.items for col in item.columns()]
+
+    def emit(self, consts, safe):
+
+        return "(" + " or ".join(item.emit(consts, True) for item in self.items) + ")"
+
+
+class Not:
+
+    def __init__(self, item):
+
+        self.item = item
+
+    def sql(self):
+
+        return f"NOT {_wrap(self.item, (And, Or))}"
+
+    def bind(self, params):
+
+        return Not(self.item.bind(params))
+
+    def columns(self):
+
+        return self.item.columns()
+
+    def emit(self, consts, safe):
+
+        return f"(not {self.item.emit(consts, True)})"
+
+
+def _wrap(node, kinds):
+    return f"({node.sql()})" if isinstance(node, kinds) else node.sql()
+
+
+_OP_NAMES = {'<': 'lt', '<=': 'le', '>': 'gt', '>=': 'ge'}
+
+def _const(consts, value):
+    if isinstance(value, Param):
+        return f"_p[{value.index}]"
+    consts.append(value)
+    return f"_k{len(consts) - 1}"
+
+def _safe(compare, value, other):
+    try:
+        return compare(value, other)
+    except TypeError:
+        return False
+
+def _between(value, lo, hi, negated):
+    try:
+        return (lo <= value <= hi) != negated
+    except TypeError:
+        return False
+
+def _in(value, values, negated):
+    try:
+        return (value in values) != negated
+    except TypeError:
+        return False
+
+_HELPERS = {'_safe': _safe, '_between': _between, '_in': _in,
+            **{f"_op_{name}": OPERATORS[op] for op, name in _OP_NAMES.items()}}
+
+def compile_template(expr):
+    consts = []
+    body = expr.emit(consts, False)
+    source = (f"def bind(_p):\n"
+              f"    def test(rec):\n"
+              f"        try:\n"
+              f"            return {body}\n"
+              f"        except TypeError:\n"
+              f"            return False\n"
+              f"    return test\n")
+    namespace = dict(_HELPERS)
+    namespace.update((f"_k{i}", value) for i, value in enumerate(consts))
+    exec(compile(source, "<where>", "exec"), namespace)
+    return namespace['bind']
+
+def compile_expression(expr):
+    return compile_template(expr)(())
+
+
+class Condition:
+
+    def __init__(self, expr=None, test=None):
+
+        self.expr = expr
+        self.conjuncts = []
+        self.exact = True
+        for item in expr.items if isinstance(expr, And) else [expr] if expr is not None else []:
+            if isinstance(item, Comparison) and item.op in SARGABLE_OPERATORS:
+                self.conjuncts.append((item.column, item.op, item.value))
+            elif isinstance(item, Between) and not item.negated:
+                self.conjuncts.append((item.column, '>=', item.lo))
+                self.conjuncts.append((item.column, '<=', item.hi))
+            elif isinstance(item, In) and not item.negated and len(item.values) == 1:
+                self.conjuncts.append((item.column, '=', item.values[0]))
+            else:
+                self.exact = False
+        self.columns = list(dict.fromkeys(expr.columns())) if expr is not None else []
+        if test is None:
+            test = compile_expression(expr) if expr is not None else (lambda rec: True)
+        self.test = test
+
+    @classmethod
+    def from_predicates(cls, predicates):
+
+        items = [Comparison(col, op, value) for col, op, value in predicates]
+        if not items:
+            return cls()
+        return cls(items[0] if len(items) == 1 else And(items))
+
+    def __iter__(self):
+
+        return iter(self.conjuncts)
+
+    def __bool__(self):
+
+        return self.expr is not None
+
+    def __str__(self):
+
+        return self.expr.sql() if self.expr is not None else ""
+
+    def __repr__(self):
+
+        return f"Condition({str(self)!r})"
+
+
+class Aggregate:
+
+    def __init__(self, func, column=None):
+
+        self.func = func
+        self.column = column
+
+    def __str__(self):
+
+        return aggregate_label(self.func, self.column)
+
+
+class Select:
+
+    def __init__(self, table, columns=None, where=None, limit=None, offset=0, group_by=None):
+
+        self.table = table
+        self.columns = columns
+        self.where = where
+        self.limit = limit
+        self.offset = offset
+        self.group_by = group_by
+        self.aggregates = [column for column in columns or () if isinstance(column, Aggregate)]
+
+
+class Insert:
+
+    def __init__(self, table, rows):
+
+        self.table = table
+        self.rows = rows
+
+
+class Update:
+
+    def __init__(self, table, assignments, where=None):
+
+        self.table = table
+        self.assignments = assignments
+        self.where = where
+
+
+class Delete:
+
+    def __init__(self, table, where=None):
+
+        self.table = table
+        self.where = where
+
+
+class Parser:
+
+    def __init__(self, text):
+
+        self.text = text
+        self.tokens = tokenize(text)
+        self.pos = 0
+        self.param_count = 0
+
+    def peek(self, offset=0):
+
+        return self.tokens[min(self.pos + offset, len(self.tokens) - 1)]
+
+    def advance(self):
+
+        token = self.tokens[self.pos]
+        if token.kind != 'end':
+            self.pos += 1
+        return token
+
+    def accept(self, kind, value=None):
+
+        token = self.peek()
+        if token.kind == kind and (value is None or token.value == value):
+            return self.advance()
+        return None
+
+    def expect(self, kind, value=None):
+
+        token = self.accept(kind, value)
+        if token is None:
+            found = self.peek()
+            wanted = value or kind
+            got = "end of statement" if found.kind == 'end' else repr(found.value)
+            raise ValueError(f"Expected {wanted} at position {found.pos}, got {got}")
+        return token
+
+    def name(self):
+
+        token = self.peek()
+        if token.kind == 'name':
+            return self.advance().value
+        return self.expect('name').value
+
+    def finish(self):
+
+        self.accept('punct', ';')
+        self.expect('end')
+
+    def parse_statement(self):
+
+        token = self.peek()
+        if token.kind == 'keyword' and token.value == "SELECT":
+            statement = self.parse_select()
+        elif token.kind == 'keyword' and token.value == "INSERT":
+            statement = self.parse_insert()
+        elif token.kind == 'keyword' and token.value == "UPDATE":
+            statement = self.parse_update()
+        elif token.kind == 'keyword' and token.value == "DELETE":
+            statement = self.parse_delete()
+        else:
+            raise ValueError(f"Unsupported statement: {token.value}")
+        self.finish()
+        return statement
+
+    def parse_select(self):
+
+        self.expect('keyword', "SELECT")
+        columns = None
+        if not self.accept('punct', '*'):
+            columns = [self.parse_select_item()]
+            while self.accept('punct', ','):
+                columns.append(self.parse_select_item())
+        self.expect('keyword', "FROM")
+        table = self.name()
+        where = self.parse_where()
+        group_by = None
+        if self.accept('keyword', "GROUP"):
+            self.expect('keyword', "BY")
+            group_by = [self.name()]
+            while self.accept('punct', ','):
+                group_by.append(self.name())
+        limit = None
+        offset = 0
+        while self.peek().kind == 'keyword' and self.peek().value in ("LIMIT", "OFFSET"):
+            keyword = self.advance().value
+            value = self.expect('number').value
+            if not isinstance(value, int) or value < 0:
+                raise ValueError(f"{keyword} must be a non-negative integer")
+            if keyword == "LIMIT":
+                limit = value
+            else:
+                offset = value
+        statement = Select(table, columns, where, limit, offset, group_by)
+        if statement.aggregates or group_by:
+            if columns is None:
+                raise ValueError("SELECT * cannot be used with GROUP BY")
+            for column in columns:
+                if not isinstance(column, Aggregate) and column not in (group_by or ()):
+                    raise ValueError(f"Column '{column}' must appear in GROUP BY or be aggregated")
+        return statement
+
+    def parse_select_item(self):
+
+        token = self.peek()
+        if token.kind == 'name' and token.value.upper() in AGGREGATE_FUNCTIONS \
+                and self.peek(1).value == '(':
+            func = self.advance().value.upper()
+            self.expect('punct', '(')
+            column = None if func == "COUNT" and self.accept('punct', '*') else self.name()
+            self.expect('punct', ')')
+            return Aggregate(func, column)
+        return self.name()
+
+    def parse_insert(self):
+
+        self.expect('keyword', "INSERT")
+        self.expect('keyword', "INTO")
+        table = self.name()
+        self.expect('keyword', "VALUES")
+        rows = [self.parse_tuple()]
+        while self.accept('punct', ','):
+            rows.append(self.parse_tuple())
+        return Insert(table, rows)
+
+    def parse_tuple(self):
+
+        self.expect('punct', '(')
+        values = [self.parse_value()]
+        while self.accept('punct', ','):
+            values.append(self.parse_value())
+        self.expect('punct', ')')
+        return values
+
+    def parse_update(self):
+
+        self.expect('keyword', "UPDATE")
+        table = self.name()
+        self.expect('keyword', "SET")
+        assignments = {}
+        while True:
+            column = self.name()
+            self.expect('op', '=')
+            assignments[column] = self.parse_value()
+            if not self.accept('punct', ','):
+                break
+        return Update(table, assignments, self.parse_where())
+
+    def parse_delete(self):
+
+        self.expect('keyword', "DELETE")
+        self.expect('keyword', "FROM")
+        table = self.name()
+        return Delete(table, self.parse_where())
+
+    def parse_where(self):
+
+        if self.accept('keyword', "WHERE"):
+            return self.parse_expression()
+        return None
+
+    def parse_expression(self):
+
+        items = [self.parse_and()]
+        while self.accept('keyword', "OR"):
+            items.append(self.parse_and())
+        return items[0] if len(items) == 1 else Or(items)
+
+    def parse_and(self):
+
+        items = [self.parse_not()]
+        while self.accept('keyword', "AND"):
+            items.append(self.parse_not())
+        flat = []
+        for item in items:
+            flat.extend(item.items if isinstance(item, And) else [item])
+        return flat[0] if len(flat) == 1 else And(flat)
+
+    def parse_not(self):
+
+        if self.accept('keyword', "NOT"):
+            return Not(self.parse_not())
+        if self.accept('punct', '('):
+            expr = self.parse_expression()
+            self.expect('punct', ')')
+            return expr
+        return self.parse_predicate()
+
+    def parse_predicate(self):
+
+        column = self.name()
+        negated = bool(self.accept('keyword', "NOT"))
+        if self.accept('keyword', "BETWEEN"):
+            lo = self.parse_value()
+            self.expect('keyword', "AND")
+            return Between(column, lo, self.parse_value(), negated)
+        if self.accept('keyword', "IN"):
+            return In(column, self.parse_tuple(), negated)
+        if negated:
+            raise ValueError(f"Expected BETWEEN or IN after NOT at position {self.peek().pos}")
+        op = self.expect('op').value
+        return Comparison(column, op, self.parse_value())
+
+    def parse_value(self):
+
+        token = self.advance()
+        if token.kind in ('number', 'string'):
+            return token.value
+        if token.kind == 'punct' and token.value in '+-':
+            number = self.expect('number').value
+            return -number if token.value == '-' else number
+        if token.kind == 'punct' and token.value == '?':
+            self.param_count += 1
+            return Param(self.param_count - 1)
+        if token.kind == 'keyword' and token.value in ("NULL", "TRUE", "FALSE"):
+            return {"NULL": None, "TRUE": True, "FALSE": False}[token.value]
+        if token.kind == 'name':
+            return token.value
+        got = "end of statement" if token.kind == 'end' else repr(token.value)
+        raise ValueError(f"Expected a value at position {token.pos}, got {got}")
+
+    def parse_values(self):
+
+        if self.peek().kind == 'end':
+            return []
+        values = self.parse_tuple() if self.peek().value == '(' else [self.parse_value()]
+        self.expect('end')
+        return values
+
+
+def parse_statement(text):
+    parser = Parser(text)
+    statement = parser.parse_statement()
+    statement.param_count = parser.param_count
+    return statement
+
+
+def parse_where(text):
+    parser = Parser(text)
+    expr = parser.parse_expression() if parser.peek().kind != 'end' else None
+    parser.finish()
+    if parser.param_count:
+        raise ValueError("Placeholders are only allowed in prepared statements")
+    return Condition(expr)
@@ -0,0 +1,78 @@
+""" Concurrent stress benchmark """
+
+import argparse
+import random
+import shutil
+import tempfile
+import threading
+import time
+from data_manager import DataManager
+
+def worker(dm, db_name, tables, rows, ops, read_ratio, seed, errors):
+    session = dm.session(db_name)
+    rng = random.Random(seed)
+    try:
+        for _ in range(ops):
+            table = rng.choice(tables)
+            key = rng.randrange(rows)
+            roll = rng.random()
+            if roll < read_ratio / 2:
+                list(session.select(table, {'id': key}))
+            elif roll < read_ratio:
+                session.count(table, f"id >= {key} AND id < {key + 100}")
+            else:
+                session.update(table, {'score': rng.random()}, {'id': key})
+    except Exception as e:
+        errors.append(e)
+
+def run(dm, db_name, tables, rows, threads, ops, read_ratio):
+    errors = []
+    workers = [threading.Thread(target=worker,
+                                args=(dm, db_name, tables, rows, ops, read_ratio, seed, errors))
+               for seed in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        raise errors[0]
+    return threads * ops / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="TreeSQL concurrent stress benchmark")
+    parser.add_argument("--tree", default="avl", help="Tree type for the benchmark tables")
+    parser.add_argument("--tables", type=int, default=4, help="Number of tables")
+    parser.add_argument("--rows", type=int, default=20000, help="Rows per table")
+    parser.add_argument("--ops", type=int, default=5000, help="Operations per thread")
+    parser.add_argument("--threads", default="1,2,4,8", help="Comma-separated thread counts")
+    parser.add_argument("--read-ratio", type=float, default=0.95, help="Fraction of reads in the mix")
+    args = parser.parse_args()
+
+    db_dir = tempfile.mkdtemp(prefix="treesql-bench-")
+    try:
+        dm = DataManager(db_dir, wal_fsync=False, flush_every=10 ** 9)
+        dm.create_database("bench")
+        dm.use_database("bench")
+        tables = [f"t{i}" for i in range(args.tables)]
+        for table in tables:
+            dm.create_table(table, ["id", "name", "score"], args.tree)
+            dm.insert_many(table, [[i, f"name{i}", random.random()] for i in range(args.rows)])
+
+        print(f"tree={args.tree} tables={args.tables} rows={args.rows} read_ratio={args.read_ratio}")
+        print("note: the GIL serializes tree reads, so extra threads measure lock overhead "
+              "and fairness, not parallel speedup")
+        thread_counts = [int(n) for n in args.threads.split(",")]
+        baseline = run(dm, "bench", tables, args.rows, 1, args.ops, args.read_ratio)
+        print(f"{'threads':>8} {'ops/s':>12} {'vs 1 thr':>8}")
+        for threads in thread_counts:
+            throughput = baseline if threads == 1 else run(dm, "bench", tables, args.rows, threads,
+                                                           args.ops, args.read_ratio)
+            print(f"{threads:>8} {throughput:>12.0f} {throughput / baseline:>7.2f}x")
+        dm.close()
+    finally:
+        shutil.rmtree(db_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
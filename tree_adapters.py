@@ -5,7 +5,10 @@ from AVL_Tree import AVLTree
 from red_black_tree import RedBlackTree
 from splay_tree import SplayTree
 from b_tree import BTree
+from disk_b_tree import DiskBTree
 from two_three_tree import TwoThreeTree
+from persistent_tree import PersistentAVLTree, PersistentRedBlackTree
+from tree_stats import binary_shape, multiway_shape
 
 class AVLTreeAdapter(SelfBalancingTree):
 
@@ -13,9 +16,9 @@ class AVLTreeAdapter(SelfBalancingTree):
 
         self.tree = AVLTree()
 
-    def insert(self, key):
+    def insert(self, key, value=None):
 
-        self.tree.insert(key)
+        self.tree.insert(key, value)
 
     def delete(self, key):
 
@@ -25,6 +28,38 @@ class AVLTreeAdapter(SelfBalancingTree):
 
         return self.tree.search(key)
 
+    def get(self, key):
+
+        return self.tree.get(key)
+
+    def put(self, key, value):
+
+        self.tree.put(key, value)
+
+    def items(self):
+
+        return list(self.tree.in_order_items())
+
+    def bulk_load(self, items):
+
+        self.tree.bulk_load(list(items))
+
+    def range_items(self, lo=None, hi=None, reverse=False):
+
+        return self.tree.range_items(lo, hi, reverse)
+
+    def rank(self, key):
+
+        return self.tree.rank(key)
+
+    def select(self, i):
+
+        return self.tree.select(i)
+
+    def __len__(self):
+
+        return len(self.tree)
+
     def inorder_traversal(self):
 
         return list(self.tree.in_order())
@@ -37,15 +72,19 @@ class AVLTreeAdapter(SelfBalancingTree):
 
         return self.tree.root is None
 
+    def shape(self):
+
+        return (self.tree.root.height if self.tree.root else 0), len(self.tree)
+
 class RedBlackTreeAdapter(SelfBalancingTree):
 
     def __init__(self):
 
         self.tree = RedBlackTree()
 
-    def insert(self, key):
+    def insert(self, key, value=None):
 
-        self.tree.insert(key)
+        self.tree.insert(key, value)
 
     def delete(self, key):
 
@@ -55,6 +94,38 @@ class RedBlackTreeAdapter(SelfBalancingTree):
 
         return self.tree.search(key) is not None
 
+    def get(self, key):
+
+        return self.tree.get(key)
+
+    def put(self, key, value):
+
+        self.tree.put(key, value)
+
+    def items(self):
+
+        return self.tree.inorder_items()
+
+    def bulk_load(self, items):
+
+        self.tree.bulk_load(list(items))
+
+    def range_items(self, lo=None, hi=None, reverse=False):
+
+        return self.tree.range_items(lo, hi, reverse)
+
+    def rank(self, key):
+
+        return self.tree.rank(key)
+
+    def select(self, i):
+
+        return self.tree.select(i)
+
+    def __len__(self):
+
+        return len(self.tree)
+
     def inorder_traversal(self):
 
         return self.tree.inorder_walk()
@@ -67,15 +138,33 @@ class RedBlackTreeAdapter(SelfBalancingTree):
 
         return self.tree.root == self.tree.NIL
 
+    def min_item(self):
+
+        if self.is_empty():
+            return None
+        node = self.tree.minimum(self.tree.root)
+        return node.key, node.value
+
+    def max_item(self):
+
+        if self.is_empty():
+            return None
+        node = self.tree.maximum(self.tree.root)
+        return node.key, node.value
+
+    def shape(self):
+
+        return binary_shape(self.tree.root, self.tree.NIL)
+
 class SplayTreeAdapter(SelfBalancingTree):
 
     def __init__(self):
 
         self.tree = SplayTree()
 
-    def insert(self, key):
+    def insert(self, key, value=None):
 
-        self.tree.insert(key)
+        self.tree.insert(key, value)
 
     def delete(self, key):
 
@@ -85,6 +174,38 @@ class SplayTreeAdapter(SelfBalancingTree):
 
         return self.tree.search(key) is not None
 
+    def get(self, key):
+
+        return self.tree.get(key)
+
+    def put(self, key, value):
+
+        self.tree.put(key, value)
+
+    def items(self):
+
+        return list(self.tree.range_items())
+
+    def bulk_load(self, items):
+
+        self.tree.bulk_load(list(items))
+
+    def range_items(self, lo=None, hi=None, reverse=False):
+
+        return self.tree.range_items(lo, hi, reverse)
+
+    def rank(self, key):
+
+        return self.tree.rank(key)
+
+    def select(self, i):
+
+        return self.tree.select(i)
+
+    def __len__(self):
+
+        return len(self.tree)
+
     def inorder_traversal(self):
 
         result = []
@@ -101,15 +222,33 @@ class SplayTreeAdapter(SelfBalancingTree):
 
         return self.tree.root is None
 
+    def min_item(self):
+
+        if self.tree.root is None:
+            return None
+        node = self.tree.subtree_minimum(self.tree.root)
+        return node.key, node.value
+
+    def max_item(self):
+
+        if self.tree.root is None:
+            return None
+        node = self.tree.subtree_maximum(self.tree.root)
+        return node.key, node.value
+
+    def shape(self):
+
+        return binary_shape(self.tree.root)
+
 class BTreeAdapter(SelfBalancingTree):
 
     def __init__(self, degree=3):
 
         self.tree = BTree(degree)
 
-    def insert(self, key):
+    def insert(self, key, value=None):
 
-        self.tree.insert(key)
+        self.tree.insert(key, value)
 
     def delete(self, key):
 
@@ -119,6 +258,38 @@ class BTreeAdapter(SelfBalancingTree):
 
         return self.tree.search(key) is not None
 
+    def get(self, key):
+
+        return self.tree.get(key)
+
+    def put(self, key, value):
+
+        self.tree.put(key, value)
+
+    def items(self):
+
+        return self.tree.inorder_items()
+
+    def bulk_load(self, items):
+
+        self.tree.bulk_load(list(items))
+
+    def range_items(self, lo=None, hi=None, reverse=False):
+
+        return self.tree.range_items(lo, hi, reverse)
+
+    def rank(self, key):
+
+        return self.tree.rank(key)
+
+    def select(self, i):
+
+        return self.tree.select(i)
+
+    def __len__(self):
+
+        return len(self.tree)
+
     def inorder_traversal(self):
 
         return self.tree.inorder_traversal()
@@ -131,15 +302,19 @@ class BTreeAdapter(SelfBalancingTree):
 
         return self.tree.root is None or len(self.tree.root.keys) == 0
 
+    def shape(self):
+
+        return (0, 0) if self.is_empty() else multiway_shape(self.tree.root)
+
 class TwoThreeTreeAdapter(SelfBalancingTree):
 
     def __init__(self):
 
         self.tree = TwoThreeTree()
 
-    def insert(self, key):
+    def insert(self, key, value=None):
 
-        self.tree.insert(key)
+        self.tree.insert(key, value)
 
     def delete(self, key):
 
@@ -149,6 +324,38 @@ class TwoThreeTreeAdapter(SelfBalancingTree):
 
         return self.tree.search(key)
 
+    def get(self, key):
+
+        return self.tree.get(key)
+
+    def put(self, key, value):
+
+        self.tree.put(key, value)
+
+    def items(self):
+
+        return self.tree.inorder_items()
+
+    def bulk_load(self, items):
+
+        self.tree.bulk_load(list(items))
+
+    def range_items(self, lo=None, hi=None, reverse=False):
+
+        return self.tree.range_items(lo, hi, reverse)
+
+    def rank(self, key):
+
+        return self.tree.rank(key)
+
+    def select(self, i):
+
+        return self.tree.select(i)
+
+    def __len__(self):
+
+        return len(self.tree)
+
     def inorder_traversal(self):
 
         return self.tree.inorder()
@@ -160,3 +367,166 @@ class TwoThreeTreeAdapter(SelfBalancingTree):
     def is_empty(self):
 
         return self.tree.root is None or not self.tree.root.keys
+
+    def shape(self):
+
+        return (0, 0) if self.is_empty() else multiway_shape(self.tree.root)
+
+class DiskBTreeAdapter(SelfBalancingTree):
+    disk_resident = True
+
+    def __init__(self, path, page_size=4096, degree=None, pool=None):
+
+        self.tree = DiskBTree(path, page_size, degree, pool)
+
+    def insert(self, key, value=None):
+
+        self.tree.insert(key, value)
+
+    def delete(self, key):
+
+        self.tree.delete(key)
+
+    def search(self, key):
+
+        return self.tree.search(key) is not None
+
+    def get(self, key):
+
+        return self.tree.get(key)
+
+    def put(self, key, value):
+
+        self.tree.put(key, value)
+
+    def items(self):
+
+        return self.tree.inorder_items()
+
+    def bulk_load(self, items):
+
+        self.tree.bulk_load(list(items))
+
+    def range_items(self, lo=None, hi=None, reverse=False):
+
+        return self.tree.range_items(lo, hi, reverse)
+
+    def rank(self, key):
+
+        return self.tree.rank(key)
+
+    def select(self, i):
+
+        return self.tree.select(i)
+
+    def __len__(self):
+
+        return len(self.tree)
+
+    def inorder_traversal(self):
+
+        return self.tree.inorder_traversal()
+
+    def preorder_traversal(self):
+
+        return self.tree.preorder_traversal()
+
+    def is_empty(self):
+
+        return self.tree.count == 0
+
+    def shape(self):
+
+        if self.is_empty():
+            return 0, 0
+        tree = self.tree
+        return multiway_shape(tree._read_node(tree.root),
+                              lambda node: [tree._read_node(page) for page in node.children])
+
+    def flush(self):
+
+        self.tree.flush()
+
+    def close(self):
+
+        self.tree.close()
+
+class PersistentTreeAdapter(SelfBalancingTree):
+    persistent = True
+    tree_class = None
+
+    def __init__(self, tree=None):
+
+        self.tree = tree if tree is not None else self.tree_class()
+
+    def insert(self, key, value=None):
+
+        self.tree = self.tree.insert(key, value)
+
+    def delete(self, key):
+
+        self.tree = self.tree.delete(key)
+
+    def search(self, key):
+
+        return self.tree.search(key)
+
+    def get(self, key):
+
+        return self.tree.get(key)
+
+    def put(self, key, value):
+
+        self.tree = self.tree.put(key, value)
+
+    def items(self):
+
+        return list(self.tree.range_items())
+
+    def bulk_load(self, items):
+
+        stats = self.tree.stats
+        self.tree = self.tree_class.from_sorted(list(items))
+        self.tree.stats = stats
+
+    def range_items(self, lo=None, hi=None, reverse=False):
+
+        return self.tree.range_items(lo, hi, reverse)
+
+    def rank(self, key):
+
+        return self.tree.rank(key)
+
+    def select(self, i):
+
+        return self.tree.select(i)
+
+    def __len__(self):
+
+        return len(self.tree)
+
+    def inorder_traversal(self):
+
+        return list(self.tree.in_order())
+
+    def preorder_traversal(self):
+
+        return list(self.tree.pre_order())
+
+    def is_empty(self):
+
+        return self.tree.root is None
+
+    def snapshot(self):
+
+        return type(self)(self.tree_class(self.tree.root))
+
+    def shape(self):
+
+        return self.tree.height(), len(self.tree)
+
+class PersistentAVLTreeAdapter(PersistentTreeAdapter):
+    tree_class = PersistentAVLTree
+
+class PersistentRedBlackTreeAdapter(PersistentTreeAdapter):
+    tree_class = PersistentRedBlackTree
@@ -0,0 +1,135 @@
+""" TreeSQL client """
+
+import asyncio
+import json
+import socket
+
+class TreeSQLError(Exception):
+    pass
+
+def _decode_response(line):
+    if not line:
+        raise ConnectionError("Server closed the connection")
+    response = json.loads(line)
+    if not response['ok']:
+        raise TreeSQLError(response['error'])
+    return response
+
+def _result(response, rows):
+    if 'rows' not in response:
+        return response['result']
+    rows.extend(response['rows'])
+    return "\n".join(rows)
+
+def _encode_command(command):
+    if '\n' in command:
+        raise ValueError("Commands must not contain newlines")
+    return (command + '\n').encode('utf-8')
+
+class TreeClient:
+    def __init__(self, host="127.0.0.1", port=5433, unix_path=None, timeout=None):
+        if unix_path:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(unix_path)
+        else:
+            self.sock = socket.create_connection((host, port), timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = self.sock.makefile('rb')
+
+    def execute(self, command):
+        self.sock.sendall(_encode_command(command))
+        return self._read_result()
+
+    def stream(self, command):
+        self.sock.sendall(_encode_command(command))
+        response = {'more': True}
+        try:
+            while response.get('more'):
+                response = _decode_response(self.file.readline())
+                if 'rows' not in response:
+                    if response['result'] is not None:
+                        yield response['result']
+                    return
+                yield from response['rows']
+        finally:
+            while response.get('more'):
+                response = _decode_response(self.file.readline())
+
+    def pipeline(self, commands):
+        commands = list(commands)
+        self.sock.sendall(b''.join(_encode_command(command) for command in commands))
+        results = []
+        for _ in commands:
+            try:
+                results.append(self._read_result())
+            except TreeSQLError as e:
+                results.append(e)
+        return results
+
+    def _read_result(self):
+        rows = []
+        response = _decode_response(self.file.readline())
+        while response.get('more'):
+            rows.extend(response['rows'])
+            response = _decode_response(self.file.readline())
+        return _result(response, rows)
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class AsyncTreeClient:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.pending = asyncio.Queue()
+        self.receiver = asyncio.create_task(self._receive())
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=5433, unix_path=None):
+        if unix_path:
+            reader, writer = await asyncio.open_unix_connection(unix_path, limit=1 << 24)
+        else:
+            reader, writer = await asyncio.open_connection(host, port, limit=1 << 24)
+        return cls(reader, writer)
+
+    async def _receive(self):
+        while True:
+            future = await self.pending.get()
+            try:
+                rows = []
+                response = _decode_response(await self.reader.readline())
+                while response.get('more'):
+                    rows.extend(response['rows'])
+                    response = _decode_response(await self.reader.readline())
+                future.set_result(_result(response, rows))
+            except Exception as e:
+                future.set_exception(e)
+                if isinstance(e, ConnectionError):
+                    break
+
+    def send(self, command):
+        future = asyncio.get_running_loop().create_future()
+        self.writer.write(_encode_command(command))
+        self.pending.put_nowait(future)
+        return future
+
+    async def execute(self, command):
+        future = self.send(command)
+        await self.writer.drain()
+        return await future
+
+    async def close(self):
+        self.receiver.cancel()
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
@@ -5,13 +5,19 @@ from tree_adapters import (
     RedBlackTreeAdapter,
     SplayTreeAdapter,
     BTreeAdapter,
-    TwoThreeTreeAdapter
+    TwoThreeTreeAdapter,
+    DiskBTreeAdapter,
+    PersistentAVLTreeAdapter,
+    PersistentRedBlackTreeAdapter
 )
 
+DISK_TREE_TYPES = ("disk-btree",)
+MUTATING_READ_TREE_TYPES = ("splay",)
+
 class TreeFactory:
 
     @staticmethod
-    def create_tree(tree_type):
+    def create_tree(tree_type, path=None, page_size=4096, degree=None, pool=None):
 
         tree_type = tree_type.lower()
 
@@ -22,7 +28,25 @@ class TreeFactory:
         if tree_type == "splay":
             return SplayTreeAdapter()
         if tree_type == "b-tree":
-            return BTreeAdapter(3)
+            return BTreeAdapter(degree or 3)
         if tree_type == "2-3-tree":
             return TwoThreeTreeAdapter()
+        if tree_type == "persistent-avl":
+            return PersistentAVLTreeAdapter()
+        if tree_type == "persistent-red-black":
+            return PersistentRedBlackTreeAdapter()
+        if tree_type == "disk-btree":
+            if path is None:
+                raise ValueError("disk-btree requires a page file path")
+            return DiskBTreeAdapter(path, page_size, degree, pool)
         raise ValueError(f"Unknown tree type: {tree_type}")
+
+    @staticmethod
+    def is_disk_resident(tree_type):
+
+        return tree_type.lower() in DISK_TREE_TYPES
+
+    @staticmethod
+    def has_mutating_reads(tree_type):
+
+        return tree_type.lower() in MUTATING_READ_TREE_TYPES
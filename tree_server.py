@@ -0,0 +1,153 @@
+""" TreeSQL server """
+
+import argparse
+import asyncio
+import json
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from data_manager import DataManager
+from tree_sql import RowStream, TreeSQL
+
+MAX_PIPELINE = 256
+MAX_LINE = 1 << 20
+WRITE_HIGH_WATER = 1 << 16
+STREAM_CHUNK = 256
+
+def encode_response(result=None, error=None):
+    if error is not None:
+        payload = {'ok': False, 'error': error}
+    else:
+        if result is not None and not isinstance(result, (str, int, float)):
+            result = str(result)
+        payload = {'ok': True, 'result': result}
+    return (json.dumps(payload, ensure_ascii=False) + '\n').encode('utf-8')
+
+def encode_rows(rows, more):
+    payload = {'ok': True, 'rows': rows}
+    if more:
+        payload['more'] = True
+    return (json.dumps(payload, ensure_ascii=False) + '\n').encode('utf-8')
+
+class TreeServer:
+    def __init__(self, data_manager=None, workers=8):
+        self.data_manager = data_manager if data_manager is not None else DataManager()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="treesql")
+        self.server = None
+        self.connections = 0
+        self.statements = 0
+
+    async def start(self, host="127.0.0.1", port=5433, unix_path=None):
+        if unix_path:
+            self.server = await asyncio.start_unix_server(self.handle, unix_path, limit=MAX_LINE)
+        else:
+            self.server = await asyncio.start_server(self.handle, host, port, limit=MAX_LINE)
+        return self.server
+
+    async def handle(self, reader, writer):
+        sql = TreeSQL(self.data_manager.session())
+        queue = asyncio.Queue(MAX_PIPELINE)
+        self.connections += 1
+        executor_task = asyncio.create_task(self._execute_loop(sql, queue, writer))
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (asyncio.LimitOverrunError, ValueError):
+                    await queue.put(ValueError("Statement too long"))
+                    break
+                if not line:
+                    break
+                command = line.decode('utf-8').strip()
+                if command:
+                    await queue.put(command)
+        except ConnectionError:
+            pass
+        finally:
+            await queue.put(None)
+            await executor_task
+            self.connections -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _execute_loop(self, sql, queue, writer):
+        loop = asyncio.get_running_loop()
+        while True:
+            command = await queue.get()
+            if command is None:
+                return
+            response = None
+            if isinstance(command, Exception):
+                response = encode_response(error=str(command))
+            else:
+                try:
+                    result = await loop.run_in_executor(self.executor, sql.parse_command, command)
+                    if not isinstance(result, RowStream):
+                        response = encode_response(result)
+                except Exception as e:
+                    response = encode_response(error=str(e))
+                self.statements += 1
+            try:
+                if response is None:
+                    response = await self._stream_rows(result, writer)
+                writer.write(response)
+                if queue.empty() or writer.transport.get_write_buffer_size() > WRITE_HIGH_WATER:
+                    await writer.drain()
+            except ConnectionError:
+                return
+
+    async def _stream_rows(self, rows, writer):
+        loop = asyncio.get_running_loop()
+        lines = iter(rows)
+        while True:
+            try:
+                chunk = await loop.run_in_executor(self.executor, list, islice(lines, STREAM_CHUNK))
+            except Exception as e:
+                return encode_response(error=str(e))
+            if len(chunk) < STREAM_CHUNK:
+                return encode_rows(chunk, False)
+            writer.write(encode_rows(chunk, True))
+            await writer.drain()
+
+    async def serve_forever(self):
+        async with self.server:
+            await self.server.serve_forever()
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+        self.executor.shutdown(wait=True)
+        self.data_manager.close()
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Мережевий сервер TreeSQL")
+    parser.add_argument("--host", default="127.0.0.1", help="Адреса для прослуховування")
+    parser.add_argument("--port", type=int, default=5433, help="TCP-порт")
+    parser.add_argument("--unix", help="Шлях до Unix-сокета замість TCP")
+    parser.add_argument("--db-dir", default="./db", help="Каталог баз даних")
+    parser.add_argument("--workers", type=int, default=8, help="Кількість потоків для виконання запитів")
+    parser.add_argument("--result-cache", type=int, default=0,
+                        help="Кількість результатів SELECT у кеші (0 — кеш вимкнено)")
+    args = parser.parse_args()
+
+    async def run():
+        server = TreeServer(DataManager(args.db_dir, result_cache_size=args.result_cache), args.workers)
+        await server.start(args.host, args.port, args.unix)
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        print(f"TreeSQL слухає {args.unix or f'{args.host}:{args.port}'}")
+        serving = asyncio.create_task(server.serve_forever())
+        await stop.wait()
+        serving.cancel()
+        server.close()
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
@@ -1,120 +1,414 @@
 """ Tree SQL """
 
 import argparse
+import csv
+import re
 import shlex
+import time
+from collections import OrderedDict
+from itertools import islice
 from data_manager import DataManager
+from sql_parser import Condition, Insert, Parser, bind_value, compile_template, parse_statement
+
+_WHITESPACE_RE = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")|\s+")
+
+class Statement:
+
+    def __init__(self, label, run, param_count=0):
+
+        self.label = label
+        self.run = run
+        self.param_count = param_count
+
+    def execute(self, params=()):
+
+        try:
+            if len(params) != self.param_count:
+                raise ValueError(f"Expected {self.param_count} parameters, got {len(params)}")
+            return self.run(params)
+        except Exception as e:
+            return f"Помилка {self.label}: {e}"
+
+class RowStream:
+
+    def __init__(self, rows):
+
+        self.rows = rows
+
+    def __iter__(self):
+
+        for row in self.rows:
+            yield str(row)
+
+    def __str__(self):
+
+        return "\n".join(self)
 
 class TreeSQL:
 
-    def __init__(self):
+    PREPARABLE = {"select": "SELECT", "insert": "вставки", "update": "UPDATE", "delete": "DELETE"}
 
-        self.data_manager = DataManager()
+    def __init__(self, data_manager=None, statement_cache_size=256):
+
+        self.data_manager = data_manager if data_manager is not None else DataManager()
+        self.statement_cache_size = statement_cache_size
+        self.statements = OrderedDict()
+        self.prepared = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
 
     def parse_command(self, command):
 
-        tokens = shlex.split(command)
-        if not tokens:
+        key = _WHITESPACE_RE.sub(lambda m: m.group(1) or ' ', command).strip()
+        statement = self.statements.get(key)
+        if statement is not None:
+            self.statements.move_to_end(key)
+            self.cache_hits += 1
+            return statement.execute()
+
+        words = command.split(None, 1)
+        if not words:
             return "Пуста команда"
 
-        cmd = tokens[0].lower()
+        cmd = words[0].lower()
+        if cmd in self.PREPARABLE:
+            statement = self.prepare_statement(command)
+            if not isinstance(statement, Statement):
+                return statement
+            self.cache_misses += 1
+            if cmd != "insert" and statement.param_count == 0 and self.statement_cache_size > 0:
+                self.statements[key] = statement
+                if len(self.statements) > self.statement_cache_size:
+                    self.statements.popitem(last=False)
+            return statement.execute()
+
+        if cmd == "explain":
+            return self.explain_command(command)
 
+        tokens = shlex.split(command)
         if cmd == "create":
             if len(tokens) >= 2 and tokens[1].lower() == "database":
                 return self.data_manager.create_database(tokens[2])
             if len(tokens) >= 2 and tokens[1].lower() == "table":
                 return self.create_table_command(tokens[2:])
+            if len(tokens) >= 2 and tokens[1].lower() == "index":
+                return self.create_index_command(tokens[2:])
         if cmd == "use":
             return self.data_manager.use_database(tokens[1])
-        if cmd == "insert":
-            return self.insert_command(tokens)
-        if cmd == "select":
-            return self.select_command(tokens)
-        if cmd == "update":
-            return self.update_command(tokens)
-        if cmd == "delete":
-            return self.delete_command(tokens)
+        if cmd == "load":
+            return self.load_command(tokens)
+        if cmd in ("prepare", "execute", "deallocate"):
+            return self.prepared_command(command, tokens)
+        if cmd in ("begin", "start", "commit", "rollback"):
+            return self.transaction_command(tokens)
         return "Невідома команда"
 
     def create_table_command(self, tokens):
 
         table_name = tokens[0]
         tree_type = "avl"
+        tree_options = {}
+        storage = "row"
 
-        if "using" in [t.lower() for t in tokens]:
-            idx = tokens.index("USING") if "USING" in tokens else tokens.index("using")
+        upper_tokens = [t.upper() for t in tokens]
+        if "USING" in upper_tokens:
+            idx = upper_tokens.index("USING")
             tree_type = tokens[idx + 1]
+        for option in ("PAGE_SIZE", "DEGREE"):
+            if option in upper_tokens:
+                tree_options[option.lower()] = int(tokens[upper_tokens.index(option) + 1])
+        if "STORAGE" in upper_tokens:
+            storage = tokens[upper_tokens.index("STORAGE") + 1]
+        partition_by = self._parse_partitioning(' '.join(tokens))
 
         col_start = tokens.index("(")
         col_end = tokens.index(")")
         columns_str = ' '.join(tokens[col_start + 1: col_end])
-        columns = [col.strip() for col in columns_str.split(",")]
+        columns = []
+        column_types = {}
+        for col in columns_str.split(","):
+            parts = col.split()
+            columns.append(parts[0])
+            if len(parts) > 1:
+                column_types[parts[0]] = parts[1].upper()
+
+        return self.data_manager.create_table(table_name, columns, tree_type, tree_options,
+                                              storage, column_types, partition_by)
+
+    def _parse_partitioning(self, text):
+
+        match = re.search(r"PARTITION\s+BY\s+(RANGE|HASH)\s*\(\s*(\w+)\s*\)", text, re.IGNORECASE)
+        if not match:
+            return None
+        method, column = match.group(1).lower(), match.group(2)
+        rest = text[match.end():]
+        if method == "hash":
+            count = re.search(r"PARTITIONS\s+(\d+)", rest, re.IGNORECASE)
+            if not count:
+                raise ValueError("PARTITION BY HASH requires PARTITIONS n")
+            return {'method': method, 'column': column, 'partitions': int(count.group(1))}
+        bounds = re.search(r"BOUNDS\s*\((.*?)\)", rest, re.IGNORECASE)
+        if not bounds:
+            raise ValueError("PARTITION BY RANGE requires BOUNDS (v1, v2, ...)")
+        values = [self._parse_value(v.strip()) for v in bounds.group(1).split(",")]
+        return {'method': method, 'column': column, 'bounds': values}
+
+    def create_index_command(self, tokens):
+
+        index_name = tokens[0]
+        upper_tokens = [t.upper() for t in tokens]
+        on_index = upper_tokens.index("ON")
+        table_name = tokens[on_index + 1]
+        tree_type = "avl"
+        col_end = len(tokens)
+        if "USING" in upper_tokens:
+            col_end = upper_tokens.index("USING")
+            tree_type = tokens[col_end + 1]
+        column = ''.join(tokens[on_index + 2: col_end]).strip("() ")
 
-        return self.data_manager.create_table(table_name, columns, tree_type)
+        return self.data_manager.create_index(index_name, table_name, column, tree_type)
 
-    def insert_command(self, tokens):
+    def statement_cache_stats(self):
 
-        try:
-            table_name = tokens[2]
-            values_index = tokens.index("VALUES")
-            values_str = ' '.join(tokens[values_index + 1:])
-            values_str = values_str.strip("()")
-            raw_values = [v.strip() for v in values_str.split(",")]
-            parsed_values = [self._parse_value(v) for v in raw_values]
-            return self.data_manager.insert(table_name, parsed_values)
+        return {'hits': self.cache_hits, 'misses': self.cache_misses,
+                'size': len(self.statements), 'prepared': len(self.prepared)}
+
+    def prepare_statement(self, text):
 
+        cmd = text.split(None, 1)[0].lower()
+        label = self.PREPARABLE[cmd]
+        try:
+            statement = parse_statement(text)
+            run = getattr(self, f"_prepare_{cmd}")(statement)
         except Exception as e:
-            return f"Помилка вставки: {e}"
+            return f"Помилка {label}: {e}"
+        return Statement(label, run, statement.param_count)
+
+    def execute_statement(self, text):
+
+        statement = self.prepare_statement(text)
+        return statement.execute() if isinstance(statement, Statement) else statement
 
-    def select_command(self, tokens):
+    def prepared_command(self, command, tokens):
 
+        cmd = tokens[0].lower()
         try:
-            from_index = tokens.index("FROM")
-            table_name = tokens[from_index + 1]
+            name = tokens[1]
+            if cmd == "prepare":
+                if len(tokens) < 4 or tokens[2].upper() != "AS":
+                    raise ValueError("Expected PREPARE name AS statement")
+                body = re.split(r"\s+AS\s+", command, maxsplit=1, flags=re.IGNORECASE)[1]
+                if body.split(None, 1)[0].lower() not in self.PREPARABLE:
+                    raise ValueError(f"Cannot prepare {tokens[3].upper()}")
+                statement = self.prepare_statement(body)
+                if not isinstance(statement, Statement):
+                    return statement
+                self.prepared[name] = statement
+                return None
+            if name not in self.prepared:
+                raise ValueError(f"Prepared statement '{name}' does not exist")
+            if cmd == "deallocate":
+                del self.prepared[name]
+                return None
+            params = Parser(command.strip().split(None, 2)[2] if len(tokens) > 2 else "").parse_values()
+            return self.prepared[name].execute(params)
+        except Exception as e:
+            return f"Помилка {cmd.upper()}: {e}"
 
-            condition = None
-            if "WHERE" in [t.upper() for t in tokens]:
-                where_index = tokens.index("WHERE")
-                condition = ' '.join(tokens[where_index + 1:])
+    def explain_command(self, command):
 
-            result = self.data_manager.select(table_name, condition)
-            return "\n".join(str(r) for r in result)
+        try:
+            match = re.match(r"explain\s+(analyze\s+)?(.+)$", command.strip(), re.I | re.S)
+            if not match:
+                raise ValueError("Usage: EXPLAIN [ANALYZE] <statement>")
+            analyze, body = match.group(1), match.group(2)
+            started = time.perf_counter()
+            statement = parse_statement(body)
+            if statement.param_count:
+                raise ValueError("Cannot explain a statement with placeholders")
+            lines = self._explain_lines(statement)
+            if not analyze:
+                return "\n".join(lines)
+            prepared = self.prepare_statement(body)
+            parse_time = time.perf_counter() - started
+            if not isinstance(prepared, Statement):
+                return prepared
+            return "\n".join(lines + self._analyze_lines(prepared, parse_time))
+        except Exception as e:
+            return f"Помилка EXPLAIN: {e}"
+
+    def _explain_lines(self, statement):
+
+        if isinstance(statement, Insert):
+            return [f"Insert on {statement.table}: {len(statement.rows)} row(s)"]
+        aggregates = [(item.func, item.column) for item in getattr(statement, 'aggregates', ())]
+        group_by = getattr(statement, 'group_by', None)
+        where = Condition(statement.where) if statement.where is not None else None
+        explained = self.data_manager.explain(statement.table, where, aggregates or None, group_by)
+        kind = type(statement).__name__
+        lines = [f"{kind} on {explained['table']}"]
+        if explained['partitions']:
+            lines[0] += f" (partitions scanned: {len(explained['plans'])} of {explained['partitions']})"
+        for plan in explained['plans']:
+            lines.append(f"  -> {self._describe_access(plan)} on {plan['table']} using {plan['tree_type']}"
+                         f"{' (columnar)' if plan['storage'] == 'columnar' else ''}"
+                         f"{' (snapshot)' if plan['snapshot'] else ''}"
+                         f"  rows={plan['rows']} estimated={plan['estimated_rows']:.0f} cost={plan['cost']:.1f}")
+            if plan['filter']:
+                lines.append(f"       filter: {plan['filter']}")
+            if 'aggregate' in plan:
+                lines.append(f"       aggregate: {plan['aggregate']}")
+        return lines
+
+    def _describe_access(self, plan):
+
+        if plan['access'] == 'empty':
+            return "Empty result (key type does not match the tree)"
+        if plan['access'] == 'pk_point':
+            return f"Tree lookup {plan['column']} = {plan['key']!r}"
+        if plan['access'] == 'index':
+            return f"Index lookup {plan['index']} ({plan['column']} = {plan['key']!r})"
+        if plan['access'] == 'pk_range':
+            lo, lo_inclusive, hi, hi_inclusive = plan['range']
+            bounds = ("[" if lo_inclusive and lo is not None else "(") \
+                + ("-inf" if lo is None else repr(lo)) + ", " + ("+inf" if hi is None else repr(hi)) \
+                + ("]" if hi_inclusive and hi is not None else ")")
+            return f"Tree range scan {plan['column']} {bounds}"
+        return "Full scan"
+
+    def _analyze_lines(self, statement, parse_time):
+
+        returned = 0
+        serialise = 0.0
+        started = time.perf_counter()
+        with self.data_manager.profiling() as profile:
+            result = statement.execute()
+            if isinstance(result, RowStream):
+                rows = iter(result.rows)
+                while True:
+                    try:
+                        row = next(rows)
+                    except StopIteration:
+                        break
+                    mark = time.perf_counter()
+                    str(row)
+                    serialise += time.perf_counter() - mark
+                    returned += 1
+            elif isinstance(result, str) and result.startswith("Помилка"):
+                raise ValueError(result)
+            elif result is not None:
+                mark = time.perf_counter()
+                str(result)
+                serialise += time.perf_counter() - mark
+                returned = 1
+        elapsed = time.perf_counter() - started
+        returned = profile['affected'] or returned
+        phases = [("parse", parse_time), ("load", profile['load']), ("tree ops", profile['tree']),
+                  ("filter", profile['filter']), ("serialise", serialise), ("disk write", profile['write'])]
+        other = elapsed - sum(seconds for _, seconds in phases[1:])
+        lines = [f"Execution time: {(parse_time + elapsed) * 1000:.3f} ms"]
+        lines += [f"  {name}: {seconds * 1000:.3f} ms" for name, seconds in phases]
+        lines.append(f"  other: {max(other, 0.0) * 1000:.3f} ms")
+        lines.append(f"Rows examined: {profile['examined']}, returned: {returned}")
+        lines.append(f"Nodes visited: {profile['nodes']}")
+        return lines
+
+    def _condition(self, statement):
+
+        where = statement.where
+        if where is None:
+            return lambda params: None
+        if statement.param_count == 0:
+            condition = Condition(where)
+            return lambda params: condition
+        bind = compile_template(where)
+        return lambda params: Condition(where.bind(params), bind(params))
+
+    def transaction_command(self, tokens):
 
+        cmd = tokens[0].lower()
+        try:
+            if cmd == "begin" or (cmd == "start" and len(tokens) > 1 and tokens[1].lower() == "transaction"):
+                return self.data_manager.begin()
+            if cmd == "commit":
+                return self.data_manager.commit()
+            if cmd == "rollback":
+                return self.data_manager.rollback()
+            return "Невідома команда"
         except Exception as e:
-            return f"Помилка SELECT: {e}"
+            return f"Помилка транзакції: {e}"
 
-    def update_command(self, tokens):
+    def _prepare_insert(self, statement):
+
+        table_name = statement.table
+        rows = statement.rows
+        if len(rows) == 1:
+            row = rows[0]
+            return lambda params: self.data_manager.insert(table_name, [bind_value(v, params) for v in row])
+        return lambda params: self.data_manager.insert_many(
+            table_name, [[bind_value(v, params) for v in row] for row in rows])
+
+    def load_command(self, tokens):
 
         try:
-            table_name = tokens[1]
-            set_index = tokens.index("SET")
-            where_index = tokens.index("WHERE") if "WHERE" in tokens else len(tokens)
+            upper_tokens = [t.upper() for t in tokens]
+            if upper_tokens[1] != "DATA" or "INTO" not in upper_tokens:
+                return "Невідома команда"
+            file_name = tokens[2]
+            table_name = tokens[upper_tokens.index("INTO") + 1]
+            columns = self.data_manager.databases[self.data_manager.current_db][table_name]['columns'] \
+                if self.data_manager.current_db else None
+            with open(file_name, newline='', encoding='utf-8') as f:
+                rows = [[self._parse_value(v.strip()) for v in row] for row in csv.reader(f) if row]
+            if rows and columns and [str(v) for v in rows[0]] == columns:
+                rows = rows[1:]
+            return self.data_manager.insert_many(table_name, rows)
 
-            update_tokens = tokens[set_index + 1: where_index]
-            updates = {}
-            for item in ' '.join(update_tokens).split(','):
-                field, value = item.split('=')
-                updates[field.strip()] = value.strip().strip("'\"")
+        except Exception as e:
+            return f"Помилка LOAD DATA: {e}"
 
-            condition = ' '.join(tokens[where_index + 1:]) if "WHERE" in tokens else None
+    def _prepare_select(self, statement):
 
-            return self.data_manager.update(table_name, updates, condition)
+        table_name = statement.table
+        condition = self._condition(statement)
+        if statement.aggregates or statement.group_by:
+            return self._prepare_aggregate(statement, condition)
 
-        except Exception as e:
-            return f"Помилка UPDATE: {e}"
+        def run(params):
+            return RowStream(self.data_manager.select(table_name, condition(params), statement.limit,
+                                                      statement.offset, statement.columns))
+        return run
 
-    def delete_command(self, tokens):
+    def _prepare_aggregate(self, statement, condition):
 
-        try:
-            table_name = tokens[2]
-            condition = None
-            if "WHERE" in [t.upper() for t in tokens]:
-                where_index = tokens.index("WHERE")
-                condition = ' '.join(tokens[where_index + 1:])
+        aggregates = [(item.func, item.column) for item in statement.aggregates]
+        labels = [str(item) for item in statement.columns]
+        if len(aggregates) == 1 and aggregates[0] == ("COUNT", None) and not statement.group_by:
+            return lambda params: str(self.data_manager.count(statement.table, condition(params)))
 
-            return self.data_manager.delete(table_name, condition)
+        def run(params):
+            rows = self.data_manager.aggregate(statement.table, aggregates or [("COUNT", None)],
+                                               condition(params), statement.group_by)
+            rows = [{label: row[label] for label in labels} for row in rows]
+            if not statement.group_by and len(labels) == 1:
+                return str(rows[0][labels[0]])
+            stop = None if statement.limit is None else statement.offset + statement.limit
+            return RowStream(islice(rows, statement.offset, stop))
+        return run
 
-        except Exception as e:
-            return f"Помилка DELETE: {e}"
+    def _prepare_update(self, statement):
+
+        condition = self._condition(statement)
+
+        def run(params):
+            updates = {column: bind_value(value, params) for column, value in statement.assignments.items()}
+            return self.data_manager.update(statement.table, updates, condition(params))
+        return run
+
+    def _prepare_delete(self, statement):
+
+        condition = self._condition(statement)
+        return lambda params: self.data_manager.delete(statement.table, condition(params))
 
     def _parse_value(self, value):
 
@@ -128,6 +422,17 @@ class TreeSQL:
             except ValueError:
                 return value
 
+def print_result(result):
+
+    if not isinstance(result, RowStream):
+        print(result)
+        return
+    try:
+        for line in result:
+            print(line)
+    except Exception as e:
+        print(f"Помилка SELECT: {e}")
+
 def main():
 
     parser = argparse.ArgumentParser(description="Інтерфейс команд для роботи з TreeSQL")
@@ -137,8 +442,7 @@ def main():
     sql = TreeSQL()
 
     if args.cmd:
-        result = sql.parse_command(args.cmd)
-        print(result)
+        print_result(sql.parse_command(args.cmd))
     else:
         print("Введіть команду або 'exit'):")
         while True:
@@ -146,8 +450,7 @@ def main():
                 command = input(">>> ")
                 if command.strip().lower() in ["exit", "quit"]:
                     break
-                result = sql.parse_command(command)
-                print(result)
+                print_result(sql.parse_command(command))
             except KeyboardInterrupt:
                 print("\nВихід.")
                 break
@@ -0,0 +1,45 @@
+""" Tree operation counters """
+
+COUNTERS = ('comparisons', 'nodes_visited', 'rotations', 'splits', 'merges', 'borrows')
+
+
+class TreeStats:
+
+    __slots__ = COUNTERS
+
+    def __init__(self):
+
+        self.reset()
+
+    def reset(self):
+
+        for name in COUNTERS:
+            setattr(self, name, 0)
+
+    def visit(self, comparisons):
+
+        self.nodes_visited += 1
+        self.comparisons += comparisons
+
+    def as_dict(self):
+
+        return {name: getattr(self, name) for name in COUNTERS}
+
+
+def binary_shape(root, nil=None):
+    height = nodes = 0
+    level = [root] if root is not nil else []
+    while level:
+        height += 1
+        nodes += len(level)
+        level = [child for node in level for child in (node.left, node.right) if child is not nil]
+    return height, nodes
+
+def multiway_shape(root, children=lambda node: node.children):
+    height = nodes = 0
+    level = [root] if root is not None else []
+    while level:
+        height += 1
+        nodes += len(level)
+        level = [child for node in level for child in children(node)]
+    return height, nodes
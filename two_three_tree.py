@@ -1,9 +1,13 @@
 """ 2-3 tree implementation """
 
+from bisect import bisect_left, bisect_right
+
 class Node:
-    def __init__(self, keys=None, children=None):
+    def __init__(self, keys=None, children=None, values=None):
         self.keys = keys or []
         self.children = children or []
+        self.values = values or [None] * len(self.keys)
+        self.size = len(self.keys) + sum(child.size for child in self.children)
 
     def is_leaf(self):
         return len(self.children) == 0
@@ -15,147 +19,249 @@ class Node:
 class TwoThreeTree:
     def __init__(self):
         self.root = None
+        self.stats = None
 
     def search(self, key, node=None):
+        return self._find(key, node) is not None
+
+    def _find(self, key, node=None):
+        stats = self.stats
         if node is None:
             node = self.root
-        if node is None:
-            return False
-        for i, k in enumerate(node.keys):
-            if key == k:
-                return True
-            if key < k:
-                return self.search(key, node.children[i]) if node.children else False
-        return self.search(key, node.children[-1]) if node.children else False
-
-    def insert(self, key):
+        while node is not None:
+            for i, k in enumerate(node.keys):
+                if key == k:
+                    if stats is not None:
+                        stats.visit(2 * i + 1)
+                    return node, i
+                if key < k:
+                    if stats is not None:
+                        stats.visit(2 * i + 2)
+                    node = node.children[i] if node.children else None
+                    break
+            else:
+                if stats is not None:
+                    stats.visit(2 * len(node.keys))
+                node = node.children[-1] if node.children else None
+        return None
+
+    def get(self, key):
+        found = self._find(key)
+        if found is None:
+            return None
+        node, i = found
+        return node.values[i]
+
+    def put(self, key, value):
+        found = self._find(key)
+        if found is None:
+            self.insert(key, value)
+        else:
+            node, i = found
+            node.values[i] = value
+
+    def insert(self, key, value=None):
         if self.root is None:
-            self.root = Node(keys=[key])
+            self.root = Node(keys=[key], values=[value])
             return
 
-        def _insert_rec(node, key):
-            if node.is_leaf():
-                node.keys.append(key)
-                node.keys.sort()
+        split = self._insert_node(self.root, key, value)
+        if split:
+            promote, promote_value, left, right = split
+            self.root = Node(keys=[promote], children=[left, right], values=[promote_value])
+
+    def _insert_node(self, node, key, value):
+        node.size += 1
+        if node.is_leaf():
+            if self.stats is not None:
+                self.stats.visit(len(node.keys).bit_length())
+            idx = bisect_right(node.keys, key)
+            node.keys.insert(idx, key)
+            node.values.insert(idx, value)
+        else:
+            if key < node.keys[0]:
+                child_idx = 0
+            elif len(node.keys) == 1 or key < node.keys[1]:
+                child_idx = 1
             else:
-                if key < node.keys[0]:
-                    child_idx = 0
-                elif len(node.keys) == 1 or key < node.keys[1]:
-                    child_idx = 1
-                else:
-                    child_idx = 2
-                split = _insert_rec(node.children[child_idx], key)
-                if split:
-                    promote, left, right = split
-                    node.keys.insert(child_idx, promote)
-                    node.children[child_idx] = left
-                    node.children.insert(child_idx + 1, right)
-
-            if len(node.keys) > 2:
-                return self._split_node(node)
-            return None
+                child_idx = 2
+            if self.stats is not None:
+                self.stats.visit(min(child_idx + 1, len(node.keys)))
+            split = self._insert_node(node.children[child_idx], key, value)
+            if split:
+                promote, promote_value, left, right = split
+                node.keys.insert(child_idx, promote)
+                node.values.insert(child_idx, promote_value)
+                node.children[child_idx] = left
+                node.children.insert(child_idx + 1, right)
 
-        split = _insert_rec(self.root, key)
-        if split:
-            promote, left, right = split
-            self.root = Node(keys=[promote], children=[left, right])
+        if len(node.keys) > 2:
+            return self._split_node(node)
+        return None
+
+    def bulk_load(self, items):
+        if not items:
+            self.root = None
+            return
+        height = 0
+        while 3 ** (height + 1) - 1 < len(items):
+            height += 1
+        self.root = self._build(items, 0, len(items), height)
+
+    def _build(self, items, lo, hi, height):
+        if height == 0:
+            return Node(keys=[k for k, _ in items[lo:hi]], values=[v for _, v in items[lo:hi]])
+        n = hi - lo
+        count = max(2, -(-(n + 1) // 3 ** height))
+        size, extra = divmod(n - (count - 1), count)
+        node = Node()
+        pos = lo
+        for i in range(count):
+            end = pos + size + (1 if i < extra else 0)
+            node.children.append(self._build(items, pos, end, height - 1))
+            pos = end
+            if i < count - 1:
+                node.keys.append(items[pos][0])
+                node.values.append(items[pos][1])
+                pos += 1
+        node.size = n
+        return node
 
     def _split_node(self, node):
+        if self.stats is not None:
+            self.stats.splits += 1
         k1, k2, k3 = node.keys
+        v1, v2, v3 = node.values
         if node.is_leaf():
-            left = Node(keys=[k1])
-            right = Node(keys=[k3])
+            left = Node(keys=[k1], values=[v1])
+            right = Node(keys=[k3], values=[v3])
         else:
             c1, c2, c3, c4 = node.children
-            left = Node(keys=[k1], children=[c1, c2])
-            right = Node(keys=[k3], children=[c3, c4])
-        return k2, left, right
+            left = Node(keys=[k1], children=[c1, c2], values=[v1])
+            right = Node(keys=[k3], children=[c3, c4], values=[v3])
+        return k2, v2, left, right
 
     def delete(self, key):
-        if self.root is None:
+        if self.root is None or self._find(key) is None:
             return
+        self._delete_rec(self.root, key)
+        if not self.root.keys:
+            self.root = self.root.children[0] if self.root.children else None
 
-
-        def _delete_rec(node, key):
-            if key in node.keys and node.is_leaf():
-                node.keys.remove(key)
-            elif key in node.keys:
+    def _delete_rec(self, node, key):
+        node.size -= 1
+        if node.is_leaf():
+            if self.stats is not None:
+                self.stats.visit(len(node.keys))
+            if key in node.keys:
                 idx = node.keys.index(key)
-                succ = node.children[idx + 1]
-                while not succ.is_leaf():
-                    succ = succ.children[0]
-                node.keys[idx] = succ.keys[0]
-                _delete_rec(succ, succ.keys[0])
-            else:
-                if node.is_leaf():
-                    return
-                if key < node.keys[0]:
-                    child_idx = 0
-                elif len(node.keys) == 1 or key < node.keys[1]:
-                    child_idx = 1
-                else:
-                    child_idx = 2
-                _delete_rec(node.children[child_idx], key)
-
-            if node is self.root:
-                if len(node.keys) == 0 and node.children:
-                    self.root = node.children[0]
-                return
-
-            if len(node.keys) >= 1:
-                return
-
-            parent, idx = _find_parent(self.root, node)
-
-            left_sib = parent.children[idx - 1] if idx > 0 else None
-            right_sib = parent.children[idx + 1] if idx < len(parent.children) - 1 else None
-
-            if left_sib and len(left_sib.keys) == 2:
-                borrow_key = left_sib.keys.pop(-1)
-                node.keys.insert(0, parent.keys[idx - 1])
-                parent.keys[idx - 1] = borrow_key
-                if left_sib.children:
-                    node.children.insert(0, left_sib.children.pop(-1))
-                return
-            if right_sib and len(right_sib.keys) == 2:
-                borrow_key = right_sib.keys.pop(0)
-                node.keys.append(parent.keys[idx])
-                parent.keys[idx] = borrow_key
-                if right_sib.children:
-                    node.children.append(right_sib.children.pop(0))
-                return
-
-            if left_sib:
-                merge_key = parent.keys.pop(idx - 1)
-                left_sib.keys.append(merge_key)
-                left_sib.keys += node.keys
-                if node.children:
-                    left_sib.children += node.children
-                parent.children.pop(idx)
-            else:
-                merge_key = parent.keys.pop(idx)
-                node.keys.append(merge_key)
-                node.keys += right_sib.keys
-                node.children += right_sib.children
-                parent.children.pop(idx + 1)
-
-        def _find_parent(curr, target, parent=None):
-            if curr is target:
-                return parent, None
-            if curr.is_leaf():
-                return None, None
-            for i, c in enumerate(curr.children):
-                if c is target:
-                    return curr, i
-                res = _find_parent(c, target, curr)
-                if res[0]:
-                    return res
-            return None, None
-
-        _delete_rec(self.root, key)
-        if self.root and len(self.root.keys) == 0 and self.root.children:
-            self.root = self.root.children[0]
+                node.keys.pop(idx)
+                node.values.pop(idx)
+            return
+
+        child_idx = bisect_left(node.keys, key)
+        if self.stats is not None:
+            self.stats.visit(len(node.keys).bit_length() + (child_idx < len(node.keys)))
+        if child_idx < len(node.keys) and node.keys[child_idx] == key:
+            succ = node.children[child_idx + 1]
+            while not succ.is_leaf():
+                succ = succ.children[0]
+            node.keys[child_idx] = succ.keys[0]
+            node.values[child_idx] = succ.values[0]
+            key = succ.keys[0]
+            child_idx += 1
 
+        self._delete_rec(node.children[child_idx], key)
+        if not node.children[child_idx].keys:
+            self._fix_underflow(node, child_idx)
+
+    def _fix_underflow(self, parent, idx):
+        node = parent.children[idx]
+        left_sib = parent.children[idx - 1] if idx > 0 else None
+        right_sib = parent.children[idx + 1] if idx < len(parent.children) - 1 else None
+
+        if left_sib and len(left_sib.keys) == 2:
+            self._borrow_from_prev(parent, idx, node, left_sib)
+        elif right_sib and len(right_sib.keys) == 2:
+            self._borrow_from_next(parent, idx, node, right_sib)
+        elif left_sib:
+            self._merge_children(parent, idx - 1, left_sib, node)
+        else:
+            self._merge_children(parent, idx, node, right_sib)
+
+    def _borrow_from_prev(self, parent, idx, node, sibling):
+        if self.stats is not None:
+            self.stats.borrows += 1
+        borrow_key = sibling.keys.pop(-1)
+        borrow_value = sibling.values.pop(-1)
+        node.keys.insert(0, parent.keys[idx - 1])
+        node.values.insert(0, parent.values[idx - 1])
+        parent.keys[idx - 1] = borrow_key
+        parent.values[idx - 1] = borrow_value
+        moved = 1
+        if sibling.children:
+            node.children.insert(0, sibling.children.pop(-1))
+            moved += node.children[0].size
+        node.size += moved
+        sibling.size -= moved
+
+    def _borrow_from_next(self, parent, idx, node, sibling):
+        if self.stats is not None:
+            self.stats.borrows += 1
+        borrow_key = sibling.keys.pop(0)
+        borrow_value = sibling.values.pop(0)
+        node.keys.append(parent.keys[idx])
+        node.values.append(parent.values[idx])
+        parent.keys[idx] = borrow_key
+        parent.values[idx] = borrow_value
+        moved = 1
+        if sibling.children:
+            node.children.append(sibling.children.pop(0))
+            moved += node.children[-1].size
+        node.size += moved
+        sibling.size -= moved
+
+    def _merge_children(self, parent, idx, left, right):
+        if self.stats is not None:
+            self.stats.merges += 1
+        left.keys.append(parent.keys.pop(idx))
+        left.values.append(parent.values.pop(idx))
+        left.keys += right.keys
+        left.values += right.values
+        left.children += right.children
+        left.size += right.size + 1
+        parent.children.pop(idx + 1)
+
+    def __len__(self):
+        return self.root.size if self.root else 0
+
+    def rank(self, key):
+        count = 0
+        node = self.root
+        while node is not None:
+            i = bisect_left(node.keys, key)
+            count += i + sum(child.size for child in node.children[:i])
+            if node.is_leaf():
+                return count
+            if i < len(node.keys) and node.keys[i] == key:
+                return count + node.children[i].size
+            node = node.children[i]
+        return count
+
+    def select(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError("select index out of range")
+        node = self.root
+        while not node.is_leaf():
+            for j, child in enumerate(node.children):
+                if i < child.size:
+                    node = child
+                    break
+                i -= child.size
+                if i == 0:
+                    return node.keys[j]
+                i -= 1
+        return node.keys[i]
 
     def inorder(self, node=None, res=None):
         if res is None:
@@ -173,6 +279,61 @@ class TwoThreeTree:
             self.inorder(node.children[-1], res)
         return res
 
+    def inorder_items(self, node=None, res=None):
+        if res is None:
+            res = []
+        if node is None:
+            node = self.root
+        if node is None:
+            return res
+        if node.is_leaf():
+            res.extend(zip(node.keys, node.values))
+        else:
+            for i, k in enumerate(node.keys):
+                self.inorder_items(node.children[i], res)
+                res.append((k, node.values[i]))
+            self.inorder_items(node.children[-1], res)
+        return res
+
+    def range(self, lo=None, hi=None, reverse=False):
+        for key, _ in self.range_items(lo, hi, reverse):
+            yield key
+
+    def range_items(self, lo=None, hi=None, reverse=False):
+        stack = []
+        node = self.root
+        while node is not None:
+            if reverse:
+                i = bisect_left(node.keys, hi) if hi is not None else len(node.keys)
+            else:
+                i = bisect_left(node.keys, lo) if lo is not None else 0
+            stack.append((node, i))
+            node = None if node.is_leaf() else node.children[i]
+        while stack:
+            node, i = stack.pop()
+            if reverse:
+                if i == 0:
+                    continue
+                i -= 1
+                if lo is not None and node.keys[i] < lo:
+                    return
+                next_child = i
+            else:
+                if i >= len(node.keys):
+                    continue
+                if hi is not None and node.keys[i] >= hi:
+                    return
+                next_child = i + 1
+            yield node.keys[i], node.values[i]
+            stack.append((node, i if reverse else i + 1))
+            if not node.is_leaf():
+                child = node.children[next_child]
+                while True:
+                    stack.append((child, len(child.keys) if reverse else 0))
+                    if child.is_leaf():
+                        break
+                    child = child.children[-1 if reverse else 0]
+
     def preorder(self, node=None, res=None):
         if res is None:
             res = []